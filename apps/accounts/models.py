@@ -28,6 +28,8 @@ class User(AbstractUser):
     adresse = models.TextField(blank=True)
     ville = models.CharField(max_length=100, blank=True)
     code_postal = models.CharField(max_length=10, blank=True)
+    latitude = models.FloatField(blank=True, null=True)  # déduites du code postal (geographie.geocoder)
+    longitude = models.FloatField(blank=True, null=True)
     pays = models.CharField(max_length=100, default='France')
     date_embauche = models.DateField(blank=True, null=True)
     statut = models.CharField(
@@ -52,6 +54,13 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_role_display()})"
 
+    def save(self, *args, **kwargs):
+        from apps.etablissements.geographie import localiser
+        champs = localiser(self, kwargs.get('update_fields'))
+        if champs and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = [*kwargs['update_fields'], *champs]
+        super().save(*args, **kwargs)
+
     def get_full_name(self):
         """Retourne le nom complet de l'utilisateur"""
         return f"{self.first_name} {self.last_name}".strip() or self.username
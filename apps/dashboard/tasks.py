@@ -5,7 +5,7 @@ from celery import shared_task
 from django.utils import timezone
 from .models import ExecutionRapport, AlerteDashboard, ActivationAlerte
 from apps.remplacements.models import Absence, Remplacement
-from apps.emplois_temps.models import Cours
+from apps.emplois_temps.models import ConflitCours
 import logging
 
 logger = logging.getLogger(__name__)
@@ -102,11 +102,7 @@ def verifier_conditions_alerte(alerte):
         
         elif alerte.type_alerte == 'conflit_emploi_temps':
             # Vérifier les conflits d'emploi du temps
-            conflits = Cours.objects.extra(
-                where=["EXISTS (SELECT 1 FROM emplois_temps_cours c2 WHERE c2.enseignant_id = emplois_temps_cours.enseignant_id AND c2.jour_semaine = emplois_temps_cours.jour_semaine AND c2.heure_debut < emplois_temps_cours.heure_fin AND c2.heure_fin > emplois_temps_cours.heure_debut AND c2.id != emplois_temps_cours.id)"]
-            ).count()
-            
-            return conflits > 0
+            return ConflitCours.objects.filter(emploi_temps__statut='actif').exists()
         
         elif alerte.type_alerte == 'salle_surchargee':
             # Vérifier les salles surchargées
@@ -160,7 +156,9 @@ def generer_rapport_hebdomadaire():
                 'absences_semaine': absences_semaine,
                 'remplacements_effectues': remplacements_effectues,
                 'taux_remplacement': (remplacements_effectues / absences_semaine * 100) if absences_semaine > 0 else 0,
-                'conflits_emploi_temps': 0,  # À calculer
+                'conflits_emploi_temps': ConflitCours.objects.filter(
+                    emploi_temps__etablissement=etablissement, emploi_temps__statut='actif'
+                ).count(),
                 'alertes_actives': 0,  # À calculer
             }
             
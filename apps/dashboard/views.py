@@ -11,7 +11,7 @@ from datetime import datetime, timedelta
 from .models import WidgetDashboard, ConfigurationDashboard, RapportDashboard, AlerteDashboard, ActivationAlerte
 from apps.etablissements.models import Etablissement, Classe, Salle
 from apps.accounts.models import User
-from apps.emplois_temps.models import EmploiTemps, Cours
+from apps.emplois_temps.models import EmploiTemps, Cours, ConflitCours
 from apps.remplacements.models import Absence, Remplacement, Remplacant
 from apps.notifications.models import Notification
 
@@ -70,11 +70,9 @@ def dashboard_directeur(request):
     ).order_by('-date_debut')[:5]
     
     # Conflits d'emploi du temps
-    conflits = Cours.objects.filter(
+    conflits = ConflitCours.objects.filter(
         emploi_temps__etablissement=etablissement,
         emploi_temps__statut='actif'
-    ).extra(
-        where=["EXISTS (SELECT 1 FROM emplois_temps_cours c2 WHERE c2.enseignant_id = emplois_temps_cours.enseignant_id AND c2.jour_semaine = emplois_temps_cours.jour_semaine AND c2.heure_debut < emplois_temps_cours.heure_fin AND c2.heure_fin > emplois_temps_cours.heure_debut AND c2.id != emplois_temps_cours.id)"]
     ).count()
     
     # Notifications récentes
@@ -6,3 +6,6 @@ class EmploisTempsConfig(AppConfig):
     name = 'apps.emplois_temps'
     verbose_name = 'Gestion des emplois du temps'
 
+
+    def ready(self):
+        from . import signals  # noqa: F401
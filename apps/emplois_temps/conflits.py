@@ -0,0 +1,120 @@
+"""
+Index des conflits d'emploi du temps (modèle ConflitCours)
+
+L'index est mis à jour de façon incrémentale à chaque enregistrement d'un cours : seuls les cours
+partageant son jour, une de ses semaines et l'une de ses ressources sont examinés. La suppression d'un cours retire ses
+conflits par cascade. Les écritures groupées (update, bulk_create), qui n'émettent pas de signaux,
+doivent être suivies de reconstruire_index_conflits.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+RESSOURCES = ('enseignant', 'salle', 'classe')
+
+# Semaines d'une alternance (Cours.semaine) ; un cours 'toutes' a lieu les deux semaines
+SEMAINES_ALTERNEES = ('A', 'B')
+
+# Statut (Cours.statut) d'un cours qui n'occupe plus ses ressources
+STATUT_ANNULE = 'annule'
+
+
+def cours_planifies(cours):
+    """
+    Cours d'un queryset qui occupent leurs ressources : les cours annulés ne créent pas de conflit.
+    Filtre commun à l'index des conflits, à l'analyseur et aux optimiseurs.
+    """
+    return cours.exclude(statut=STATUT_ANNULE)
+
+
+def semaines_cours(semaine):
+    """Semaines de l'alternance où un cours a lieu"""
+    return SEMAINES_ALTERNEES if semaine not in SEMAINES_ALTERNEES else (semaine,)
+
+
+def semaines_communes(semaine1, semaine2):
+    """Vrai si deux cours ont lieu au moins une même semaine"""
+    return semaine1 == semaine2 or semaine1 not in SEMAINES_ALTERNEES or semaine2 not in SEMAINES_ALTERNEES
+
+
+def paires_chevauchantes(intervalles):
+    """
+    Paires d'éléments dont les intervalles [debut, fin[ se chevauchent, par balayage.
+    `intervalles` est une liste de (debut, fin, element) ; coût O(n log n + k) pour k paires.
+    """
+    actifs = []
+    for debut, fin, element in sorted(intervalles, key=lambda intervalle: intervalle[:2]):
+        actifs = [(fin_actif, autre) for fin_actif, autre in actifs if fin_actif > debut]
+        for _, autre in actifs:
+            yield autre, element
+        actifs.append((fin, element))
+
+
+def _conflit(emploi_temps_id, cours_a, cours_b, ressource):
+    from .models import ConflitCours
+
+    cours1_id, cours2_id = sorted((cours_a, cours_b))
+    return ConflitCours(
+        emploi_temps_id=emploi_temps_id, cours1_id=cours1_id, cours2_id=cours2_id, ressource=ressource
+    )
+
+
+def mettre_a_jour_conflits_cours(cours):
+    """Recalcule les conflits d'un cours après son enregistrement"""
+    from django.db.models import Q
+    from .models import Cours, ConflitCours
+
+    ConflitCours.objects.filter(Q(cours1_id=cours.id) | Q(cours2_id=cours.id)).delete()
+    if cours.statut == STATUT_ANNULE:
+        return
+
+    ressources = {ressource: getattr(cours, f'{ressource}_id') for ressource in RESSOURCES}
+    voisins = Cours.objects.filter(
+        Q(enseignant_id=ressources['enseignant']) | Q(salle_id=ressources['salle']) | Q(classe_id=ressources['classe']),
+        emploi_temps_id=cours.emploi_temps_id,
+        jour_semaine=cours.jour_semaine,
+        heure_debut__lt=cours.heure_fin,
+        heure_fin__gt=cours.heure_debut,
+        semaine__in=('toutes',) + semaines_cours(cours.semaine),
+    ).exclude(id=cours.id)
+    voisins = cours_planifies(voisins).values_list('id', 'enseignant_id', 'salle_id', 'classe_id')
+
+    conflits = [
+        _conflit(cours.emploi_temps_id, cours.id, voisin[0], ressource)
+        for voisin in voisins
+        for ressource, ressource_id in zip(RESSOURCES, voisin[1:])
+        if ressource_id == ressources[ressource]
+    ]
+    ConflitCours.objects.bulk_create(conflits)
+
+
+def reconstruire_index_conflits(emploi_temps):
+    """
+    Recalcule tous les conflits d'un emploi du temps (une lecture, balayage par ressource et jour).
+    Retourne le nombre de conflits.
+    """
+    from django.db import transaction
+    from .models import ConflitCours
+
+    cours = list(cours_planifies(emploi_temps.cours).values_list(
+        'id', 'jour_semaine', 'heure_debut', 'heure_fin', 'enseignant_id', 'salle_id', 'classe_id', 'semaine'
+    ))
+    semaines = {c[0]: c[7] for c in cours}
+    conflits = []
+    for indice, ressource in enumerate(RESSOURCES, start=4):
+        groupes = {}
+        for c in cours:
+            groupes.setdefault((c[indice], c[1]), []).append((c[2], c[3], c[0]))
+        for intervalles in groupes.values():
+            conflits.extend(
+                _conflit(emploi_temps.id, cours_a, cours_b, ressource)
+                for cours_a, cours_b in paires_chevauchantes(intervalles)
+                if semaines_communes(semaines[cours_a], semaines[cours_b])
+            )
+
+    with transaction.atomic():
+        ConflitCours.objects.filter(emploi_temps=emploi_temps).delete()
+        ConflitCours.objects.bulk_create(conflits, batch_size=500)
+    logger.info(f"Index des conflits de {emploi_temps.nom} reconstruit: {len(conflits)} conflits")
+    return len(conflits)
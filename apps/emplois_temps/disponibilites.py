@@ -0,0 +1,416 @@
+"""
+Index en mémoire des disponibilités d'un établissement (salles, enseignants, classes, remplaçants)
+
+Les occupations (cours des emplois du temps actifs, missions de remplacement) et les
+disponibilités JSON ({"lundi": [8, 9], ...} ou {"1": [8, 9], ...}) sont converties une fois pour
+toutes en semaines de 7 × 96 quarts d'heure (tableaux NumPy booléens) : tester un créneau pour
+toutes les ressources d'un type est un ET vectorisé. Un cours occupe les quarts d'heure qu'il
+touche, même partiellement. Chaque ressource a une semaine par semaine de l'alternance (A, B) :
+un cours de semaine A n'occupe que la première, un cours 'toutes' les deux.
+
+L'index est mis en cache par établissement et reconstruit dès qu'une des données sources a changé
+(updated_at, nombre de lignes, voir _version) ; seuls les DISPONIBILITES_TAILLE_CACHE index les
+plus récemment utilisés sont conservés.
+"""
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import logging
+
+import numpy as np
+
+from .conflits import SEMAINES_ALTERNEES, cours_planifies, semaines_cours
+
+logger = logging.getLogger(__name__)
+
+
+JOURS_NOMS = {
+    'lundi': 1,
+    'mardi': 2,
+    'mercredi': 3,
+    'jeudi': 4,
+    'vendredi': 5,
+    'samedi': 6,
+    'dimanche': 7,
+}
+
+NB_JOURS = 7
+DUREE_QUART = 15
+QUARTS_HEURE = 60 // DUREE_QUART
+QUARTS_JOUR = 24 * QUARTS_HEURE
+NB_SEMAINES = len(SEMAINES_ALTERNEES)
+
+
+def en_minutes(heure):
+    """Convertit une heure (time ou 'HH:MM') en minutes depuis minuit"""
+    if isinstance(heure, str):
+        heure = datetime.strptime(heure[:5], '%H:%M').time()
+    return heure.hour * 60 + heure.minute
+
+
+def jour_depuis_cle(cle):
+    """Convertit une clé de disponibilités ('lundi', '1', 1) en numéro de jour"""
+    if isinstance(cle, int):
+        return cle
+    cle = str(cle).strip().lower()
+    if cle.isdigit():
+        return int(cle)
+    return JOURS_NOMS.get(cle)
+
+
+def heures_disponibles_jour(disponibilites, jour):
+    """Heures disponibles d'un jour dans des disponibilités JSON, ou None si le jour n'est pas restreint"""
+    for cle, heures in (disponibilites or {}).items():
+        if jour_depuis_cle(cle) == jour:
+            return heures or []
+    return None
+
+
+def quarts(debut, fin):
+    """Quarts d'heure [premier, dernier[ couverts par l'intervalle [debut, fin[ (minutes)"""
+    return debut // DUREE_QUART, -(-fin // DUREE_QUART)
+
+
+def masque_creneau(jour, debut, fin):
+    """Semaine (7 × 96) dont seuls les quarts d'heure du créneau sont à vrai"""
+    masque = semaine_vide()
+    premier, dernier = quarts(debut, fin)
+    masque[jour - 1, premier:dernier] = True
+    return masque
+
+
+def semaine_vide():
+    return np.zeros((NB_JOURS, QUARTS_JOUR), dtype=bool)
+
+
+def masque_alternance(semaine, masque):
+    """
+    Masque (NB_SEMAINES × 7 × 96) d'une semaine de 7 × 96 portée sur les semaines de l'alternance
+    où elle s'applique : une seule pour 'A' ou 'B', les deux sinon ('toutes' ou None)
+    """
+    alternance = np.zeros((NB_SEMAINES,) + masque.shape, dtype=bool)
+    for nom in semaines_cours(semaine):
+        alternance[SEMAINES_ALTERNEES.index(nom)] = masque
+    return alternance
+
+
+def semaine_indisponible(disponibilites):
+    """
+    Convertit des disponibilités JSON (heures pleines disponibles par jour) en semaine occupée.
+    Un jour absent du dictionnaire est entièrement disponible.
+    """
+    semaine = semaine_vide()
+    for cle, heures in (disponibilites or {}).items():
+        jour = jour_depuis_cle(cle)
+        if jour is None or not 1 <= jour <= NB_JOURS:
+            continue
+        semaine[jour - 1] = True
+        for heure in heures or []:
+            if 0 <= heure < 24:
+                semaine[jour - 1, heure * QUARTS_HEURE:(heure + 1) * QUARTS_HEURE] = False
+    return semaine
+
+
+class TableOccupation:
+    """
+    Occupation hebdomadaire d'un ensemble de ressources : une ligne de NB_SEMAINES × 7 × 96 quarts
+    d'heure par ressource (semaines A et B de l'alternance). Les opérations (test d'un créneau,
+    union, intersection, comptage) portent sur toutes les lignes à la fois ; les masques sont
+    construits par masque_alternance.
+    """
+
+    def __init__(self, ids, bits=None):
+        self.ids = list(ids)
+        self.lignes = {ressource_id: ligne for ligne, ressource_id in enumerate(self.ids)}
+        self.bits = bits if bits is not None else np.zeros(
+            (len(self.ids), NB_SEMAINES, NB_JOURS, QUARTS_JOUR), dtype=bool
+        )
+
+    def __contains__(self, ressource_id):
+        return ressource_id in self.lignes
+
+    def semaine(self, ressource_id):
+        """Semaines A et B occupées d'une ressource (vides si inconnue)"""
+        if ressource_id not in self.lignes:
+            return masque_alternance(None, semaine_vide())
+        return self.bits[self.lignes[ressource_id]]
+
+    def occuper(self, ressource_id, jour, debut, fin, semaine=None):
+        """Occupe le créneau les semaines de l'alternance où il a lieu (Cours.semaine, toutes par défaut)"""
+        premier, dernier = quarts(debut, fin)
+        for nom in semaines_cours(semaine):
+            self.bits[self.lignes[ressource_id], SEMAINES_ALTERNEES.index(nom), jour - 1, premier:dernier] = True
+
+    def ajouter_semaine(self, ressource_id, semaine):
+        """Ajoute une semaine occupée de 7 × 96 (disponibilités) aux deux semaines de l'alternance"""
+        self.bits[self.lignes[ressource_id]] |= semaine
+
+    def libres(self, masque, ids=None):
+        """Ressources (parmi `ids`, dans leur ordre) dont aucun quart d'heure n'est occupé dans le masque"""
+        if ids is None:
+            ids, bits = self.ids, self.bits
+        else:
+            ids = [ressource_id for ressource_id in ids if ressource_id in self.lignes]
+            bits = self.bits[[self.lignes[ressource_id] for ressource_id in ids]]
+        if not ids:
+            return []
+        occupees = (bits & masque).any(axis=(1, 2, 3))
+        return [ressource_id for ressource_id, occupee in zip(ids, occupees) if not occupee]
+
+    def est_libre(self, ressource_id, masque):
+        return not (self.semaine(ressource_id) & masque).any()
+
+    def union(self):
+        """Semaines A et B occupées par au moins une ressource"""
+        return self.bits.any(axis=0)
+
+    def intersection(self):
+        """Semaines A et B occupées par toutes les ressources"""
+        return self.bits.all(axis=0)
+
+    def quarts_occupes(self):
+        """Nombre moyen de quarts d'heure occupés par semaine, par ressource (tableau aligné sur `ids`)"""
+        return self.bits.sum(axis=(1, 2, 3)) / NB_SEMAINES
+
+
+class IndexDisponibilites:
+    """
+    Disponibilités hebdomadaires des ressources d'un établissement, une TableOccupation par
+    type de ressource ('enseignant', 'salle', 'classe', 'remplacant').
+
+    Les créneaux sont exprimés en (jour_semaine, heure_debut, heure_fin), heures en time,
+    'HH:MM' ou minutes, et éventuellement la semaine de l'alternance ('A', 'B', ou None pour
+    un créneau hebdomadaire, libre seulement s'il l'est les deux semaines). Si `emploi_temps`
+    est fourni, ses cours remplacent ceux des emplois du temps actifs de l'établissement.
+    """
+
+    def __init__(self, etablissement, emploi_temps=None):
+        from apps.accounts.models import ProfilEnseignant
+        from apps.etablissements.models import Salle, ClasseMatiere
+        from apps.remplacements.models import Remplacant, Remplacement
+        from .models import Cours
+
+        self.etablissement_id = etablissement.id
+
+        cours = [
+            (enseignant_id, salle_id, classe_id, matiere_id, jour, en_minutes(heure_debut), en_minutes(heure_fin), semaine)
+            for enseignant_id, salle_id, classe_id, matiere_id, jour, heure_debut, heure_fin, semaine in _cours_occupants(
+                Cours, etablissement, emploi_temps
+            ).values_list(
+                'enseignant_id', 'salle_id', 'classe_id', 'matiere_id', 'jour_semaine', 'heure_debut', 'heure_fin',
+                'semaine',
+            )
+        ]
+
+        qualifications = {}
+        for enseignant_id, _, _, matiere_id, _, _, _, _ in cours:
+            qualifications.setdefault(matiere_id, set()).add(enseignant_id)
+        for matiere_id, enseignant_id in ClasseMatiere.objects.filter(
+            classe__etablissement=etablissement, enseignant_principal__isnull=False
+        ).values_list('matiere_id', 'enseignant_principal_id'):
+            qualifications.setdefault(matiere_id, set()).add(enseignant_id)
+        self.qualifications = qualifications
+
+        # Salles actives rangées par type puis capacité croissante
+        salles = list(Salle.objects.filter(
+            etablissement=etablissement, actif=True
+        ).values_list('id', 'type_salle', 'capacite', 'disponibilites'))
+        self.salles = {salle_id: (type_salle, capacite) for salle_id, type_salle, capacite, _ in salles}
+        self.salles_par_type = {}
+        for type_salle in {type_salle for type_salle, _ in self.salles.values()} | {None}:
+            self.salles_par_type[type_salle] = sorted(
+                (capacite, salle_id) for salle_id, (type_salle_salle, capacite) in self.salles.items()
+                if type_salle is None or type_salle_salle == type_salle
+            )
+
+        # Remplaçants : fenêtre de disponibilité, matières et missions datées
+        remplacants = list(Remplacant.objects.filter(
+            etablissement=etablissement, statut='disponible'
+        ).values_list('id', 'enseignant_id', 'date_debut_disponibilite', 'date_fin_disponibilite', 'heures_disponibles'))
+        self.remplacants = {
+            remplacant_id: (enseignant_id, date_debut, date_fin)
+            for remplacant_id, enseignant_id, date_debut, date_fin, _ in remplacants
+        }
+        self.matieres_remplacants = {}
+        for remplacant_id, matiere_id in Remplacant.matieres_enseignees.through.objects.filter(
+            remplacant_id__in=self.remplacants
+        ).values_list('remplacant_id', 'matiere_id'):
+            self.matieres_remplacants.setdefault(matiere_id, set()).add(remplacant_id)
+
+        enseignants = set().union(*qualifications.values()) | {
+            enseignant_id for enseignant_id, _, _ in self.remplacants.values()
+        }
+        self.tables = {
+            'enseignant': TableOccupation(sorted(enseignants | {c[0] for c in cours})),
+            'salle': TableOccupation(sorted(self.salles)),
+            'classe': TableOccupation(sorted({c[2] for c in cours})),
+            'remplacant': TableOccupation(sorted(self.remplacants)),
+        }
+
+        for enseignant_id, salle_id, classe_id, _, jour, debut, fin, semaine in cours:
+            self.tables['enseignant'].occuper(enseignant_id, jour, debut, fin, semaine)
+            self.tables['classe'].occuper(classe_id, jour, debut, fin, semaine)
+            if salle_id in self.salles:
+                self.tables['salle'].occuper(salle_id, jour, debut, fin, semaine)
+        for user_id, disponibilites in ProfilEnseignant.objects.filter(
+            user_id__in=enseignants
+        ).values_list('user_id', 'disponibilites'):
+            self.tables['enseignant'].ajouter_semaine(user_id, semaine_indisponible(disponibilites))
+        for salle_id, _, _, disponibilites in salles:
+            self.tables['salle'].ajouter_semaine(salle_id, semaine_indisponible(disponibilites))
+        for remplacant_id, _, _, _, heures_disponibles in remplacants:
+            self.tables['remplacant'].ajouter_semaine(remplacant_id, semaine_indisponible(heures_disponibles))
+
+        self.missions = {}
+        for remplacant_id, date, heure_debut, heure_fin in Remplacement.objects.filter(
+            remplacant_id__in=self.remplacants, statut__in=['accepte', 'effectue']
+        ).values_list('remplacant_id', 'date_remplacement', 'heure_debut', 'heure_fin'):
+            semaine = self.missions.setdefault((remplacant_id, date), semaine_vide())
+            semaine |= masque_creneau(date.isoweekday(), en_minutes(heure_debut), en_minutes(heure_fin))
+
+    # Créneaux
+
+    @staticmethod
+    def masque(jour, debut, fin, semaine=None):
+        """Masque d'un créneau sur les semaines de l'alternance (heures en time, 'HH:MM' ou minutes)"""
+        if not isinstance(debut, int):
+            debut = en_minutes(debut)
+        if not isinstance(fin, int):
+            fin = en_minutes(fin)
+        return masque_alternance(semaine, masque_creneau(jour, debut, fin))
+
+    def est_libre(self, ressource, ressource_id, jour, debut, fin, semaine=None):
+        """Vrai si la ressource ('enseignant', 'salle' ou 'classe') est libre sur le créneau"""
+        if ressource == 'salle' and ressource_id not in self.salles:
+            return False
+        return self.tables[ressource].est_libre(ressource_id, self.masque(jour, debut, fin, semaine))
+
+    # Requêtes
+
+    def salles_libres(self, jour, debut, fin, type_salle=None, capacite_min=0, semaine=None):
+        """Identifiants des salles libres sur le créneau, du type et de la capacité minimale demandés"""
+        capacites = self.salles_par_type.get(type_salle, [])
+        premiere = bisect_left(capacites, (capacite_min, 0))
+        return self.tables['salle'].libres(
+            self.masque(jour, debut, fin, semaine), [salle_id for _, salle_id in capacites[premiere:]]
+        )
+
+    def enseignants_libres(self, matiere_id, jour, debut, fin, semaine=None):
+        """Identifiants des enseignants de l'établissement qualifiés pour la matière et libres"""
+        return self.tables['enseignant'].libres(
+            self.masque(jour, debut, fin, semaine), sorted(self.qualifications.get(matiere_id, ()))
+        )
+
+    def remplacant_libre(self, remplacant_id, jour, debut, fin, date=None, semaine=None):
+        """Vrai si le remplaçant peut assurer le créneau (à la date donnée, si elle est fournie)"""
+        return remplacant_id in self.remplacants_libres(None, jour, debut, fin, date, [remplacant_id], semaine)
+
+    def _disponible_le(self, remplacant_id, date):
+        _, date_debut, date_fin = self.remplacants[remplacant_id]
+        return date_debut <= date and (date_fin is None or date <= date_fin)
+
+    def remplacants_libres(self, matiere_id, jour, debut, fin, date=None, remplacants=None, semaine=None):
+        """
+        Identifiants des remplaçants enseignant la matière (ou parmi `remplacants`) libres sur le
+        créneau : heures disponibles, cours qu'ils assurent et, à une date donnée, missions acceptées
+        """
+        if remplacants is None:
+            remplacants = sorted(self.matieres_remplacants.get(matiere_id, ()))
+        remplacants = [remplacant_id for remplacant_id in remplacants if remplacant_id in self.remplacants]
+        if date is not None:
+            remplacants = [remplacant_id for remplacant_id in remplacants if self._disponible_le(remplacant_id, date)]
+        if not remplacants:
+            return []
+
+        masque = self.masque(jour, debut, fin, semaine)
+        table = self.tables['remplacant']
+        occupation = table.bits[[table.lignes[remplacant_id] for remplacant_id in remplacants]]
+        for ligne, remplacant_id in enumerate(remplacants):
+            occupation[ligne] |= self.tables['enseignant'].semaine(self.remplacants[remplacant_id][0])
+            if date is not None and (remplacant_id, date) in self.missions:
+                occupation[ligne] |= self.missions[(remplacant_id, date)]
+        occupees = (occupation & masque).any(axis=(1, 2, 3))
+        return [remplacant_id for remplacant_id, occupee in zip(remplacants, occupees) if not occupee]
+
+
+def _cours_occupants(Cours, etablissement, emploi_temps=None):
+    """Cours occupant les ressources : ceux de l'emploi du temps donné, sinon des emplois du temps actifs"""
+    cours = cours_planifies(Cours.objects)
+    if emploi_temps is not None:
+        return cours.filter(emploi_temps=emploi_temps)
+    return cours.filter(emploi_temps__etablissement=etablissement, emploi_temps__statut='actif')
+
+
+def _version(etablissement, emploi_temps=None):
+    """
+    Empreinte des données sources de l'index, en une requête : dernière modification et nombre de
+    lignes de chacun des querysets chargés par IndexDisponibilites. Les matières de classe et celles
+    des remplaçants, sans updated_at, sont suivies par celui de leur classe et de leur remplaçant,
+    avancé par les signaux de l'application (signals.py).
+    """
+    from django.db.models import Count, Max, Q
+    from apps.accounts.models import ProfilEnseignant
+    from apps.etablissements.models import Etablissement, Salle, ClasseMatiere
+    from apps.remplacements.models import Remplacant, Remplacement
+    from .models import Cours
+
+    cours = _cours_occupants(Cours, etablissement, emploi_temps)
+    classes_matieres = ClasseMatiere.objects.filter(
+        classe__etablissement=etablissement, enseignant_principal__isnull=False
+    )
+    remplacants = Remplacant.objects.filter(etablissement=etablissement, statut='disponible')
+    sources = [
+        (cours, 'updated_at'),
+        (classes_matieres, 'classe__updated_at'),
+        (Salle.objects.filter(etablissement=etablissement, actif=True), 'updated_at'),
+        (remplacants, 'updated_at'),
+        (ProfilEnseignant.objects.filter(
+            Q(user_id__in=cours.values('enseignant_id')) |
+            Q(user_id__in=classes_matieres.values('enseignant_principal_id')) |
+            Q(user_id__in=remplacants.values('enseignant_id'))
+        ), 'updated_at'),
+        (Remplacement.objects.filter(remplacant__in=remplacants, statut__in=['accepte', 'effectue']), 'updated_at'),
+    ]
+    colonnes = {}
+    for i, (queryset, champ) in enumerate(sources):
+        colonnes[f'modification_{i}'] = _agregat(queryset, Max(champ))
+        colonnes[f'lignes_{i}'] = _agregat(queryset, Count('id'))
+    return Etablissement.objects.filter(pk=etablissement.pk).annotate(**colonnes).values_list(*colonnes).get()
+
+
+def _agregat(queryset, fonction):
+    """Sous-requête scalaire d'un agrégat sur l'ensemble du queryset"""
+    from django.db.models import Subquery, Value
+
+    return Subquery(
+        queryset.order_by().annotate(ensemble=Value(1)).values('ensemble').annotate(valeur=fonction).values('valeur')
+    )
+
+
+# Cache LRU des index : {(etablissement_id, emploi_temps_id): (version, index)}, du moins au plus
+# récemment utilisé. Une nouvelle version remplace la précédente sous la même clé.
+_cache_index = OrderedDict()
+_verrou_cache = threading.Lock()
+
+
+def index_disponibilites(etablissement, emploi_temps=None):
+    """Retourne l'index des disponibilités de l'établissement, reconstruit si ses données ont changé"""
+    from django.conf import settings
+
+    cle = (etablissement.id, emploi_temps.id if emploi_temps is not None else None)
+    version = _version(etablissement, emploi_temps)
+    with _verrou_cache:
+        entree = _cache_index.get(cle)
+        if entree is not None and entree[0] == version:
+            _cache_index.move_to_end(cle)
+            return entree[1]
+
+    index = IndexDisponibilites(etablissement, emploi_temps)
+    with _verrou_cache:
+        _cache_index[cle] = (version, index)
+        _cache_index.move_to_end(cle)
+        while len(_cache_index) > max(getattr(settings, 'DISPONIBILITES_TAILLE_CACHE', 32), 1):
+            _cache_index.popitem(last=False)
+    logger.info(f"Index des disponibilités de {etablissement.nom} reconstruit")
+    return index
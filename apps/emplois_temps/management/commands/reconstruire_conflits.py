@@ -0,0 +1,24 @@
+"""
+Reconstruit l'index des conflits (ConflitCours) des emplois du temps
+"""
+from django.core.management.base import BaseCommand
+
+from apps.emplois_temps.models import EmploiTemps
+from apps.emplois_temps.conflits import reconstruire_index_conflits
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index des conflits des emplois du temps (tous, ou ceux indiqués)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('emplois_temps', nargs='*', type=int, help="Identifiants d'emplois du temps")
+
+    def handle(self, *args, **options):
+        emplois_temps = EmploiTemps.objects.all()
+        if options['emplois_temps']:
+            emplois_temps = emplois_temps.filter(id__in=options['emplois_temps'])
+
+        total = 0
+        for emploi_temps in emplois_temps:
+            total += reconstruire_index_conflits(emploi_temps)
+        self.stdout.write(self.style.SUCCESS(f"{emplois_temps.count()} emplois du temps indexés, {total} conflits"))
@@ -2,6 +2,7 @@
 Modèles pour la gestion des emplois du temps
 """
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -93,6 +94,13 @@ class Cours(models.Model):
         (7, 'Dimanche'),
     ]
 
+    # Alternance : un cours de semaine A ou B n'a lieu qu'une semaine sur deux
+    SEMAINES = [
+        ('toutes', 'Toutes les semaines'),
+        ('A', 'Semaine A'),
+        ('B', 'Semaine B'),
+    ]
+
     emploi_temps = models.ForeignKey(EmploiTemps, on_delete=models.CASCADE, related_name='cours')
     classe = models.ForeignKey('etablissements.Classe', on_delete=models.CASCADE, related_name='cours')
     matiere = models.ForeignKey('etablissements.Matiere', on_delete=models.CASCADE, related_name='cours')
@@ -100,6 +108,7 @@ class Cours(models.Model):
     salle = models.ForeignKey('etablissements.Salle', on_delete=models.CASCADE, related_name='cours')
     
     jour_semaine = models.PositiveIntegerField(choices=JOURS_SEMAINE)
+    semaine = models.CharField(max_length=10, choices=SEMAINES, default='toutes')
     heure_debut = models.TimeField()
     heure_fin = models.TimeField()
     duree = models.PositiveIntegerField()  # en minutes
@@ -141,7 +150,7 @@ class Cours(models.Model):
         verbose_name = 'Cours'
         verbose_name_plural = 'Cours'
         ordering = ['jour_semaine', 'heure_debut']
-        unique_together = ['emploi_temps', 'classe', 'jour_semaine', 'heure_debut']
+        unique_together = ['emploi_temps', 'classe', 'jour_semaine', 'heure_debut', 'semaine']
 
     def __str__(self):
         return f"{self.matiere.nom} - {self.classe.nom} - {self.get_jour_semaine_display()} {self.heure_debut}"
@@ -151,18 +160,37 @@ class Cours(models.Model):
         return self.duree / 60.0
 
     def is_en_conflit(self):
-        """Vérifie s'il y a des conflits avec d'autres cours"""
-        conflits = Cours.objects.filter(
-            emploi_temps=self.emploi_temps,
-            jour_semaine=self.jour_semaine,
-            enseignant=self.enseignant
-        ).exclude(id=self.id).filter(
-            models.Q(
-                heure_debut__lt=self.heure_fin,
-                heure_fin__gt=self.heure_debut
-            )
-        )
-        return conflits.exists()
+        """Vérifie s'il y a des conflits avec d'autres cours (lecture de l'index ConflitCours)"""
+        return ConflitCours.objects.filter(
+            models.Q(cours1_id=self.id) | models.Q(cours2_id=self.id)
+        ).exists()
+
+
+class ConflitCours(models.Model):
+    """
+    Index matérialisé des conflits : paire de cours non annulés du même emploi du temps qui se
+    chevauchent sur une même ressource. Tenu à jour par les signaux de Cours (voir conflits.py).
+    """
+    RESSOURCE_CHOICES = [
+        ('enseignant', 'Enseignant'),
+        ('salle', 'Salle'),
+        ('classe', 'Classe'),
+    ]
+
+    emploi_temps = models.ForeignKey(EmploiTemps, on_delete=models.CASCADE, related_name='conflits')
+    # cours1_id < cours2_id
+    cours1 = models.ForeignKey(Cours, on_delete=models.CASCADE, related_name='conflits_cours1')
+    cours2 = models.ForeignKey(Cours, on_delete=models.CASCADE, related_name='conflits_cours2')
+    ressource = models.CharField(max_length=20, choices=RESSOURCE_CHOICES)
+
+    class Meta:
+        db_table = 'conflits_cours'
+        verbose_name = 'Conflit de cours'
+        verbose_name_plural = 'Conflits de cours'
+        unique_together = ['cours1', 'cours2', 'ressource']
+
+    def __str__(self):
+        return f"Conflit {self.get_ressource_display().lower()} entre les cours {self.cours1_id} et {self.cours2_id}"
 
 
 class Contrainte(models.Model):
@@ -205,6 +233,14 @@ class Contrainte(models.Model):
     def __str__(self):
         return f"{self.nom} ({self.get_priorite_display()})"
 
+    def clean(self):
+        """Valide la règle JSON avec le compilateur de règles de l'optimiseur"""
+        from apps.ia_optimisation.regles import compiler_regle, RegleInvalide
+        try:
+            compiler_regle(self.regle)
+        except RegleInvalide as e:
+            raise ValidationError({'regle': str(e)})
+
 
 class HistoriqueEmploiTemps(models.Model):
     """
@@ -0,0 +1,48 @@
+"""
+Signaux de l'application emplois du temps
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.etablissements.models import Classe, ClasseMatiere
+from apps.remplacements.models import Remplacant
+from .models import Cours
+from .conflits import mettre_a_jour_conflits_cours
+
+
+@receiver(post_save, sender=Cours)
+def cours_enregistre(sender, instance, raw=False, **kwargs):
+    """Met à jour l'index des conflits du cours enregistré"""
+    # Chargement de fixtures : l'index est reconstruit ensuite par reconstruire_index_conflits
+    if raw:
+        return
+    mettre_a_jour_conflits_cours(instance)
+
+
+# Les matières de classe et les matières des remplaçants n'ont pas d'updated_at : l'empreinte de
+# l'index des disponibilités (disponibilites._version) suit celui de leur classe et de leur remplaçant
+
+@receiver(post_save, sender=ClasseMatiere)
+@receiver(post_delete, sender=ClasseMatiere)
+def classe_matiere_modifiee(sender, instance, **kwargs):
+    """Avance la date de modification de la classe"""
+    Classe.objects.filter(pk=instance.classe_id).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Remplacant.matieres_enseignees.through)
+def matieres_remplacant_modifiees(sender, instance, action, reverse, pk_set, **kwargs):
+    """Avance la date de modification des remplaçants dont les matières ont changé"""
+    if reverse and action == 'pre_clear':
+        # Matière retirée à tous ses remplaçants : ils ne sont plus connus après le retrait
+        instance._remplacants_retires = list(instance.remplacants.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        remplacants = [instance.pk]
+    elif action == 'post_clear':
+        remplacants = instance.__dict__.pop('_remplacants_retires', [])
+    else:
+        remplacants = pk_set
+    Remplacant.objects.filter(pk__in=remplacants).update(updated_at=timezone.now())
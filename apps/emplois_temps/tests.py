@@ -0,0 +1,215 @@
+"""
+Tests de l'index des conflits d'emploi du temps (conflits.py et signaux de Cours) et du cache de
+l'index des disponibilités (disponibilites.py)
+"""
+from datetime import date, time
+
+from django.test import SimpleTestCase, TestCase
+
+from apps.accounts.models import ProfilEnseignant, User
+from apps.etablissements.models import Academie, Classe, ClasseMatiere, Etablissement, Matiere, Salle
+from apps.remplacements.models import Remplacant
+from . import disponibilites
+from .conflits import paires_chevauchantes, reconstruire_index_conflits
+from .disponibilites import index_disponibilites
+from .models import ConflitCours, Cours, EmploiTemps, Periode
+
+
+class PairesChevauchantesTests(SimpleTestCase):
+
+    def paires(self, intervalles):
+        return {frozenset(paire) for paire in paires_chevauchantes(intervalles)}
+
+    def test_intervalles_contigus_sans_chevauchement(self):
+        self.assertEqual(self.paires([(8, 9, 'a'), (9, 10, 'b'), (10, 11, 'c')]), set())
+
+    def test_intervalles_chevauchants(self):
+        self.assertEqual(
+            self.paires([(8, 10, 'a'), (9, 11, 'b'), (10, 12, 'c'), (13, 14, 'd')]),
+            {frozenset('ab'), frozenset('bc')},
+        )
+
+    def test_intervalle_englobant(self):
+        self.assertEqual(
+            self.paires([(8, 12, 'a'), (9, 10, 'b'), (10, 11, 'c')]),
+            {frozenset('ab'), frozenset('ac')},
+        )
+
+    def test_memes_bornes(self):
+        self.assertEqual(self.paires([(8, 9, 'a'), (8, 9, 'b')]), {frozenset('ab')})
+
+
+class EtablissementTestCase(TestCase):
+    """Établissement, ressources et emploi du temps communs aux tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        academie = Academie.objects.create(
+            nom='Académie de test', code='TEST', region='-', ville_chef_lieu='-', adresse='-',
+            telephone='-', email='academie@example.org', recteur='-',
+        )
+        cls.etablissement = Etablissement.objects.create(
+            nom='Collège de test', type_etablissement='college', statut='public', uai='0000000T',
+            academie=academie, adresse='-', code_postal='75001', ville='Paris', departement='75',
+            region='-', telephone='-', email='college@example.org', jours_ouverture=[1, 2, 3, 4, 5],
+        )
+        cls.directeur = User.objects.create(username='directeur', role='directeur')
+        cls.enseignant = User.objects.create(username='enseignant')
+        cls.autre_enseignant = User.objects.create(username='autre_enseignant')
+        cls.salle = Salle.objects.create(nom='S1', type_salle='classe', etablissement=cls.etablissement, capacite=30)
+        cls.autre_salle = Salle.objects.create(nom='S2', type_salle='classe', etablissement=cls.etablissement, capacite=30)
+        cls.classe = Classe.objects.create(nom='6A', niveau='6e', etablissement=cls.etablissement, nombre_eleves=25)
+        cls.autre_classe = Classe.objects.create(nom='6B', niveau='6e', etablissement=cls.etablissement, nombre_eleves=25)
+        cls.matiere = Matiere.objects.create(nom='Mathématiques', code='MATHS_TEST', niveau_enseignement='college')
+        periode = Periode.objects.create(
+            nom='T1', etablissement=cls.etablissement, date_debut=date(2026, 9, 1), date_fin=date(2026, 12, 20),
+            numero_periode=1,
+        )
+        cls.emploi_temps = EmploiTemps.objects.create(
+            nom='EDT', etablissement=cls.etablissement, periode=periode, createur=cls.directeur,
+        )
+
+
+class IndexConflitsTests(EtablissementTestCase):
+
+    def creer_cours(self, heure_debut, heure_fin, **champs):
+        valeurs = {
+            'emploi_temps': self.emploi_temps, 'classe': self.classe, 'matiere': self.matiere,
+            'enseignant': self.enseignant, 'salle': self.salle, 'jour_semaine': 1,
+            'heure_debut': time(*heure_debut), 'heure_fin': time(*heure_fin), 'duree': 55,
+        }
+        valeurs.update(champs)
+        return Cours.objects.create(**valeurs)
+
+    def conflits(self):
+        return set(ConflitCours.objects.values_list('cours1_id', 'cours2_id', 'ressource'))
+
+    def test_enregistrement_detecte_les_conflits_par_ressource(self):
+        cours = self.creer_cours((8, 0), (8, 55))
+        autre = self.creer_cours((8, 30), (9, 25), classe=self.autre_classe)
+        self.assertEqual(self.conflits(), {
+            (cours.id, autre.id, 'enseignant'), (cours.id, autre.id, 'salle'),
+        })
+
+    def test_cours_contigus_sans_conflit(self):
+        self.creer_cours((8, 0), (8, 55))
+        self.creer_cours((8, 55), (9, 50), classe=self.autre_classe)
+        self.assertEqual(self.conflits(), set())
+
+    def test_deplacement_retire_le_conflit(self):
+        cours = self.creer_cours((8, 0), (8, 55))
+        autre = self.creer_cours((8, 0), (8, 55), classe=self.autre_classe)
+        self.assertTrue(self.conflits())
+
+        autre.jour_semaine = 2
+        autre.save()
+        self.assertEqual(self.conflits(), set())
+
+        autre.jour_semaine = 1
+        autre.enseignant = self.autre_enseignant
+        autre.save()
+        self.assertEqual(self.conflits(), {(cours.id, autre.id, 'salle')})
+
+    def test_suppression_retire_les_conflits(self):
+        self.creer_cours((8, 0), (8, 55))
+        autre = self.creer_cours((8, 0), (8, 55), classe=self.autre_classe)
+        autre.delete()
+        self.assertEqual(self.conflits(), set())
+
+    def test_annulation_retire_les_conflits(self):
+        self.creer_cours((8, 0), (8, 55))
+        autre = self.creer_cours((8, 0), (8, 55), classe=self.autre_classe)
+        autre.statut = 'annule'
+        autre.save()
+        self.assertEqual(self.conflits(), set())
+
+    def test_semaines_alternees(self):
+        cours = self.creer_cours((8, 0), (8, 55), semaine='A')
+        autre = self.creer_cours((8, 0), (8, 55), classe=self.autre_classe, semaine='B')
+        self.assertEqual(self.conflits(), set())
+
+        autre.semaine = 'toutes'
+        autre.save()
+        self.assertEqual(self.conflits(), {
+            (cours.id, autre.id, 'enseignant'), (cours.id, autre.id, 'salle'),
+        })
+
+        cours.semaine = 'B'
+        cours.save()
+        autre.semaine = 'A'
+        autre.save()
+        self.assertEqual(self.conflits(), set())
+
+    def test_reconstruction_identique_a_la_mise_a_jour(self):
+        self.creer_cours((8, 0), (9, 50))
+        self.creer_cours((8, 55), (9, 50), classe=self.autre_classe, salle=self.autre_salle)
+        self.creer_cours((9, 0), (9, 55), classe=self.autre_classe, enseignant=self.autre_enseignant, semaine='A')
+        incrementaux = self.conflits()
+
+        self.assertEqual(reconstruire_index_conflits(self.emploi_temps), len(incrementaux))
+        self.assertEqual(self.conflits(), incrementaux)
+
+    def test_analyseur_identique_a_l_index(self):
+        from apps.ia_optimisation.algorithms import AnalyseurConflits
+
+        self.creer_cours((8, 0), (8, 55))
+        self.creer_cours((8, 0), (8, 55), classe=self.autre_classe, salle=self.autre_salle)
+        self.creer_cours((8, 30), (9, 25), classe=self.autre_classe, enseignant=self.autre_enseignant, statut='annule')
+        analyses = {
+            (min(c['cours1'], c['cours2']), max(c['cours1'], c['cours2']), c['type'])
+            for c in AnalyseurConflits().analyser_conflits(self.emploi_temps)
+        }
+        self.assertEqual(len(analyses), 1)
+        self.assertEqual(analyses, self.conflits())
+
+
+class CacheIndexDisponibilitesTests(EtablissementTestCase):
+
+    def setUp(self):
+        disponibilites._cache_index.clear()
+
+    def index(self):
+        return index_disponibilites(self.etablissement)
+
+    def test_index_reutilise_sans_modification(self):
+        index = self.index()
+        with self.assertNumQueries(1):
+            self.assertIs(self.index(), index)
+
+    def test_reaffectation_de_l_enseignant_principal(self):
+        classe_matiere = ClasseMatiere.objects.create(
+            classe=self.classe, matiere=self.matiere, heures_semaine=4, enseignant_principal=self.enseignant,
+        )
+        self.assertEqual(self.index().enseignants_libres(self.matiere.id, 1, '08:00', '09:00'), [self.enseignant.id])
+
+        classe_matiere.enseignant_principal = self.autre_enseignant
+        classe_matiere.save()
+        self.assertEqual(
+            self.index().enseignants_libres(self.matiere.id, 1, '08:00', '09:00'), [self.autre_enseignant.id]
+        )
+
+    def test_profil_d_un_enseignant_sans_cours(self):
+        ClasseMatiere.objects.create(
+            classe=self.classe, matiere=self.matiere, heures_semaine=4, enseignant_principal=self.enseignant,
+        )
+        profil = ProfilEnseignant.objects.create(
+            user=self.enseignant, numero_enseignant='E1', specialite='-', niveau_enseignement='college',
+        )
+        self.assertEqual(self.index().enseignants_libres(self.matiere.id, 1, '08:00', '09:00'), [self.enseignant.id])
+
+        profil.disponibilites = {'lundi': [14, 15]}
+        profil.save()
+        self.assertEqual(self.index().enseignants_libres(self.matiere.id, 1, '08:00', '09:00'), [])
+
+    def test_matieres_d_un_remplacant(self):
+        remplacant = Remplacant.objects.create(
+            enseignant=User.objects.create(username='remplacant'), etablissement=self.etablissement,
+            date_debut_disponibilite=date(2026, 9, 1),
+        )
+        self.assertEqual(self.index().remplacants_libres(self.matiere.id, 1, '08:00', '09:00'), [])
+
+        remplacant.matieres_enseignees.add(self.matiere)
+        self.assertEqual(self.index().remplacants_libres(self.matiere.id, 1, '08:00', '09:00'), [remplacant.id])
+
+        self.matiere.remplacants.clear()
+        self.assertEqual(self.index().remplacants_libres(self.matiere.id, 1, '08:00', '09:00'), [])
@@ -18,4 +18,5 @@ urlpatterns = [
     path('api/', views.api_liste_emplois_temps, name='api_liste'),
     path('api/<int:pk>/', views.api_detail_emploi_temps, name='api_detail'),
     path('api/<int:pk>/optimiser/', views.api_optimiser_emploi_temps, name='api_optimiser'),
+    path('api/<int:pk>/salles-libres/', views.api_salles_libres, name='api_salles_libres'),
 ]
\ No newline at end of file
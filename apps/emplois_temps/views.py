@@ -5,8 +5,11 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Q
-from .models import EmploiTemps, Cours, Contrainte
+from django.views.decorators.http import require_http_methods
+from .models import EmploiTemps
+from .conflits import SEMAINES_ALTERNEES
+from .disponibilites import index_disponibilites
+from apps.etablissements.models import Salle
 # from apps.ia_optimisation.algorithms import OptimiseurEmploiTemps, AnalyseurConflits
 
 
@@ -111,11 +114,15 @@ def optimiser_emploi_temps(request, pk):
         return redirect('emplois_temps:liste')
     
     if request.method == 'POST':
-        # Lancer l'optimisation (simplifié)
-        # TODO: Implémenter l'optimisation IA
-        messages.success(request, 'Optimisation terminée avec succès (simulée)')
+        # La résolution est exécutée en tâche de fond (worker Celery, ou thread sans broker)
+        from apps.ia_optimisation.tasks import lancer_optimisation
+        optimisation = lancer_optimisation(emploi_temps, request.user)
+        if optimisation.statut == 'echec':
+            messages.error(request, "L'optimisation n'a pas pu être lancée, veuillez réessayer plus tard")
+            return redirect('emplois_temps:detail', pk=emploi_temps.pk)
+        messages.success(request, 'Optimisation lancée, les résultats seront disponibles à la fin du calcul')
         
-        return redirect('emplois_temps:detail', pk=emploi_temps.pk)
+        return redirect('ia_optimisation:detail_optimisation', pk=optimisation.pk)
     
     return render(request, 'emplois_temps/optimiser.html', {'emploi_temps': emploi_temps})
 
@@ -172,6 +179,7 @@ def api_detail_emploi_temps(request, pk):
             'enseignant': cours.enseignant.get_full_name(),
             'salle': cours.salle.nom,
             'jour_semaine': cours.get_jour_semaine_display(),
+            'semaine': cours.semaine,
             'heure_debut': cours.heure_debut.isoformat(),
             'heure_fin': cours.heure_fin.isoformat(),
         })
@@ -180,6 +188,50 @@ def api_detail_emploi_temps(request, pk):
 
 
 @login_required
+def api_salles_libres(request, pk):
+    """
+    API listant les salles libres sur un créneau (échange ou déplacement de salle)
+    Paramètres : jour, heure_debut, heure_fin, type_salle (optionnel), capacite (optionnelle),
+    semaine (optionnelle, 'A' ou 'B' ; par défaut, salles libres toutes les semaines)
+    """
+    emploi_temps = get_object_or_404(EmploiTemps, pk=pk)
+    
+    # Vérifier les permissions
+    if not request.user.is_rectorat() and emploi_temps.etablissement != request.user.profil_enseignant.etablissement:
+        return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+    
+    try:
+        jour = int(request.GET['jour'])
+        heure_debut = request.GET['heure_debut']
+        heure_fin = request.GET['heure_fin']
+        capacite = int(request.GET.get('capacite', 0))
+        semaine = request.GET.get('semaine') or None
+        if semaine not in (None,) + SEMAINES_ALTERNEES:
+            return JsonResponse({'error': f"semaine doit valoir {' ou '.join(SEMAINES_ALTERNEES)}"}, status=400)
+        index = index_disponibilites(emploi_temps.etablissement, emploi_temps)
+        salles_ids = index.salles_libres(
+            jour, heure_debut, heure_fin, type_salle=request.GET.get('type_salle') or None, capacite_min=capacite,
+            semaine=semaine,
+        )
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'jour, heure_debut et heure_fin (HH:MM) requis'}, status=400)
+    
+    salles = Salle.objects.in_bulk(salles_ids)
+    return JsonResponse({
+        'salles': [
+            {
+                'id': salle_id,
+                'nom': salles[salle_id].nom,
+                'type_salle': salles[salle_id].type_salle,
+                'capacite': salles[salle_id].capacite,
+            }
+            for salle_id in salles_ids
+        ]
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
 def api_optimiser_emploi_temps(request, pk):
     """
     API pour optimiser un emploi du temps
@@ -190,12 +242,19 @@ def api_optimiser_emploi_temps(request, pk):
     if not request.user.is_rectorat() and emploi_temps.etablissement != request.user.profil_enseignant.etablissement:
         return JsonResponse({'error': 'Accès non autorisé'}, status=403)
     
-    # Lancer l'optimisation (simplifié)
-    # TODO: Implémenter l'optimisation IA
+    # La résolution est exécutée en tâche de fond (worker Celery, ou thread sans broker)
+    from apps.ia_optimisation.tasks import lancer_optimisation
+    optimisation = lancer_optimisation(emploi_temps, request.user)
+    if optimisation.statut == 'echec':
+        return JsonResponse({
+            'error': "L'optimisation n'a pas pu être lancée",
+            'optimisation_id': optimisation.id,
+            'statut': optimisation.statut,
+        }, status=503)
+    
     return JsonResponse({
         'success': True,
-        'message': 'Optimisation terminée avec succès (simulée)',
-        'score': 0.95,
-        'conflits_resolus': 5,
-        'temps_calcul': 2.5
-    })
+        'message': 'Optimisation lancée',
+        'optimisation_id': optimisation.id,
+        'statut': optimisation.statut,
+    }, status=202)
@@ -0,0 +1,202 @@
+"""
+Géocodage hors ligne et index spatial des remplaçants
+
+Les coordonnées (latitude, longitude) des établissements et des utilisateurs sont déduites de leur
+code postal, sans appel réseau :
+
+- d'abord dans la table des codes postaux indiquée par le réglage FICHIER_CODES_POSTAUX, si elle
+  existe (CSV « code_postal;latitude;longitude », par exemple tiré de la base officielle des codes
+  postaux) ;
+- sinon avec les coordonnées de la préfecture du département, fournies ci-dessous.
+
+IndexGeographique range les domiciles géocodés des remplaçants d'une académie dans un BallTree
+(distance haversine), pour écarter avant tout calcul de score ceux qui sont trop loin.
+"""
+import csv
+import logging
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+logger = logging.getLogger(__name__)
+
+
+RAYON_TERRE_KM = 6371.0
+
+# Coordonnées de la préfecture de chaque département (métropole et outre-mer)
+COORDONNEES_DEPARTEMENTS = {
+    '01': (46.205, 5.226), '02': (49.564, 3.620), '03': (46.566, 3.333), '04': (44.092, 6.236),
+    '05': (44.559, 6.078), '06': (43.710, 7.262), '07': (44.735, 4.599), '08': (49.773, 4.720),
+    '09': (42.965, 1.607), '10': (48.297, 4.074), '11': (43.213, 2.349), '12': (44.350, 2.575),
+    '13': (43.296, 5.370), '14': (49.183, -0.371), '15': (44.926, 2.440), '16': (45.648, 0.156),
+    '17': (46.160, -1.151), '18': (47.081, 2.399), '19': (45.267, 1.770), '21': (47.322, 5.041),
+    '22': (48.514, -2.765), '23': (46.171, 1.871), '24': (45.184, 0.721), '25': (47.238, 6.024),
+    '26': (44.933, 4.892), '27': (49.027, 1.151), '28': (48.446, 1.489), '29': (47.996, -4.102),
+    '2A': (41.919, 8.738), '2B': (42.697, 9.451), '30': (43.837, 4.360), '31': (43.605, 1.444),
+    '32': (43.646, 0.586), '33': (44.838, -0.579), '34': (43.611, 3.877), '35': (48.117, -1.678),
+    '36': (46.810, 1.691), '37': (47.394, 0.685), '38': (45.188, 5.724), '39': (46.675, 5.555),
+    '40': (43.890, -0.500), '41': (47.586, 1.336), '42': (45.440, 4.387), '43': (45.043, 3.885),
+    '44': (47.218, -1.554), '45': (47.903, 1.909), '46': (44.448, 1.441), '47': (44.203, 0.616),
+    '48': (44.518, 3.500), '49': (47.478, -0.563), '50': (49.116, -1.091), '51': (48.957, 4.363),
+    '52': (48.111, 5.139), '53': (48.073, -0.770), '54': (48.692, 6.184), '55': (48.772, 5.160),
+    '56': (47.658, -2.760), '57': (49.119, 6.176), '58': (46.990, 3.159), '59': (50.629, 3.057),
+    '60': (49.430, 2.081), '61': (48.432, 0.091), '62': (50.291, 2.777), '63': (45.778, 3.087),
+    '64': (43.295, -0.371), '65': (43.233, 0.078), '66': (42.699, 2.895), '67': (48.573, 7.752),
+    '68': (48.079, 7.358), '69': (45.764, 4.836), '70': (47.622, 6.155), '71': (46.307, 4.829),
+    '72': (48.006, 0.199), '73': (45.564, 5.918), '74': (45.899, 6.129), '75': (48.857, 2.352),
+    '76': (49.443, 1.099), '77': (48.540, 2.660), '78': (48.805, 2.120), '79': (46.324, -0.464),
+    '80': (49.894, 2.296), '81': (43.929, 2.148), '82': (44.018, 1.355), '83': (43.124, 5.928),
+    '84': (43.949, 4.806), '85': (46.670, -1.426), '86': (46.580, 0.340), '87': (45.834, 1.261),
+    '88': (48.173, 6.451), '89': (47.798, 3.567), '90': (47.640, 6.863), '91': (48.629, 2.441),
+    '92': (48.892, 2.207), '93': (48.908, 2.440), '94': (48.790, 2.455), '95': (49.036, 2.076),
+    '971': (15.998, -61.726), '972': (14.616, -61.059), '973': (4.922, -52.313),
+    '974': (-20.882, 55.451), '976': (-12.781, 45.228),
+}
+
+_MOTIF_CODE_POSTAL = re.compile(r'\b(\d{5})\b')
+
+
+def departement_code_postal(code_postal):
+    """Code du département d'un code postal ('2A'/'2B' en Corse, 3 chiffres outre-mer), ou None"""
+    if not code_postal or len(code_postal) != 5 or not code_postal.isdigit():
+        return None
+    if code_postal.startswith('97'):
+        return code_postal[:3]
+    if code_postal.startswith('20'):
+        return '2A' if code_postal < '20200' else '2B'
+    return code_postal[:2]
+
+
+@lru_cache(maxsize=1)
+def _table_codes_postaux(chemin):
+    """Coordonnées par code postal lues dans le fichier CSV (premier lieu rencontré pour chaque code)"""
+    table = {}
+    if not chemin:
+        return table
+    try:
+        with open(chemin, encoding='utf-8') as fichier:
+            for ligne in csv.reader(fichier, delimiter=';'):
+                try:
+                    table.setdefault(ligne[0].strip(), (float(ligne[1]), float(ligne[2])))
+                except (IndexError, ValueError):
+                    continue  # en-tête ou ligne sans coordonnées
+    except OSError as e:
+        logger.warning(f"Table des codes postaux {chemin} illisible: {e}")
+    return table
+
+
+def geocoder(code_postal, adresse=''):
+    """
+    (latitude, longitude) d'un code postal, ou du premier code postal trouvé dans l'adresse,
+    ou None s'il n'est pas reconnu
+    """
+    from django.conf import settings
+
+    code_postal = (code_postal or '').strip()
+    if not code_postal:
+        trouve = _MOTIF_CODE_POSTAL.search(adresse or '')
+        code_postal = trouve.group(1) if trouve else ''
+
+    coordonnees = _table_codes_postaux(getattr(settings, 'FICHIER_CODES_POSTAUX', '')).get(code_postal)
+    if coordonnees is None:
+        coordonnees = COORDONNEES_DEPARTEMENTS.get(departement_code_postal(code_postal))
+    return coordonnees
+
+
+def localiser(instance, update_fields=None):
+    """
+    Met à jour les coordonnées d'un établissement ou d'un utilisateur avant son enregistrement,
+    seulement si son code postal ou son adresse ont changé (ou s'il n'est pas encore localisé).
+    Une adresse non reconnue n'efface jamais des coordonnées existantes.
+    Retourne les champs modifiés, à ajouter aux update_fields de save().
+    """
+    if update_fields is not None and not {'code_postal', 'adresse'} & set(update_fields):
+        return []
+    if instance.latitude is not None and instance.pk is not None:
+        enregistre = type(instance)._default_manager.filter(pk=instance.pk).values_list(
+            'code_postal', 'adresse'
+        ).first()
+        if enregistre == (instance.code_postal, instance.adresse):
+            return []
+
+    coordonnees = geocoder(instance.code_postal, instance.adresse)
+    if coordonnees is None or coordonnees == (instance.latitude, instance.longitude):
+        return []
+    instance.latitude, instance.longitude = coordonnees
+    return ['latitude', 'longitude']
+
+
+def distances_km(latitude, longitude, latitudes, longitudes):
+    """Distances (km, à vol d'oiseau) d'un point à un tableau de points"""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAYON_TERRE_KM * np.arcsin(np.sqrt(a))
+
+
+class IndexGeographique:
+    """
+    Domiciles géocodés des remplaçants des établissements d'une académie, dans un BallTree
+    (distance haversine), avec la distance maximale acceptée par chacun
+    """
+
+    def __init__(self, academie):
+        from apps.remplacements.models import Remplacant
+
+        remplacants = list(Remplacant.objects.filter(
+            etablissement__academie=academie,
+            enseignant__latitude__isnull=False,
+            enseignant__longitude__isnull=False,
+        ).values_list('id', 'enseignant__latitude', 'enseignant__longitude', 'distance_max'))
+
+        self.ids = np.array([r[0] for r in remplacants], dtype=int)
+        self.distances_max = np.array([r[3] for r in remplacants], dtype=float)
+        self.localises = set(self.ids.tolist())
+        self.arbre = BallTree(
+            np.radians([(r[1], r[2]) for r in remplacants]), metric='haversine'
+        ) if remplacants else None
+
+    def a_portee(self, latitude, longitude):
+        """{remplacant_id: distance en km} des remplaçants dont la distance maximale couvre le point"""
+        if self.arbre is None:
+            return {}
+        indices, distances = self.arbre.query_radius(
+            np.radians([(latitude, longitude)]), r=self.distances_max.max() / RAYON_TERRE_KM,
+            return_distance=True,
+        )
+        indices, distances = indices[0], distances[0] * RAYON_TERRE_KM
+        retenus = distances <= self.distances_max[indices]
+        return dict(zip(self.ids[indices[retenus]].tolist(), distances[retenus].tolist()))
+
+
+def _version(academie):
+    """Empreinte des remplaçants de l'académie et des domiciles de leurs enseignants"""
+    from django.db.models import Count, Max
+    from apps.remplacements.models import Remplacant
+
+    return tuple(Remplacant.objects.filter(etablissement__academie=academie).aggregate(
+        Max('updated_at'), Count('id'), Max('enseignant__updated_at')
+    ).values())
+
+
+# Cache des index : {academie_id: (version, index)}
+_cache_index = {}
+_verrou_cache = threading.Lock()
+
+
+def index_geographique(academie):
+    """Retourne l'index géographique des remplaçants de l'académie, reconstruit si ses données ont changé"""
+    version = _version(academie)
+    with _verrou_cache:
+        entree = _cache_index.get(academie.id)
+    if entree is not None and entree[0] == version:
+        return entree[1]
+
+    index = IndexGeographique(academie)
+    with _verrou_cache:
+        _cache_index[academie.id] = (version, index)
+    logger.info(f"Index géographique des remplaçants de {academie.nom} reconstruit ({len(index.ids)} localisés)")
+    return index
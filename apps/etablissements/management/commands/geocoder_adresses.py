@@ -0,0 +1,28 @@
+"""
+Recalcule les coordonnées des établissements et des utilisateurs à partir de leur code postal
+"""
+from django.core.management.base import BaseCommand
+
+from apps.accounts.models import User
+from apps.etablissements.models import Etablissement
+from apps.etablissements.geographie import geocoder
+
+
+class Command(BaseCommand):
+    help = "Géocode hors ligne les établissements et les utilisateurs (après import ou changement de table)"
+
+    def handle(self, *args, **options):
+        for modele in (Etablissement, User):
+            objets = list(modele.objects.only('id', 'adresse', 'code_postal', 'latitude', 'longitude'))
+            modifies = []
+            for objet in objets:
+                # Une adresse non reconnue garde ses coordonnées (voir geographie.localiser)
+                coordonnees = geocoder(objet.code_postal, objet.adresse)
+                if coordonnees is not None and coordonnees != (objet.latitude, objet.longitude):
+                    objet.latitude, objet.longitude = coordonnees
+                    modifies.append(objet)
+            modele.objects.bulk_update(modifies, ['latitude', 'longitude'], batch_size=1000)
+            localises = sum(1 for objet in objets if objet.latitude is not None)
+            self.stdout.write(self.style.SUCCESS(
+                f"{modele._meta.verbose_name_plural} : {localises}/{len(objets)} localisés, {len(modifies)} mis à jour"
+            ))
@@ -68,6 +68,8 @@ class Etablissement(models.Model):
     ville = models.CharField(max_length=100)
     departement = models.CharField(max_length=3)
     region = models.CharField(max_length=100)
+    latitude = models.FloatField(blank=True, null=True)  # déduites du code postal (geographie.geocoder)
+    longitude = models.FloatField(blank=True, null=True)
     
     # Contact
     telephone = models.CharField(max_length=20)
@@ -111,6 +113,13 @@ class Etablissement(models.Model):
     def __str__(self):
         return f"{self.nom} ({self.get_type_etablissement_display()})"
 
+    def save(self, *args, **kwargs):
+        from .geographie import localiser
+        champs = localiser(self, kwargs.get('update_fields'))
+        if champs and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = [*kwargs['update_fields'], *champs]
+        super().save(*args, **kwargs)
+
     def get_nombre_enseignants(self):
         return self.enseignants.filter(statut='actif').count()
 
@@ -263,12 +272,11 @@ class Salle(models.Model):
         if not self.actif:
             return False
         
-        # Vérifier les disponibilités spécifiques
-        if self.disponibilites:
-            jour_str = str(jour)
-            if jour_str in self.disponibilites:
-                heures_dispo = self.disponibilites[jour_str]
-                return heure in heures_dispo
+        # Vérifier les disponibilités spécifiques (clés "1" ou "lundi")
+        from apps.emplois_temps.disponibilites import heures_disponibles_jour
+        heures_dispo = heures_disponibles_jour(self.disponibilites, jour)
+        if heures_dispo is not None:
+            return heure in heures_dispo
         
         return True
 
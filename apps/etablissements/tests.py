@@ -0,0 +1,64 @@
+"""
+Tests du géocodage hors ligne (geographie.py)
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.accounts.models import User
+from . import geographie
+from .geographie import COORDONNEES_DEPARTEMENTS, departement_code_postal, geocoder
+
+
+@override_settings(FICHIER_CODES_POSTAUX='')
+class GeocodageTests(SimpleTestCase):
+
+    def test_departement_code_postal(self):
+        self.assertEqual(departement_code_postal('75001'), '75')
+        self.assertEqual(departement_code_postal('20000'), '2A')
+        self.assertEqual(departement_code_postal('20200'), '2B')
+        self.assertEqual(departement_code_postal('97400'), '974')
+        for code_postal in ('', None, '7500', 'ABCDE'):
+            self.assertIsNone(departement_code_postal(code_postal))
+
+    def test_geocoder(self):
+        self.assertEqual(geocoder('69003'), COORDONNEES_DEPARTEMENTS['69'])
+        self.assertEqual(geocoder('', '12 rue de la Paix 75002 Paris'), COORDONNEES_DEPARTEMENTS['75'])
+        self.assertIsNone(geocoder('', 'adresse inconnue'))
+
+
+@override_settings(FICHIER_CODES_POSTAUX='')
+class LocalisationTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(geographie, 'geocoder', wraps=geocoder)
+        self.geocoder = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_localisation_a_la_creation(self):
+        utilisateur = User.objects.create(username='enseignant', code_postal='69003')
+        utilisateur.refresh_from_db()
+        self.assertEqual((utilisateur.latitude, utilisateur.longitude), COORDONNEES_DEPARTEMENTS['69'])
+
+    def test_geocodage_seulement_si_l_adresse_change(self):
+        utilisateur = User.objects.create(username='enseignant', code_postal='69003')
+        self.geocoder.reset_mock()
+
+        utilisateur.first_name = 'Camille'
+        utilisateur.save()
+        utilisateur.save(update_fields=['first_name'])
+        self.geocoder.assert_not_called()
+
+        utilisateur.code_postal = '33000'
+        utilisateur.save(update_fields=['code_postal'])
+        self.geocoder.assert_called_once()
+        utilisateur.refresh_from_db()
+        self.assertEqual((utilisateur.latitude, utilisateur.longitude), COORDONNEES_DEPARTEMENTS['33'])
+
+    def test_adresse_non_reconnue_garde_les_coordonnees(self):
+        utilisateur = User.objects.create(username='enseignant', code_postal='69003')
+        utilisateur.code_postal = ''
+        utilisateur.adresse = 'adresse inconnue'
+        utilisateur.save()
+        utilisateur.refresh_from_db()
+        self.assertEqual((utilisateur.latitude, utilisateur.longitude), COORDONNEES_DEPARTEMENTS['69'])
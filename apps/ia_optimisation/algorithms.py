@@ -4,6 +4,7 @@ Algorithmes d'optimisation et d'intelligence artificielle pour Edtia
 import numpy as np
 import pandas as pd
 from ortools.sat.python import cp_model
+from scipy.optimize import linear_sum_assignment
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
@@ -11,112 +12,2255 @@ from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_sc
 import joblib
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from django.db import connections
+import multiprocessing
+import os
+import heapq
+import random
+import threading
+import time
 import logging
 
+from .regles import regles_etablissement, POIDS_PRIORITE, PRIORITE_DURE
+from .faisabilite import analyser_faisabilite
+from .instantanes import exporter_instantane, exporter_modele_qualite
+from apps.emplois_temps.conflits import (
+    cours_planifies, paires_chevauchantes, reconstruire_index_conflits, semaines_communes, semaines_cours,
+    SEMAINES_ALTERNEES,
+)
+from apps.emplois_temps.disponibilites import (
+    en_minutes, heures_disponibles_jour, index_disponibilites, quarts, semaine_indisponible, QUARTS_JOUR
+)
+from apps.etablissements.geographie import index_geographique
+
 logger = logging.getLogger(__name__)
 
 
+def _indiquer_solution(modele, valeurs):
+    """Remplace les indications du modèle par une solution complète (valeurs par index de variable)"""
+    modele.ClearHints()
+    indication = modele.Proto().solution_hint
+    indication.vars.extend(range(len(valeurs)))
+    indication.values.extend(valeurs)
+
+
+def recalculer_score(detail_objectif, poids):
+    """
+    Score d'une solution pour d'autres poids, à partir de son détail d'objectif
+    (voir OptimiseurEmploiTemps._extraire_solution), sans nouvelle résolution.
+    """
+    return sum(
+        terme['valeur'] * poids.get(nom, terme['poids'])
+        for nom, terme in detail_objectif.items()
+    )
+
+
+def domine(vecteur, autre):
+    """Vrai si le vecteur d'objectifs (à minimiser) domine l'autre au sens de Pareto"""
+    return all(a <= b for a, b in zip(vecteur, autre)) and any(a < b for a, b in zip(vecteur, autre))
+
+
+def front_pareto(candidats, criteres):
+    """
+    Candidats non dominés sur les critères donnés, comparés par leur vecteur d'objectifs
+    ({critère: valeur}). Un seul candidat est conservé par vecteur.
+    """
+    vecteurs = [tuple(candidat['objectifs'][nom] for nom in criteres) for candidat in candidats]
+    front = {}
+    for candidat, vecteur in sorted(zip(candidats, vecteurs), key=lambda item: (item[1], item[0]['score'])):
+        if vecteur not in front and not any(domine(autre, vecteur) for autre in vecteurs):
+            front[vecteur] = candidat
+    return list(front.values())
+
+
+class GrilleHoraire:
+    """
+    Discrétisation de la semaine d'un établissement en créneaux.
+
+    Un instant est encodé par un entier unique t = indice_jour * creneaux_par_jour + creneau,
+    ce qui permet de représenter chaque cours par une seule variable de début.
+    """
+
+    def __init__(self, etablissement):
+        self.duree_creneau = etablissement.duree_creneau or 55
+        self.debut = en_minutes(etablissement.heures_debut_journee)
+        fin = en_minutes(etablissement.heures_fin_journee)
+        self.jours = sorted(etablissement.jours_ouverture or [1, 2, 3, 4, 5])
+        self.creneaux_par_jour = max((fin - self.debut) // self.duree_creneau, 1)
+        self.horizon = len(self.jours) * self.creneaux_par_jour
+        self._quarts_creneaux = None
+
+    def nombre_creneaux(self, duree):
+        """Nombre de créneaux occupés par un cours de `duree` minutes"""
+        return max(-(-duree // self.duree_creneau), 1)
+
+    def indice(self, jour_semaine, heure):
+        """Retourne l'instant t d'un (jour, heure), ou None hors de la grille"""
+        if jour_semaine not in self.jours:
+            return None
+        creneau = (en_minutes(heure) - self.debut) // self.duree_creneau
+        if not 0 <= creneau < self.creneaux_par_jour:
+            return None
+        return self.jours.index(jour_semaine) * self.creneaux_par_jour + creneau
+
+    def jour_et_heure(self, t):
+        """Retourne le (jour_semaine, heure de début) d'un instant t"""
+        indice_jour, creneau = divmod(t, self.creneaux_par_jour)
+        minutes = self.debut + creneau * self.duree_creneau
+        return self.jours[indice_jour], (datetime.min + timedelta(minutes=minutes)).time()
+
+    def heure_creneau(self, creneau):
+        """Heure pleine à laquelle commence un créneau (pour les disponibilités JSON)"""
+        return (self.debut + creneau * self.duree_creneau) // 60
+
+    def creneaux_entre(self, debut, fin):
+        """Créneaux d'une journée entièrement compris entre deux heures"""
+        debut, fin = en_minutes(debut), en_minutes(fin)
+        return [
+            creneau for creneau in range(self.creneaux_par_jour)
+            if self.debut + creneau * self.duree_creneau >= debut and
+            self.debut + (creneau + 1) * self.duree_creneau <= fin
+        ]
+
+    def domaine_debut(self, nb_creneaux):
+        """Domaine des débuts possibles d'un cours sans déborder sur le jour suivant"""
+        dernier = self.creneaux_par_jour - nb_creneaux
+        if dernier < 0:
+            return cp_model.Domain.FromValues([])
+        return cp_model.Domain.FromIntervals([
+            [i * self.creneaux_par_jour, i * self.creneaux_par_jour + dernier]
+            for i in range(len(self.jours))
+        ])
+
+    def creneaux_bloques(self, disponibilites):
+        """
+        Convertit des disponibilités JSON ({"lundi": [8, 9], ...}) en plages bloquées (début, taille).
+        Un jour absent du dictionnaire est considéré comme entièrement disponible.
+        """
+        if not disponibilites:
+            return []
+        return self.plages_bloquees(semaine_indisponible(disponibilites))
+
+    def plages_bloquees(self, semaine):
+        """
+        Plages (début, taille) des créneaux touchant au moins un quart d'heure occupé
+        d'une semaine 7 × 96 (voir apps.emplois_temps.disponibilites)
+        """
+        if self._quarts_creneaux is None:
+            jours, premiers, derniers = [], [], []
+            for t in range(self.horizon):
+                indice_jour, creneau = divmod(t, self.creneaux_par_jour)
+                debut = self.debut + creneau * self.duree_creneau
+                premier, dernier = quarts(debut, debut + self.duree_creneau)
+                jours.append(self.jours[indice_jour] - 1)
+                premiers.append(min(premier, QUARTS_JOUR))
+                derniers.append(min(dernier, QUARTS_JOUR))
+            self._quarts_creneaux = (np.array(jours), np.array(premiers), np.array(derniers))
+
+        # Quarts occupés cumulés par jour : un créneau est bloqué si le cumul augmente sur sa durée
+        cumul = np.zeros((semaine.shape[0], QUARTS_JOUR + 1), dtype=np.int32)
+        np.cumsum(semaine, axis=1, out=cumul[:, 1:])
+        jours, premiers, derniers = self._quarts_creneaux
+        bloques = cumul[jours, derniers] > cumul[jours, premiers]
+
+        plages = []
+        for indice_jour in range(len(self.jours)):
+            base = indice_jour * self.creneaux_par_jour
+            debut_plage = None
+            for creneau in range(self.creneaux_par_jour + 1):
+                bloque = creneau < self.creneaux_par_jour and bloques[base + creneau]
+                if bloque and debut_plage is None:
+                    debut_plage = creneau
+                elif not bloque and debut_plage is not None:
+                    plages.append((base + debut_plage, creneau - debut_plage))
+                    debut_plage = None
+        return plages
+
+
+class SuiviSolutions(cp_model.CpSolverSolutionCallback):
+    """
+    Callback CP-SAT enregistrant chaque solution améliorante (objectif, borne, temps écoulé).
+
+    La progression est recopiée dans l'OptimisationEmploiTemps suivie au plus une fois
+    par `intervalle_sauvegarde` secondes pour ne pas ralentir la recherche.
+    `annuler()` peut être appelé depuis un autre thread pour interrompre la résolution.
+    """
+
+    def __init__(self, optimisation=None, intervalle_sauvegarde=1.0):
+        super().__init__()
+        self.optimisation = optimisation
+        self.intervalle_sauvegarde = intervalle_sauvegarde
+        self.progression = []
+        self.annule = False
+        self._derniere_sauvegarde = None
+        self._thread_appelant = threading.current_thread()
+
+    def annuler(self):
+        """Interrompt la recherche en cours ; les phases suivantes ne sont pas lancées"""
+        self.annule = True
+        self.StopSearch()
+
+    def on_solution_callback(self):
+        if self.annule:
+            self.StopSearch()
+        temps = self.WallTime()
+        self.progression.append({
+            'objectif': self.ObjectiveValue(),
+            'borne': self.BestObjectiveBound(),
+            'temps': temps,
+        })
+
+        if self.optimisation is not None and (
+            self._derniere_sauvegarde is None or
+            temps - self._derniere_sauvegarde >= self.intervalle_sauvegarde
+        ):
+            self.sauvegarder()
+            self._derniere_sauvegarde = temps
+
+    def sauvegarder(self):
+        """Enregistre la progression courante dans l'optimisation suivie"""
+        if self.optimisation is None or not self.progression:
+            return
+
+        from django.db import connection
+        from .models import OptimisationEmploiTemps
+
+        derniere = self.progression[-1]
+        try:
+            OptimisationEmploiTemps.objects.filter(pk=self.optimisation.pk).update(
+                progression=self.progression,
+                score_optimise=derniere['objectif'],
+                temps_calcul=derniere['temps'],
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement de la progression: {e}")
+        finally:
+            # Les callbacks sont appelés depuis les threads du solveur
+            if threading.current_thread() is not self._thread_appelant:
+                connection.close()
+
+
+# Fréquence (en secondes) à laquelle une optimisation en cours vérifie si elle a été annulée
+INTERVALLE_ANNULATION = 1.0
+
+
+class SurveillanceAnnulation(threading.Thread):
+    """
+    Thread arrêtant la recherche d'un optimiseur dès que son optimisation passe au statut 'annule'.
+    L'annulation est demandée depuis un autre processus (vue web) et lue en base. Les résolutions
+    lancées dans un pool (composantes, candidats du portefeuille) ont chacune leur surveillance.
+    """
+
+    def __init__(self, optimisation_id, optimiseur, intervalle=INTERVALLE_ANNULATION):
+        super().__init__(daemon=True)
+        self.optimisation_id = optimisation_id
+        self.optimiseur = optimiseur
+        self.intervalle = intervalle
+        self.annulee = False
+        self._fin = threading.Event()
+
+    def run(self):
+        from django.db import connection
+        from .models import OptimisationEmploiTemps
+
+        try:
+            while not self._fin.wait(self.intervalle):
+                if not self.annulee:
+                    self.annulee = OptimisationEmploiTemps.objects.filter(
+                        pk=self.optimisation_id, statut='annule'
+                    ).exists()
+                # Répété à chaque tour : le suivi change d'une phase de résolution à l'autre
+                if self.annulee and self.optimiseur.suivi is not None:
+                    self.optimiseur.suivi.annuler()
+        except Exception as e:
+            logger.error(f"Erreur lors de la surveillance de l'optimisation {self.optimisation_id}: {e}")
+        finally:
+            connection.close()
+
+    def arreter(self):
+        self._fin.set()
+        self.join()
+
+
+def composantes_independantes(emploi_temps):
+    """
+    Découpe un emploi du temps en ensembles de cours indépendants.
+
+    Le graphe d'interaction relie classes, enseignants et salles dès qu'un cours, une
+    ClasseMatiere (enseignant principal) ou une salle principale de classe les associe.
+    Retourne une liste d'ensembles d'identifiants de cours, un par composante connexe.
+    """
+    from apps.etablissements.models import ClasseMatiere, Classe
+
+    parents = {}
+
+    def trouver(noeud):
+        parents.setdefault(noeud, noeud)
+        while parents[noeud] != noeud:
+            parents[noeud] = parents[parents[noeud]]
+            noeud = parents[noeud]
+        return noeud
+
+    def unir(a, b):
+        racine_a, racine_b = trouver(a), trouver(b)
+        if racine_a != racine_b:
+            parents[racine_a] = racine_b
+
+    cours = list(cours_planifies(emploi_temps.cours).values_list(
+        'id', 'classe_id', 'enseignant_id', 'salle_id'
+    ))
+    for _, classe_id, enseignant_id, salle_id in cours:
+        unir(('classe', classe_id), ('enseignant', enseignant_id))
+        unir(('classe', classe_id), ('salle', salle_id))
+
+    etablissement_id = emploi_temps.etablissement_id
+    for classe_id, enseignant_id in ClasseMatiere.objects.filter(
+        classe__etablissement_id=etablissement_id, enseignant_principal__isnull=False
+    ).values_list('classe_id', 'enseignant_principal_id'):
+        unir(('classe', classe_id), ('enseignant', enseignant_id))
+
+    for classe_id, salle_id in Classe.objects.filter(
+        etablissement_id=etablissement_id, salle_principale__isnull=False
+    ).values_list('id', 'salle_principale_id'):
+        unir(('classe', classe_id), ('salle', salle_id))
+
+    composantes = {}
+    for cours_id, classe_id, _, _ in cours:
+        composantes.setdefault(trouver(('classe', classe_id)), set()).add(cours_id)
+    return list(composantes.values())
+
+
+def groupe_salle(salle):
+    """
+    Groupe de salles interchangeables pour l'attribution des salles en seconde phase :
+    même type et mêmes équipements, quelle que soit la capacité
+    """
+    return salle.type_salle, tuple(sorted(str(equipement) for equipement in salle.equipements or []))
+
+
+def _placements(solution):
+    """Placements compacts d'une solution, transmis entre processus : (cours_id, jour, début, fin, salle_id)"""
+    return [
+        (c['cours'].id, c['jour_semaine'], c['heure_debut'], c['heure_fin'], c.get('salle_id', c['cours'].salle_id))
+        for c in solution['cours_optimises']
+    ]
+
+
+def _initialiser_processus():
+    """Initialise Django dans un processus du pool (nécessaire avec la méthode 'spawn')"""
+    import django
+    django.setup()
+
+
+def _pool_execution(nb_processus):
+    """
+    Pool de processus pour les résolutions parallèles.
+    Les processus démons (workers Celery prefork) ne peuvent pas créer de processus fils :
+    on se replie alors sur des threads, CP-SAT relâchant le GIL pendant la résolution.
+    """
+    if multiprocessing.current_process().daemon:
+        return ThreadPoolExecutor(max_workers=nb_processus)
+    return ProcessPoolExecutor(max_workers=nb_processus, initializer=_initialiser_processus)
+
+
+def _optimiser_surveille(optimisation_id, optimiseur, emploi_temps, **options):
+    """
+    Lance optimiseur.optimiser dans un processus du pool, interrompu si l'optimisation suivie
+    (identifiant, ou None) est annulée : sans cela, une résolution en cours irait jusqu'à sa
+    limite de temps malgré l'annulation.
+    """
+    if optimisation_id is None:
+        return optimiseur.optimiser(emploi_temps, **options)
+    surveillance = SurveillanceAnnulation(optimisation_id, optimiseur)
+    surveillance.start()
+    try:
+        return optimiseur.optimiser(emploi_temps, **options)
+    finally:
+        surveillance.arreter()
+
+
+def _optimiser_composante(emploi_temps_id, cours_ids, options):
+    """
+    Résout une composante indépendante (exécuté dans un processus du pool).
+    L'analyse de faisabilité est faite une fois pour tout l'emploi du temps par l'appelant ;
+    en cas d'échec, seul le diagnostic de la composante est retourné.
+    Le temps de la composante est borné par l'échéance commune (horodatage), pour qu'une
+    composante lancée tardivement ne prolonge pas la résolution au-delà du temps maximal.
+    """
+    from apps.emplois_temps.models import EmploiTemps
+
+    options = dict(options)
+    echeance = options.pop('echeance')
+    optimisation_id = options.pop('optimisation_id')
+    options['temps_max'] = max(
+        min(options['temps_max'], echeance - time.time()), OptimiseurEmploiTemps.TEMPS_MIN_COMPOSANTE
+    )
+    emploi_temps = EmploiTemps.objects.select_related('etablissement').get(pk=emploi_temps_id)
+    optimiseur = OptimiseurEmploiTemps(emploi_temps.etablissement, **options)
+    solution = _optimiser_surveille(
+        optimisation_id, optimiseur, emploi_temps, perimetre=cours_ids, verifier=False
+    )
+    if solution is None:
+        return {'echec': True, 'diagnostic': optimiseur.diagnostic}
+    return {
+        'score': solution['score'],
+        'temps_calcul': solution['temps_calcul'],
+        'cours_non_planifies': solution['cours_non_planifies'],
+        'cours_deplaces': solution['cours_deplaces'],
+        'conflits_resolus': solution['conflits_resolus'],
+        'detail_objectif': solution['detail_objectif'],
+        'qualite_optimisee': solution['qualite_optimisee'],
+        'placements': _placements(solution),
+    }
+
+
+def _optimiser_candidat(emploi_temps_id, options):
+    """Résout un candidat du portefeuille (exécuté dans un processus du pool)"""
+    from apps.emplois_temps.models import EmploiTemps
+
+    options = dict(options)
+    optimisation_id = options.pop('optimisation_id')
+    emploi_temps = EmploiTemps.objects.select_related('etablissement').get(pk=emploi_temps_id)
+    optimiseur = OptimiseurEmploiTemps(emploi_temps.etablissement, **options)
+    solution = _optimiser_surveille(optimisation_id, optimiseur, emploi_temps, verifier=False)
+    if solution is None:
+        return None
+    return {
+        'poids': options['poids'],
+        'graine': options['graine'],
+        'score': solution['score'],
+        'temps_calcul': solution['temps_calcul'],
+        'cours_non_planifies': solution['cours_non_planifies'],
+        'detail_objectif': solution['detail_objectif'],
+        'objectifs': {nom: terme['valeur'] for nom, terme in solution['detail_objectif'].items()},
+        'placements': _placements(solution),
+    }
+
+
+def enregistrer_solution(solution, utilisateur, emploi_temps=None, description=None):
+    """
+    Écrit une solution (OptimiseurEmploiTemps, RechercheVoisinageLarge ou composantes) dans la base.
+
+    Les créneaux et salles obtenus sont comparés aux cours existants de l'emploi du temps cible (par défaut
+    celui de la solution) : les cours déplacés sont écrits par UPDATE groupés par créneau et les cours
+    absents de la cible (autre emploi du temps, ex. un brouillon) par bulk_create, dans une seule transaction.
+    Une seule entrée HistoriqueEmploiTemps décrit l'ensemble des changements.
+
+    Un déplacement vers le créneau d'un cours hors solution (annulé ou non planifié) violerait
+    l'unicité (emploi_temps, classe, jour, heure, semaine) : le cours est alors laissé à sa place et signalé.
+    Retourne {'cours_deplaces', 'cours_crees', 'cours_bloques'}.
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from apps.emplois_temps.models import Cours, HistoriqueEmploiTemps
+
+    cible = emploi_temps or solution['emploi_temps']
+    meme_emploi_temps = cible.pk == solution['emploi_temps'].pk
+    existants = {
+        cours.id: cours for cours in Cours.objects.filter(emploi_temps=cible).only(
+            'id', 'classe_id', 'matiere_id', 'enseignant_id', 'salle_id', 'semaine', 'jour_semaine', 'heure_debut',
+            'heure_fin'
+        )
+    }
+
+    def cle_unicite(cours, jour=None, heure_debut=None):
+        if jour is None:
+            jour, heure_debut = cours.jour_semaine, cours.heure_debut
+        return cours.classe_id, jour, heure_debut, cours.semaine
+
+    # Appariement des cours de la solution avec ceux de la cible : par identifiant dans le même
+    # emploi du temps, sinon par (classe, matière, enseignant, salle, semaine)
+    disponibles = {}
+    if not meme_emploi_temps:
+        for cours in existants.values():
+            disponibles.setdefault(
+                (cours.classe_id, cours.matiere_id, cours.enseignant_id, cours.salle_id, cours.semaine), []
+            ).append(cours)
+    deplacements = {}
+    creations = []
+    for entree in solution['cours_optimises']:
+        source = entree['cours']
+        creneau = (entree['jour_semaine'], entree['heure_debut'], entree['heure_fin'], entree.get('salle_id', source.salle_id))
+        if meme_emploi_temps:
+            cours = existants.get(source.id)
+        else:
+            candidats = disponibles.get(
+                (source.classe_id, source.matiere_id, source.enseignant_id, source.salle_id, source.semaine)
+            )
+            cours = candidats.pop() if candidats else None
+        if cours is None:
+            creations.append((source, creneau))
+        elif (cours.jour_semaine, cours.heure_debut, cours.heure_fin, cours.salle_id) != creneau:
+            deplacements[cours.id] = creneau
+
+    # Un déplacement vers le créneau d'un cours immobile est abandonné, ce qui peut
+    # immobiliser d'autres cours : on itère jusqu'à stabilité
+    bloques = []
+    while True:
+        immobiles = {
+            cle_unicite(cours) for cours_id, cours in existants.items() if cours_id not in deplacements
+        }
+        abandonnes = [
+            cours_id for cours_id, (jour, heure_debut, *_) in deplacements.items()
+            if cle_unicite(existants[cours_id], jour, heure_debut) in immobiles
+        ]
+        if not abandonnes:
+            break
+        for cours_id in abandonnes:
+            del deplacements[cours_id]
+        bloques.extend(abandonnes)
+    bloques.extend(
+        source.id for source, (jour, heure_debut, *_) in creations
+        if cle_unicite(source, jour, heure_debut) in immobiles
+    )
+    creations = [
+        (source, creneau) for source, creneau in creations
+        if cle_unicite(source, creneau[0], creneau[1]) not in immobiles
+    ]
+
+    avant = {}
+    apres = {}
+    for cours_id, (jour, heure_debut, heure_fin, salle_id) in deplacements.items():
+        cours = existants[cours_id]
+        avant[cours_id] = [
+            cours.jour_semaine, cours.heure_debut.strftime('%H:%M'), cours.heure_fin.strftime('%H:%M'), cours.salle_id
+        ]
+        apres[cours_id] = [jour, heure_debut.strftime('%H:%M'), heure_fin.strftime('%H:%M'), salle_id]
+
+    # La contrainte d'unicité étant vérifiée ligne par ligne, les cours dont l'ancien créneau est
+    # repris par un autre sont d'abord garés sur des créneaux temporaires (jour 0)
+    repris = {
+        cle_unicite(existants[cours_id], jour, heure_debut)
+        for cours_id, (jour, heure_debut, *_) in deplacements.items()
+    }
+    # Regroupement par créneau : une requête UPDATE par créneau plutôt qu'une expression CASE par
+    # cours (bulk_update), dont la construction domine le temps d'écriture au-delà de quelques centaines de cours
+    a_garer = {}
+    places = {}
+    for cours_id in deplacements:
+        cours = existants[cours_id]
+        if cle_unicite(cours) in repris:
+            place = places[cours.classe_id] = places.get(cours.classe_id, -1) + 1
+            a_garer.setdefault(place, []).append(cours_id)
+    par_creneau = {}
+    for cours_id, creneau in deplacements.items():
+        par_creneau.setdefault(creneau, []).append(cours_id)
+    nouveaux = [
+        Cours(
+            emploi_temps=cible,
+            classe_id=source.classe_id,
+            matiere_id=source.matiere_id,
+            enseignant_id=source.enseignant_id,
+            salle_id=salle_id,
+            semaine=source.semaine,
+            jour_semaine=jour,
+            heure_debut=heure_debut,
+            heure_fin=heure_fin,
+            duree=source.duree,
+            type_cours=source.type_cours,
+            description=source.description,
+            contraintes_specifiques=source.contraintes_specifiques,
+            statut=source.statut,
+        )
+        for source, (jour, heure_debut, heure_fin, salle_id) in creations
+    ]
+
+    maintenant = timezone.now()
+    with transaction.atomic():
+        for place, cours_ids in a_garer.items():
+            Cours.objects.filter(id__in=cours_ids).update(
+                jour_semaine=0, heure_debut=(datetime.min + timedelta(minutes=place)).time()
+            )
+        for (jour, heure_debut, heure_fin, salle_id), cours_ids in par_creneau.items():
+            Cours.objects.filter(id__in=cours_ids).update(
+                jour_semaine=jour, heure_debut=heure_debut, heure_fin=heure_fin, salle_id=salle_id,
+                updated_at=maintenant
+            )
+        crees = Cours.objects.bulk_create(nouveaux, batch_size=500)
+        HistoriqueEmploiTemps.objects.create(
+            emploi_temps=cible,
+            action='modification',
+            utilisateur=utilisateur,
+            description=description or (
+                f"Application d'une optimisation : {len(deplacements)} cours déplacés, "
+                f"{len(crees)} cours créés, {len(bloques)} cours bloqués"
+            ),
+            # Format compact : {cours_id: [jour, début, fin, salle_id]}
+            donnees_avant={'cours': avant},
+            donnees_apres={'cours': apres, 'crees': [cours.id for cours in crees]},
+        )
+        # Les écritures groupées n'émettent pas de signaux : l'index des conflits est recalculé
+        reconstruire_index_conflits(cible)
+
+    logger.info(
+        f"Solution enregistrée dans {cible.nom}: {len(deplacements)} déplacés, "
+        f"{len(crees)} créés, {len(bloques)} bloqués"
+    )
+    return {
+        'cours_deplaces': len(deplacements),
+        'cours_crees': len(crees),
+        'cours_bloques': bloques,
+    }
+
+
 class OptimiseurEmploiTemps:
     """
     Classe pour l'optimisation des emplois du temps avec contraintes
     """
-    
-    def __init__(self, etablissement, contraintes=None):
+
+    # Pénalité appliquée à chaque cours que le solveur ne parvient pas à placer
+    PENALITE_COURS_NON_PLANIFIE = 1000
+
+    # Temps maximal d'une réparation locale (en secondes)
+    TEMPS_MAX_REPARATION = 1.0
+
+    # Temps maximal du diagnostic d'un modèle infaisable, toutes résolutions confondues (en secondes)
+    TEMPS_MAX_DIAGNOSTIC = 10.0
+
+    # Part maximale du temps de résolution accordée à la première phase (placement), le reste étant
+    # réservé aux critères de qualité, et part de la seconde phase consacrée à compléter son indication
+    PART_PREMIERE_PHASE = 0.7
+    PART_COMPLETION_INDICATION = 0.1
+
+    # Temps minimal laissé à une composante de l'optimisation par composantes (en secondes)
+    TEMPS_MIN_COMPOSANTE = 0.5
+
+    # Portefeuille : nombre de candidats par défaut et facteur appliqué au poids du critère privilégié
+    NB_CANDIDATS_PORTEFEUILLE = 8
+    FACTEUR_PORTEFEUILLE = 5
+
+    # Poids par défaut des critères de qualité, surchargés par OptimisationEmploiTemps.poids_contraintes.
+    # Un poids nul retire le critère du modèle.
+    POIDS_OBJECTIF = {
+        'trous_enseignants': 3,
+        'jours_enseignants': 2,
+        'changements_salle': 1,
+        'pause_dejeuner': 20,
+        'matieres_lourdes_apres_midi': 2,
+    }
+
+    # Plage dans laquelle chaque classe doit disposer de sa pause déjeuner
+    FENETRE_DEJEUNER = ('11:00', '14:30')
+
+    # Heure à partir de laquelle un créneau est compté comme l'après-midi
+    DEBUT_APRES_MIDI = '13:00'
+
+    # Attribution des salles : coût d'une salle selon la préférence (salle principale de la classe,
+    # salle actuelle du cours, autre salle du groupe), départagé par les places inutilisées
+    COUT_PREFERENCE_SALLE = 1000
+    COUT_SALLE_INTERDITE = 10 ** 9
+
+    def __init__(self, etablissement, contraintes=None, nb_workers=None, temps_max=None, ecart_relatif=None,
+                 poids_perturbation=0, poids=None, graine=None, attribution_salles=None):
+        from django.conf import settings
+
         self.etablissement = etablissement
         self.contraintes = contraintes or {}
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
+        self.solver.parameters.num_search_workers = (
+            nb_workers if nb_workers is not None else getattr(settings, 'OPTIMISATION_NB_WORKERS', 8)
+        )
+        self.solver.parameters.max_time_in_seconds = (
+            temps_max if temps_max is not None else getattr(settings, 'OPTIMISATION_TEMPS_MAX', 60.0)
+        )
+        self.solver.parameters.relative_gap_limit = (
+            ecart_relatif if ecart_relatif is not None else getattr(settings, 'OPTIMISATION_ECART_RELATIF', 0.01)
+        )
+        if graine is not None:
+            self.solver.parameters.random_seed = graine
+        self.grille = GrilleHoraire(etablissement)
+        self.cours = {}
         self.variables = {}
         self.objectifs = []
-        
-    def optimiser(self, emploi_temps):
+        # Termes de l'objectif par critère : {nom: (poids, [expressions])}
+        self.termes_objectif = {}
+        self.poids = dict(self.POIDS_OBJECTIF)
+        self.poids.update(poids or {})
+        self.suivi = None
+        # Durée de la première phase de la résolution lexicographique (voir _resoudre)
+        self.temps_premiere_phase = 0.0
+        # Faux si les critères de qualité n'ont pas pu être optimisés en seconde phase
+        self.qualite_optimisee = True
+        # Réparation locale : cours hors voisinage, traités comme des occupations constantes
+        self.cours_figes = {}
+        # Termes de violation des contraintes souples, par identifiant de Contrainte
+        self.violations = {}
+        self._figes_par_ressource = {}
+        self._indisponibilites = {}
+        # Perturbation minimale : coût de chaque cours déplacé par rapport à l'emploi du temps de référence
+        self.poids_perturbation = poids_perturbation
+        self.positions_reference = {}
+        self._litteraux_deplacement = {}
+        self._litteraux_jour = {}
+        # Diagnostic d'infaisabilité : {indice du littéral: (littéral, élément)} pour les contraintes
+        # dures conditionnées par une hypothèse (None hors diagnostic, voir expliquer_infaisabilite)
+        self.hypotheses = None
+        # Bilan de faisabilité et contraintes incompatibles de la dernière résolution
+        self.diagnostic = {}
+        # Dossier de l'instantané du modèle, s'il a été exporté (voir _exporter_instantane)
+        self.chemin_instantane = None
+        # Attribution des salles en seconde phase : le modèle ne porte que les capacités des groupes
+        # de salles interchangeables (voir _ajouter_capacites_salles et _attribuer_salles)
+        self.attribution_salles = (
+            attribution_salles if attribution_salles is not None
+            else getattr(settings, 'OPTIMISATION_ATTRIBUTION_SALLES', False)
+        )
+        self._salles_agregees = False
+        # Salles des groupes, par capacité croissante, et (groupe, capacité requise) de chaque cours
+        self._groupes_salles = {}
+        self._besoins_salles = {}
+
+    def optimiser(self, emploi_temps, optimisation=None, reference=None, perimetre=None, verifier=True):
         """
-        Optimise un emploi du temps en respectant les contraintes
+        Optimise un emploi du temps en respectant les contraintes.
+
+        La recherche part des créneaux actuels des cours, ou de ceux de l'emploi du temps
+        `reference` (typiquement la version active). Si une OptimisationEmploiTemps est
+        fournie, chaque solution améliorante y est enregistrée pendant la recherche et un
+        LogOptimisation est créé à la fin. `perimetre` restreint le modèle à un sous-ensemble
+        de cours indépendant du reste (voir optimiser_par_composantes).
+
+        Une analyse de faisabilité précède la résolution (voir analyser_faisabilite) : un problème
+        bloquant évite une résolution vouée à l'échec. Si le modèle se révèle infaisable, le
+        diagnostic indique le plus petit ensemble de contraintes incompatibles trouvé.
         """
         try:
-            # Initialiser le modèle
-            self._initialiser_variables(emploi_temps)
-            
-            # Ajouter les contraintes
-            self._ajouter_contraintes_enseignants()
-            self._ajouter_contraintes_salles()
-            self._ajouter_contraintes_classes()
-            self._ajouter_contraintes_globales()
-            
-            # Définir l'objectif
-            self._definir_objectif()
+            self._charger_poids(optimisation)
+            if verifier and not self._verifier_faisabilite(emploi_temps, optimisation, perimetre):
+                return None
+            self._construire_modele(emploi_temps, reference, perimetre=perimetre)
+            self._exporter_instantane(emploi_temps)
             
             # Résoudre
-            status = self.solver.Solve(self.model)
+            status = self._resoudre(optimisation)
+            self.suivi.sauvegarder()
             
             if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-                return self._extraire_solution(emploi_temps)
+                solution = self._extraire_solution(emploi_temps)
+                self._journaliser(emploi_temps, optimisation, status, solution)
+                return solution
             else:
-                logger.error(f"Optimisation impossible: {status}")
+                logger.error(f"Optimisation impossible: {self.solver.StatusName(status)}")
+                if status == cp_model.INFEASIBLE:
+                    self._expliquer(emploi_temps, reference, perimetre=perimetre)
+                self._journaliser(emploi_temps, optimisation, status)
                 return None
                 
         except Exception as e:
             logger.error(f"Erreur lors de l'optimisation: {e}")
             return None
+
+    def reparer(self, emploi_temps, cours=None, absence=None, optimisation=None):
+        """
+        Réparation locale d'un emploi du temps après la modification d'un cours ou une absence.
+
+        Seul le voisinage est ré-optimisé : les cours de l'enseignant, de la classe et de la salle
+        concernés, plus un saut dans le graphe des conflits détectés par AnalyseurConflits.
+        Tous les autres cours sont figés et n'entrent dans le modèle que comme occupations.
+        """
+        try:
+            self._charger_poids(optimisation)
+            libres = self._voisinage_reparation(emploi_temps, cours, absence)
+            self.poids_perturbation = self.poids_perturbation or 1
+            self.solver.parameters.max_time_in_seconds = min(
+                self.solver.parameters.max_time_in_seconds, self.TEMPS_MAX_REPARATION
+            )
+            self._construire_modele(emploi_temps, libres=libres)
+
+            status = self._resoudre(optimisation)
+            self.suivi.sauvegarder()
+
+            if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+                solution = self._extraire_solution(emploi_temps)
+                self._journaliser(emploi_temps, optimisation, status, solution)
+                return solution
+            else:
+                logger.error(f"Réparation impossible: {self.solver.StatusName(status)}")
+                if status == cp_model.INFEASIBLE:
+                    self._expliquer(emploi_temps, libres=libres)
+                self._journaliser(emploi_temps, optimisation, status)
+                return None
+
+        except Exception as e:
+            logger.error(f"Erreur lors de la réparation: {e}")
+            return None
+
+    def _exporter_instantane(self, emploi_temps):
+        """
+        Exporte le modèle construit dans OPTIMISATION_DOSSIER_INSTANTANES, si défini (voir instantanes).
+        Le modèle de seconde phase y est ajouté par _resoudre.
+        """
+        from django.conf import settings
+
+        dossier = getattr(settings, 'OPTIMISATION_DOSSIER_INSTANTANES', '')
+        if not dossier:
+            return
+        try:
+            self.chemin_instantane = exporter_instantane(
+                self, emploi_temps, os.path.join(dossier, f"{emploi_temps.id}_{datetime.now():%Y%m%d_%H%M%S_%f}")
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'export de l'instantané de {emploi_temps.nom}: {e}")
+
+    def _exporter_modele_qualite(self):
+        """Ajoute le modèle de seconde phase à l'instantané exporté par _exporter_instantane"""
+        if self.chemin_instantane is None:
+            return
+        try:
+            exporter_modele_qualite(self, self.chemin_instantane)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'export du modèle de seconde phase dans {self.chemin_instantane}: {e}")
+
+    def _verifier_faisabilite(self, emploi_temps, optimisation=None, perimetre=None):
+        """
+        Analyse de faisabilité préalable, conservée dans self.diagnostic.
+        Retourne False (après journalisation) si un problème bloquant rend la résolution inutile.
+        """
+        bilan = analyser_faisabilite(self, emploi_temps, perimetre)
+        self.diagnostic = bilan.en_dict()
+        for probleme in bilan.problemes:
+            logger.warning(f"Faisabilité de {emploi_temps.nom}: {probleme['message']}")
+        if not bilan.bloquant:
+            return True
+
+        logger.error(f"Optimisation de {emploi_temps.nom} abandonnée: modèle infaisable avant résolution")
+        self._journaliser(emploi_temps, optimisation, cp_model.INFEASIBLE)
+        return False
+
+    def _expliquer(self, emploi_temps, reference=None, libres=None, perimetre=None):
+        """Ajoute au diagnostic les contraintes incompatibles d'un modèle infaisable"""
+        try:
+            incompatibles = self.expliquer_infaisabilite(emploi_temps, reference, libres, perimetre)
+        except Exception as e:
+            logger.error(f"Erreur lors du diagnostic d'infaisabilité: {e}")
+            return
+        self.diagnostic['contraintes_incompatibles'] = incompatibles
+        for element in incompatibles:
+            logger.error(f"Contrainte incompatible: {element['description']}")
+
+    def expliquer_infaisabilite(self, emploi_temps, reference=None, libres=None, perimetre=None):
+        """
+        Ensemble minimal de contraintes dures incompatibles d'un modèle infaisable.
+
+        Le modèle est reconstruit sans objectif, chaque contrainte dure (cours confirmé, plafonds
+        horaires d'un enseignant, règle de priorité 5) étant conditionnée par un littéral
+        d'hypothèse. CP-SAT donne un sous-ensemble d'hypothèses suffisant pour l'infaisabilité,
+        réduit ensuite en retirant une à une celles dont il peut se passer. Retourne une liste
+        de {'type', 'id', 'description'}.
+        """
+        parametres = self.solver.parameters
+        diagnostic = type(self)(
+            self.etablissement, self.contraintes,
+            nb_workers=parametres.num_search_workers,
+            temps_max=min(parametres.max_time_in_seconds, self.TEMPS_MAX_DIAGNOSTIC),
+            attribution_salles=self.attribution_salles,
+        )
+        diagnostic.hypotheses = {}
+        diagnostic._indisponibilites = self._indisponibilites
+        diagnostic._construire_modele(emploi_temps, reference, libres, perimetre)
+        diagnostic.model.ClearObjective()
+
+        noyau = diagnostic._noyau_infaisable()
+        elements = [diagnostic.hypotheses[indice][1] for indice in noyau]
+
+        # Les règles sont désignées par le nom de leur Contrainte
+        from apps.emplois_temps.models import Contrainte
+        noms = dict(Contrainte.objects.filter(
+            id__in=[element['id'] for element in elements if element['type'] == 'contrainte']
+        ).values_list('id', 'nom'))
+        for element in elements:
+            if element['type'] == 'contrainte' and element['id'] in noms:
+                element['description'] = f"Contrainte « {noms[element['id']]} » (priorité {PRIORITE_DURE})"
+        return elements
+
+    def _noyau_infaisable(self):
+        """
+        Indices des hypothèses d'un sous-ensemble infaisable, minimal si le temps de diagnostic
+        le permet (liste vide si le modèle est faisable sous toutes les hypothèses)
+        """
+        limite = datetime.now() + timedelta(seconds=self.solver.parameters.max_time_in_seconds)
+
+        def infaisable(indices):
+            self.model.ClearAssumptions()
+            self.model.AddAssumptions([self.hypotheses[i][0] for i in indices])
+            self.solver.parameters.max_time_in_seconds = max((limite - datetime.now()).total_seconds(), 0.01)
+            return self.solver.Solve(self.model) == cp_model.INFEASIBLE
+
+        if not infaisable(list(self.hypotheses)):
+            return []
+        noyau = list(self.solver.SufficientAssumptionsForInfeasibility())
+        for indice in list(noyau):
+            if datetime.now() >= limite:
+                break
+            essai = [i for i in noyau if i != indice]
+            if infaisable(essai):
+                # Le nouveau noyau retourné par CP-SAT peut être encore plus petit
+                retenus = set(self.solver.SufficientAssumptionsForInfeasibility())
+                noyau = [i for i in essai if i in retenus] if retenus else essai
+        return noyau
+
+    def _hypothese(self, type_element, element_id, description):
+        """
+        En diagnostic, littéral d'hypothèse conditionnant une contrainte dure du modèle
+        (None sinon : la contrainte est imposée sans condition)
+        """
+        if self.hypotheses is None:
+            return None
+        litteral = self.model.NewBoolVar(f"hypothese_{type_element}_{element_id}")
+        self.hypotheses[litteral.Index()] = (
+            litteral, {'type': type_element, 'id': element_id, 'description': description}
+        )
+        return litteral
+
+    @staticmethod
+    def _imposer(contrainte, condition):
+        if condition is not None:
+            contrainte.OnlyEnforceIf(condition)
+
+    def _resoudre(self, optimisation=None):
+        """
+        Résolution lexicographique du modèle construit.
+
+        Le placement (cours non planifiés, déplacements, règles souples) est optimisé d'abord, dans
+        au plus PART_PREMIERE_PHASE du temps maximal ; les critères de qualité ne sont ajoutés au
+        modèle qu'ensuite et optimisés dans le temps restant, à placement au moins aussi bon, en
+        repartant de la première solution complétée (voir _completer_indication).
+        Sans cela, ils ralentissent fortement la recherche d'un bon placement.
+        Si la seconde phase n'aboutit pas, self.qualite_optimisee est faux.
+        """
+        temps_max = self.solver.parameters.max_time_in_seconds
+        self.suivi = SuiviSolutions(optimisation)
+        self.qualite_optimisee = not any(self.poids.get(nom) for nom in self.POIDS_OBJECTIF)
+        self.solver.parameters.max_time_in_seconds = temps_max * self.PART_PREMIERE_PHASE
+        status = self.solver.Solve(self.model, self.suivi)
+        self.solver.parameters.max_time_in_seconds = temps_max
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) or self.suivi.annule:
+            return status
+
+        principal = sum(self.objectifs)
+        valeur_principale = round(self.solver.ObjectiveValue())
+        solution = self.solver.ResponseProto().solution
+        if not self._ajouter_criteres_qualite():
+            return status
+
+        self.model.Minimize(sum(self.objectifs))
+        self._exporter_modele_qualite()
+        self.model.Add(principal <= valeur_principale)
+        restant = temps_max - self.solver.WallTime()
+        debut_completion = time.monotonic()
+        _indiquer_solution(self.model, self._completer_indication(solution, restant))
+        duree_completion = time.monotonic() - debut_completion
+
+        solveur = cp_model.CpSolver()
+        solveur.parameters.CopyFrom(self.solver.parameters)
+        solveur.parameters.max_time_in_seconds = max(restant - duree_completion, 0.01)
+        status_qualite = solveur.Solve(self.model, self.suivi)
+        if status_qualite in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            self.temps_premiere_phase = self.solver.WallTime() + duree_completion
+            self.solver = solveur
+            self.qualite_optimisee = True
+            return status_qualite
+
+        # La solution de la première phase est conservée, sans critères de qualité
+        if not self.suivi.annule:
+            logger.warning(
+                f"Critères de qualité non optimisés pour {self.etablissement.nom}: "
+                f"seconde phase sans solution ({solveur.StatusName(status_qualite)})"
+            )
+        self._retirer_criteres_qualite()
+        return status
+
+    def _completer_indication(self, solution, temps_max):
+        """
+        Complète la solution de la première phase avec les variables des critères de qualité :
+        le placement est figé et seules ces variables sont optimisées, dans une fraction du temps
+        de la seconde phase. Retourne la solution complète, ou la solution partielle en cas d'échec.
+        """
+        completion = cp_model.CpModel()
+        completion.Proto().CopyFrom(self.model.Proto())
+        variables = completion.Proto().variables
+        for indice, valeur in enumerate(solution):
+            variables[indice].ClearField('domain')
+            variables[indice].domain.extend([valeur, valeur])
+
+        solveur = cp_model.CpSolver()
+        solveur.parameters.CopyFrom(self.solver.parameters)
+        solveur.parameters.max_time_in_seconds = max(temps_max * self.PART_COMPLETION_INDICATION, 0.01)
+        if solveur.Solve(completion) in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return solveur.ResponseProto().solution
+        return solution
+
+    def _retirer_criteres_qualite(self):
+        """Retire du détail de l'objectif les critères de qualité non optimisés"""
+        self.termes_objectif = {
+            nom: termes for nom, termes in self.termes_objectif.items() if nom not in self.POIDS_OBJECTIF
+        }
+
+    def _voisinage_reparation(self, emploi_temps, cours=None, absence=None):
+        """Identifiants des cours à libérer pour une réparation locale"""
+        conflits = AnalyseurConflits().analyser_conflits(emploi_temps)
+
+        germes = set()
+        ressources = set()
+        if cours is not None:
+            germes.add(cours.id)
+            ressources.update([
+                ('enseignant_id', cours.enseignant_id),
+                ('classe_id', cours.classe_id),
+                ('salle_id', cours.salle_id),
+            ])
+        if absence is not None:
+            germes.update(absence.get_cours_concernes().filter(emploi_temps=emploi_temps).values_list('id', flat=True))
+            self._bloquer_absence(absence)
+        if not germes:
+            # Sans modification précise, on répare tous les cours en conflit
+            for conflit in conflits:
+                germes.update([conflit['cours1'], conflit['cours2']])
+
+        # Cours partageant l'enseignant, la classe ou la salle d'un germe
+        cours_actifs = list(cours_planifies(emploi_temps.cours).values_list(
+            'id', 'enseignant_id', 'classe_id', 'salle_id'
+        ))
+        for cours_id, enseignant_id, classe_id, salle_id in cours_actifs:
+            if cours_id in germes:
+                ressources.update([
+                    ('enseignant_id', enseignant_id),
+                    ('classe_id', classe_id),
+                    ('salle_id', salle_id),
+                ])
+        libres = set(germes)
+        for cours_id, enseignant_id, classe_id, salle_id in cours_actifs:
+            if (('enseignant_id', enseignant_id) in ressources or
+                    ('classe_id', classe_id) in ressources or
+                    ('salle_id', salle_id) in ressources):
+                libres.add(cours_id)
+
+        # Un saut dans le graphe des conflits
+        for conflit in conflits:
+            if conflit['cours1'] in libres or conflit['cours2'] in libres:
+                libres.update([conflit['cours1'], conflit['cours2']])
+
+        return libres
+
+    def _charger_poids(self, optimisation):
+        """Applique les poids des critères saisis sur l'optimisation (valeurs entières pour CP-SAT)"""
+        if optimisation is None or not optimisation.poids_contraintes:
+            return
+        for nom, poids in optimisation.poids_contraintes.items():
+            if isinstance(poids, (int, float)) and not isinstance(poids, bool):
+                self.poids[nom] = int(round(poids))
+            else:
+                logger.warning(f"Poids ignoré pour '{nom}': {poids!r}")
+
+    def _bloquer_absence(self, absence):
+        """Rend l'enseignant absent indisponible sur les créneaux hebdomadaires de l'absence"""
+        debut = en_minutes(absence.heure_debut) if absence.heure_debut else 0
+        fin = en_minutes(absence.heure_fin) if absence.heure_fin else 24 * 60
+        plages = self._indisponibilites.setdefault(('enseignant_id', absence.enseignant_id), [])
+        for jour in absence.get_jours_semaine_absence():
+            if jour not in self.grille.jours:
+                continue
+            indice_jour = self.grille.jours.index(jour)
+            for creneau in range(self.grille.creneaux_par_jour):
+                debut_creneau = self.grille.debut + creneau * self.grille.duree_creneau
+                if debut_creneau < fin and debut_creneau + self.grille.duree_creneau > debut:
+                    plages.append((indice_jour * self.grille.creneaux_par_jour + creneau, 1))
+
+    def optimiser_par_composantes(self, emploi_temps, optimisation=None, nb_processus=None):
+        """
+        Décompose l'emploi du temps en composantes indépendantes (classes, enseignants et salles
+        qui n'interagissent jamais) et les résout en parallèle dans un pool de processus.
+        Les solutions partielles sont fusionnées en une seule solution.
+
+        Le temps maximal vaut pour l'ensemble : les nb_processus × temps_max secondes de calcul
+        disponibles sont réparties entre les composantes au prorata de leur nombre de cours, les
+        plus grosses étant lancées en premier, et aucune ne dépasse l'échéance commune.
+        """
+        debut = datetime.now()
+        try:
+            composantes = composantes_independantes(emploi_temps)
+            # Les composantes sont définies par les salles des cours, interchangeables au sein d'un
+            # groupe quand les salles sont attribuées en seconde phase
+            if len(composantes) <= 1 or self.attribution_salles:
+                return self.optimiser(emploi_temps, optimisation)
+
+            self._charger_poids(optimisation)
+            if not self._verifier_faisabilite(emploi_temps, optimisation):
+                return None
+            nb_processus = min(nb_processus or os.cpu_count() or 1, len(composantes))
+            parametres = self.solver.parameters
+            temps_max = parametres.max_time_in_seconds
+            options = {
+                'contraintes': self.contraintes,
+                'nb_workers': max(parametres.num_search_workers // nb_processus, 1),
+                'ecart_relatif': parametres.relative_gap_limit,
+                'poids_perturbation': self.poids_perturbation,
+                'poids': self.poids,
+                'echeance': time.time() + temps_max,
+                'optimisation_id': optimisation.pk if optimisation is not None else None,
+            }
+            composantes = sorted(composantes, key=len, reverse=True)
+            nb_cours = sum(len(cours_ids) for cours_ids in composantes)
+
+            # Les processus fils ouvrent leur propre connexion à la base
+            connections.close_all()
+            suivi = self.suivi = SuiviSolutions(optimisation)
+            resultats = []
+            with _pool_execution(nb_processus) as pool:
+                futures = [
+                    pool.submit(_optimiser_composante, emploi_temps.id, sorted(cours_ids), {
+                        **options,
+                        'temps_max': min(temps_max, temps_max * nb_processus * len(cours_ids) / nb_cours),
+                    })
+                    for cours_ids in composantes
+                ]
+                for future in as_completed(futures):
+                    if suivi.annule:
+                        # Les composantes en cours s'arrêtent d'elles-mêmes (voir _optimiser_surveille)
+                        for restante in futures:
+                            restante.cancel()
+                        break
+                    resultat = future.result()
+                    if resultat.get('echec'):
+                        logger.error("Optimisation impossible pour une composante")
+                        self.diagnostic.setdefault('contraintes_incompatibles', []).extend(
+                            resultat['diagnostic'].get('contraintes_incompatibles', [])
+                        )
+                        continue
+                    resultats.append(resultat)
+                    suivi.progression.append({
+                        'objectif': sum(r['score'] for r in resultats),
+                        'borne': None,
+                        'temps': (datetime.now() - debut).total_seconds(),
+                        'composantes_terminees': len(resultats),
+                    })
+                    suivi.sauvegarder()
+
+            return self._fusionner_solutions(emploi_temps, resultats, len(composantes), debut)
+
+        except Exception as e:
+            logger.error(f"Erreur lors de l'optimisation par composantes: {e}")
+            return None
+
+    def variantes_portefeuille(self, nb_candidats):
+        """
+        Poids et graines des candidats d'un portefeuille : les poids actuels, puis chaque critère de
+        qualité privilégié tour à tour, puis des poids tirés au hasard autour des poids actuels.
+        Aucun poids n'est annulé, pour que tous les candidats soient comparables sur chaque critère.
+        """
+        criteres = [nom for nom in self.POIDS_OBJECTIF if self.poids.get(nom)]
+        variantes = [dict(self.poids)]
+        for nom in criteres:
+            variantes.append({**self.poids, nom: self.poids[nom] * self.FACTEUR_PORTEFEUILLE})
+        while len(variantes) < nb_candidats:
+            tirage = random.Random(len(variantes))
+            variantes.append({
+                **self.poids,
+                **{nom: max(round(self.poids[nom] * tirage.uniform(0.2, self.FACTEUR_PORTEFEUILLE)), 1) for nom in criteres},
+            })
+        return [(poids, graine) for graine, poids in enumerate(variantes[:nb_candidats])]
+
+    def optimiser_portefeuille(self, emploi_temps, utilisateur, optimisation=None, nb_candidats=None,
+                               nb_processus=None):
+        """
+        Portefeuille de propositions : plusieurs résolutions, de poids et de graines différents,
+        lancées en parallèle dans un pool de processus (voir variantes_portefeuille).
+
+        Les solutions non dominées sur les valeurs brutes des critères (cours non planifiés et
+        critères de qualité) sont enregistrées comme nouveaux emplois du temps au statut 'propose',
+        leur vecteur d'objectifs dans contraintes_appliquees. Retourne la liste des propositions
+        {'emploi_temps', 'objectifs', 'poids', 'graine', 'score'}, ou None en cas d'échec.
+        """
+        from apps.emplois_temps.models import EmploiTemps
+
+        debut = datetime.now()
+        try:
+            self._charger_poids(optimisation)
+            if not self._verifier_faisabilite(emploi_temps, optimisation):
+                return None
+            variantes = self.variantes_portefeuille(nb_candidats or self.NB_CANDIDATS_PORTEFEUILLE)
+            nb_processus = min(nb_processus or os.cpu_count() or 1, len(variantes))
+            parametres = self.solver.parameters
+
+            connections.close_all()
+            suivi = self.suivi = SuiviSolutions(optimisation)
+            candidats = []
+            with _pool_execution(nb_processus) as pool:
+                futures = [
+                    pool.submit(_optimiser_candidat, emploi_temps.id, {
+                        'contraintes': self.contraintes,
+                        'nb_workers': max(parametres.num_search_workers // nb_processus, 1),
+                        'temps_max': parametres.max_time_in_seconds,
+                        'ecart_relatif': parametres.relative_gap_limit,
+                        'poids_perturbation': self.poids_perturbation,
+                        'poids': poids,
+                        'graine': graine,
+                        'attribution_salles': self.attribution_salles,
+                        'optimisation_id': optimisation.pk if optimisation is not None else None,
+                    })
+                    for poids, graine in variantes
+                ]
+                for future in as_completed(futures):
+                    if suivi.annule:
+                        for restante in futures:
+                            restante.cancel()
+                        break
+                    candidat = future.result()
+                    if candidat is None:
+                        logger.error("Optimisation impossible pour un candidat du portefeuille")
+                        continue
+                    candidats.append(candidat)
+                    suivi.progression.append({
+                        'objectif': min(c['score'] for c in candidats),
+                        'borne': None,
+                        'temps': (datetime.now() - debut).total_seconds(),
+                        'candidats_termines': len(candidats),
+                    })
+                    suivi.sauvegarder()
+
+            if not candidats or suivi.annule:
+                return None
+
+            # Critères évalués par tous les candidats (la seconde phase peut manquer de temps)
+            criteres = sorted(set.intersection(*(set(c['objectifs']) for c in candidats)))
+            front = front_pareto(candidats, criteres)
+            logger.info(
+                f"Portefeuille de {emploi_temps.nom}: {len(front)} propositions non dominées "
+                f"sur {len(candidats)} candidats"
+            )
+
+            cours = emploi_temps.cours.in_bulk([
+                cours_id for candidat in front for cours_id, *_ in candidat['placements']
+            ])
+            propositions = []
+            for rang, candidat in enumerate(front, start=1):
+                objectifs = {nom: candidat['objectifs'][nom] for nom in criteres}
+                brouillon = EmploiTemps.objects.create(
+                    nom=f"{emploi_temps.nom} - proposition {rang}",
+                    etablissement=emploi_temps.etablissement,
+                    periode=emploi_temps.periode,
+                    statut='propose',
+                    createur=utilisateur,
+                    contraintes_appliquees={
+                        'objectifs': objectifs, 'poids': candidat['poids'], 'graine': candidat['graine'],
+                    },
+                    score_optimisation=candidat['score'],
+                    version=emploi_temps.version,
+                )
+                enregistrer_solution({
+                    'emploi_temps': emploi_temps,
+                    'cours_optimises': [
+                        {
+                            'cours': cours[cours_id], 'jour_semaine': jour, 'heure_debut': heure_debut,
+                            'heure_fin': heure_fin, 'salle_id': salle_id,
+                        }
+                        for cours_id, jour, heure_debut, heure_fin, salle_id in candidat['placements']
+                    ],
+                }, utilisateur, emploi_temps=brouillon, description=f"Proposition {rang} du portefeuille de {emploi_temps.nom}")
+                propositions.append({
+                    'emploi_temps': brouillon,
+                    'objectifs': objectifs,
+                    'poids': candidat['poids'],
+                    'graine': candidat['graine'],
+                    'score': candidat['score'],
+                })
+            return propositions
+
+        except Exception as e:
+            logger.error(f"Erreur lors de l'optimisation en portefeuille: {e}")
+            return None
+
+    def _fusionner_solutions(self, emploi_temps, resultats, nb_composantes, debut):
+        """Fusionne les solutions des composantes en une seule solution"""
+        placements = [placement for resultat in resultats for placement in resultat['placements']]
+        cours = emploi_temps.cours.in_bulk([cours_id for cours_id, *_ in placements])
+        detail_objectif = {}
+        for resultat in resultats:
+            for nom, terme in resultat['detail_objectif'].items():
+                cumul = detail_objectif.setdefault(nom, {'valeur': 0, 'poids': terme['poids'], 'cout': 0})
+                cumul['valeur'] += terme['valeur']
+                cumul['cout'] += terme['cout']
+        return {
+            'emploi_temps': emploi_temps,
+            'score': sum(r['score'] for r in resultats),
+            'detail_objectif': detail_objectif,
+            'conflits_resolus': sum(r['conflits_resolus'] for r in resultats),
+            'temps_calcul': (datetime.now() - debut).total_seconds(),
+            'progression': self.suivi.progression if self.suivi else [],
+            'composantes': nb_composantes,
+            'composantes_resolues': len(resultats),
+            'diagnostic': self.diagnostic,
+            'cours_non_planifies': sum(r['cours_non_planifies'] for r in resultats),
+            'cours_deplaces': sum(r['cours_deplaces'] for r in resultats),
+            'qualite_optimisee': all(r['qualite_optimisee'] for r in resultats),
+            'cours_optimises': [
+                {
+                    'cours': cours[cours_id],
+                    'jour_semaine': jour_semaine,
+                    'heure_debut': heure_debut,
+                    'heure_fin': heure_fin,
+                    'salle_id': salle_id,
+                }
+                for cours_id, jour_semaine, heure_debut, heure_fin, salle_id in placements
+            ]
+        }
+
+    def _construire_modele(self, emploi_temps, reference=None, libres=None, perimetre=None):
+        """
+        Construit le modèle CP-SAT sans le résoudre.
+        Si `libres` est fourni, seuls ces cours sont des variables, les autres sont figés.
+        Si `perimetre` est fourni, les autres cours sont ignorés.
+        Les salles sont attribuées en seconde phase si attribution_salles est actif, sauf en
+        réparation locale où les cours figés occupent des salles précises.
+        """
+        self._salles_agregees = self.attribution_salles and libres is None
+
+        # Initialiser le modèle
+        self._initialiser_variables(emploi_temps, libres, perimetre)
+        self._ajouter_indications(emploi_temps, reference or emploi_temps)
+
+        # Ajouter les contraintes
+        self._ajouter_contraintes_enseignants()
+        self._ajouter_contraintes_salles()
+        self._ajouter_contraintes_classes()
+        self._ajouter_contraintes_globales()
+
+        # Définir l'objectif
+        self._definir_objectif()
+
+    def _journaliser(self, emploi_temps, optimisation, status, solution=None):
+        """Trace la résolution et sa courbe de progression dans LogOptimisation"""
+        if optimisation is None:
+            return
+
+        from .models import LogOptimisation
+
+        parametres = self.solver.parameters
+        LogOptimisation.objects.create(
+            type_action='optimisation_emploi_temps',
+            etablissement=self.etablissement,
+            description=f"Optimisation de {emploi_temps.nom}: {self.solver.StatusName(status)}",
+            parametres_entree={
+                'emploi_temps_id': emploi_temps.id,
+                'nb_cours': len(self.variables),
+                'nb_workers': parametres.num_search_workers,
+                'temps_max': parametres.max_time_in_seconds,
+                'ecart_relatif': parametres.relative_gap_limit,
+            },
+            resultats={
+                'statut_solveur': self.solver.StatusName(status),
+                'score': solution['score'] if solution else None,
+                'borne': self.solver.BestObjectiveBound() if solution else None,
+                'progression': self.suivi.progression if self.suivi else [],
+                'diagnostic': self.diagnostic,
+            },
+            temps_execution=self.temps_premiere_phase + self.solver.WallTime(),
+            statut='succes' if solution else 'echec',
+            created_by=optimisation.created_by,
+        )
     
-    def _initialiser_variables(self, emploi_temps):
-        """Initialise les variables du problème d'optimisation"""
-        cours = emploi_temps.cours.all()
-        
+    def _initialiser_variables(self, emploi_temps, libres=None, perimetre=None):
+        """
+        Initialise les variables du problème d'optimisation.
+
+        Chaque cours est représenté par une variable de début sur la grille, un littéral de
+        présence et un intervalle optionnel : le modèle croît linéairement avec le nombre de cours.
+        """
+        cours = cours_planifies(emploi_temps.cours)
+        if perimetre is not None:
+            cours = cours.filter(id__in=perimetre)
+        cours = list(cours.select_related('enseignant__profil_enseignant', 'salle', 'classe', 'matiere'))
+
+        if libres is not None:
+            self._figer_cours([c for c in cours if c.id not in libres], [c for c in cours if c.id in libres])
+            cours = [c for c in cours if c.id in libres]
+
         for cours in cours:
-            # Variable binaire pour chaque cours
-            var_name = f"cours_{cours.id}"
-            self.variables[var_name] = self.model.NewBoolVar(var_name)
-            
-            # Variables pour les créneaux horaires
-            for jour in range(1, 6):  # Lundi à vendredi
-                for heure in range(8, 18):  # 8h à 17h
-                    slot_name = f"slot_{cours.id}_{jour}_{heure}"
-                    self.variables[slot_name] = self.model.NewBoolVar(slot_name)
-    
+            nb_creneaux = self.grille.nombre_creneaux(cours.duree)
+            debut = self.model.NewIntVarFromDomain(
+                self.grille.domaine_debut(nb_creneaux), f"debut_{cours.id}"
+            )
+            present = self.model.NewBoolVar(f"cours_{cours.id}")
+            intervalle = self.model.NewOptionalIntervalVar(
+                debut, nb_creneaux, debut + nb_creneaux, present, f"intervalle_{cours.id}"
+            )
+
+            self.cours[cours.id] = cours
+            self.variables[cours.id] = {
+                'debut': debut,
+                'present': present,
+                'intervalle': intervalle,
+                'nb_creneaux': nb_creneaux,
+            }
+
+    def _figer_cours(self, figes, libres):
+        """Enregistre comme occupations constantes les cours figés partageant une ressource avec un cours libre"""
+        ressources = set()
+        for cours in libres:
+            ressources.update([
+                ('enseignant_id', cours.enseignant_id),
+                ('classe_id', cours.classe_id),
+                ('salle_id', cours.salle_id),
+            ])
+
+        for cours in figes:
+            t = self.grille.indice(cours.jour_semaine, cours.heure_debut)
+            if t is None:
+                continue
+            self.cours_figes[cours.id] = cours
+            occupation = (t, self.grille.nombre_creneaux(cours.duree), cours.duree, cours.semaine)
+            for attribut in ('enseignant_id', 'classe_id', 'salle_id'):
+                ressource = (attribut, getattr(cours, attribut))
+                if ressource in ressources:
+                    self._figes_par_ressource.setdefault(ressource, []).append(occupation)
+
+    def _ajouter_indications(self, emploi_temps, reference):
+        """
+        Démarrage à chaud : suggère au solveur les créneaux de l'emploi du temps de référence.
+
+        Si la référence est un autre emploi du temps (ex. la version active), les cours sont
+        appariés par (classe, matière, enseignant, semaine) dans l'ordre chronologique.
+        """
+        if reference.pk == emploi_temps.pk:
+            placements = {
+                cours_id: (cours.jour_semaine, cours.heure_debut)
+                for cours_id, cours in self.cours.items()
+            }
+        else:
+            disponibles = {}
+            for cle_cours in cours_planifies(reference.cours).order_by(
+                'jour_semaine', 'heure_debut'
+            ).values_list('classe_id', 'matiere_id', 'enseignant_id', 'semaine', 'jour_semaine', 'heure_debut'):
+                disponibles.setdefault(cle_cours[:4], []).append(cle_cours[4:])
+
+            placements = {}
+            for cours_id, cours in sorted(self.cours.items(), key=lambda item: (item[1].jour_semaine, item[1].heure_debut)):
+                restants = disponibles.get((cours.classe_id, cours.matiere_id, cours.enseignant_id, cours.semaine))
+                if restants:
+                    placements[cours_id] = restants.pop(0)
+
+        for cours_id, (jour_semaine, heure_debut) in placements.items():
+            t = self.grille.indice(jour_semaine, heure_debut)
+            variables = self.variables[cours_id]
+            if t is None or t % self.grille.creneaux_par_jour + variables['nb_creneaux'] > self.grille.creneaux_par_jour:
+                continue
+            self.positions_reference[cours_id] = t
+            self.model.AddHint(variables['debut'], t)
+            self.model.AddHint(variables['present'], 1)
+
+    def _litteral_deplacement(self, cours_id):
+        """Littéral vrai si le cours quitte son créneau de référence (ou n'est plus planifié)"""
+        if cours_id not in self._litteraux_deplacement:
+            variables = self.variables[cours_id]
+            deplace = self.model.NewBoolVar(f"deplace_{cours_id}")
+            self.model.Add(variables['debut'] == self.positions_reference[cours_id]).OnlyEnforceIf(deplace.Not())
+            self.model.AddImplication(deplace.Not(), variables['present'])
+            self.model.AddHint(deplace, 0)
+            self._litteraux_deplacement[cours_id] = deplace
+        return self._litteraux_deplacement[cours_id]
+
+    def _litteral_jour(self, cours_id, indice_jour):
+        """
+        Littéral vrai si le cours est planifié le jour d'indice donné.
+        Les littéraux d'un cours sont créés ensemble, à la demande.
+        """
+        if cours_id not in self._litteraux_jour:
+            variables = self.variables[cours_id]
+            jour = self.model.NewIntVar(0, len(self.grille.jours) - 1, f"jour_{cours_id}")
+            self.model.AddDivisionEquality(jour, variables['debut'], self.grille.creneaux_par_jour)
+
+            litteraux = []
+            for i in range(len(self.grille.jours)):
+                litteral = self.model.NewBoolVar(f"jour_{cours_id}_{i}")
+                self.model.Add(jour == i).OnlyEnforceIf(litteral)
+                litteraux.append(litteral)
+            self.model.Add(sum(litteraux) == variables['present'])
+            self._litteraux_jour[cours_id] = litteraux
+
+        return self._litteraux_jour[cours_id][indice_jour]
+
+    def _regrouper_par(self, attribut):
+        """Regroupe les identifiants de cours par ressource (enseignant_id, salle_id, classe_id)"""
+        groupes = {}
+        for cours_id, cours in self.cours.items():
+            groupes.setdefault(getattr(cours, attribut), []).append(cours_id)
+        return groupes
+
+    def _par_semaine(self, cours_ids, ressource=None):
+        """
+        Cours d'une ressource à contraindre ensemble, par semaine de l'alternance : [(None, cours_ids)]
+        si ni ces cours ni les cours figés de la ressource ne sont alternés, sinon un groupe par semaine
+        (A, B), les cours de toutes les semaines figurant dans les deux.
+        """
+        semaines = {self.cours[cours_id].semaine for cours_id in cours_ids}
+        semaines.update(occupation[3] for occupation in self._figes_par_ressource.get(ressource, []))
+        if semaines.isdisjoint(SEMAINES_ALTERNEES):
+            return [(None, cours_ids)]
+        return [
+            (semaine, [cours_id for cours_id in cours_ids if semaines_communes(self.cours[cours_id].semaine, semaine)])
+            for semaine in SEMAINES_ALTERNEES
+        ]
+
+    def _figes(self, ressource, semaine=None):
+        """Occupations (début, taille, durée, semaine) des cours figés d'une ressource, pour une semaine donnée"""
+        return [
+            occupation for occupation in self._figes_par_ressource.get(ressource, [])
+            if semaine is None or semaines_communes(occupation[3], semaine)
+        ]
+
+    def _ajouter_non_chevauchement(self, cours_ids, ressource, disponibilites=None, supplementaires=()):
+        """
+        Un seul cours à la fois par ressource, indisponibilités et cours figés compris, semaine par
+        semaine si des cours sont alternés. `supplementaires` sont d'autres intervalles exclusifs
+        de la ressource (ex. pause déjeuner), communs aux deux semaines.
+        """
+        for semaine, cours_semaine in self._par_semaine(cours_ids, ressource):
+            intervalles = [self.variables[cours_id]['intervalle'] for cours_id in cours_semaine]
+            intervalles.extend(supplementaires)
+            intervalles.extend(self._intervalles_occupes(ressource, disponibilites, semaine))
+            if len(intervalles) > 1:
+                self.model.AddNoOverlap(intervalles)
+
+    def _plages_occupees(self, ressource, disponibilites=None, semaine=None):
+        """
+        Plages [début, fin[ où une ressource est occupée hors des cours du modèle : indisponibilités
+        et cours figés (de la semaine donnée), fusionnées car elles peuvent se chevaucher entre elles
+        """
+        plages = self.grille.creneaux_bloques(disponibilites) + self._indisponibilites.get(ressource, [])
+        plages.extend((t, taille) for t, taille, _, _ in self._figes(ressource, semaine))
+
+        fusionnees = []
+        for debut, taille in sorted(plages):
+            if fusionnees and debut <= fusionnees[-1][1]:
+                fusionnees[-1][1] = max(fusionnees[-1][1], debut + taille)
+            else:
+                fusionnees.append([debut, debut + taille])
+        return fusionnees
+
+    def _intervalles_occupes(self, ressource, disponibilites=None, semaine=None):
+        """Intervalles fixes des plages occupées d'une ressource (voir _plages_occupees)"""
+        nom = f"{ressource[0][:-3]}_{ressource[1]}"
+        return [
+            self.model.NewFixedSizeIntervalVar(debut, fin - debut, f"occupe_{nom}_{debut}")
+            for debut, fin in self._plages_occupees(ressource, disponibilites, semaine)
+        ]
+
     def _ajouter_contraintes_enseignants(self):
         """Ajoute les contraintes liées aux enseignants"""
-        # Un enseignant ne peut pas être dans deux endroits en même temps
-        # Un enseignant ne peut pas dépasser ses heures max par jour/semaine
-        pass
-    
+        for enseignant_id, cours_ids in self._regrouper_par('enseignant_id').items():
+            profil = getattr(self.cours[cours_ids[0]].enseignant, 'profil_enseignant', None)
+
+            ressource = ('enseignant_id', enseignant_id)
+
+            # Un enseignant ne peut pas être dans deux endroits en même temps
+            self._ajouter_non_chevauchement(
+                cours_ids,
+                ressource,
+                profil.disponibilites if profil else None
+            )
+
+            if profil is None:
+                continue
+
+            # Un enseignant ne peut pas dépasser ses heures max par semaine (A et B séparément
+            # en cas d'alternance)
+            durees = {cours_id: self.cours[cours_id].duree for cours_id in cours_ids}
+            condition = self._hypothese(
+                'plafond_enseignant', enseignant_id,
+                f"Plafonds horaires de {self.cours[cours_ids[0]].enseignant.get_full_name()} "
+                f"({profil.heures_max_semaine} h par semaine, {profil.heures_max_jour} h par jour)"
+            )
+            for semaine, cours_semaine in self._par_semaine(cours_ids, ressource):
+                figes = self._figes(ressource, semaine)
+                self._imposer(self.model.Add(
+                    sum(durees[c] * self.variables[c]['present'] for c in cours_semaine)
+                    <= max(profil.heures_max_semaine * 60 - sum(duree for _, _, duree, _ in figes), 0)
+                ), condition)
+
+                # ... ni par jour (inutile si sa charge hebdomadaire tient déjà dans une journée)
+                max_jour = profil.heures_max_jour * 60
+                if sum(durees[c] for c in cours_semaine) + sum(duree for _, _, duree, _ in figes) > max_jour:
+                    for i in range(len(self.grille.jours)):
+                        deja_occupe = sum(
+                            duree for t, _, duree, _ in figes if t // self.grille.creneaux_par_jour == i
+                        )
+                        self._imposer(self.model.Add(
+                            sum(durees[c] * self._litteral_jour(c, i) for c in cours_semaine)
+                            <= max(max_jour - deja_occupe, 0)
+                        ), condition)
+
     def _ajouter_contraintes_salles(self):
         """Ajoute les contraintes liées aux salles"""
-        # Une salle ne peut pas accueillir deux cours simultanément
-        # Respect des équipements nécessaires
-        pass
-    
+        if self._salles_agregees:
+            self._ajouter_capacites_salles()
+            return
+
+        # Une salle ne peut pas accueillir deux cours simultanément,
+        # ni en dehors de ses disponibilités
+        for salle_id, cours_ids in self._regrouper_par('salle_id').items():
+            salle = self.cours[cours_ids[0]].salle
+            self._ajouter_non_chevauchement(cours_ids, ('salle_id', salle_id), salle.disponibilites)
+
+    def _charger_groupes_salles(self):
+        """
+        Groupes de salles interchangeables (voir groupe_salle) et besoin de chaque cours : le groupe
+        de sa salle actuelle et la plus petite capacité du groupe accueillant sa classe (la plus
+        grande si aucune salle n'est assez grande, comme le ferait sa salle actuelle)
+        """
+        from apps.etablissements.models import Salle
+
+        salles = {salle.id: salle for salle in Salle.objects.filter(etablissement=self.etablissement, actif=True)}
+        for cours in self.cours.values():
+            salles.setdefault(cours.salle_id, cours.salle)
+
+        self._groupes_salles = {}
+        for salle in sorted(salles.values(), key=lambda salle: (salle.capacite, salle.id)):
+            self._groupes_salles.setdefault(groupe_salle(salle), []).append(salle)
+
+        self._besoins_salles = {}
+        for cours_id, cours in self.cours.items():
+            groupe = groupe_salle(cours.salle)
+            capacites = [salle.capacite for salle in self._groupes_salles[groupe]]
+            self._besoins_salles[cours_id] = (
+                groupe, next((c for c in capacites if c >= cours.classe.nombre_eleves), capacites[-1])
+            )
+
+    def _ajouter_capacites_salles(self):
+        """
+        Première phase de l'attribution des salles : à chaque créneau, les cours d'un groupe de salles
+        demandant au moins une capacité donnée ne dépassent pas le nombre de salles du groupe de cette
+        capacité ou plus, libres à ce créneau.
+
+        Les salles admissibles d'un cours formant des ensembles emboîtés, ces inégalités suffisent
+        (condition de Hall) à l'existence d'une affectation des cours d'un créneau à des salles
+        distinctes, construite par _attribuer_salles. Le modèle compte une contrainte cumulative par
+        capacité distincte d'un groupe (et par semaine en cas d'alternance) au lieu d'un
+        non-chevauchement par salle.
+        """
+        self._charger_groupes_salles()
+        cours_par_groupe = {}
+        for cours_id, (groupe, _) in self._besoins_salles.items():
+            cours_par_groupe.setdefault(groupe, []).append(cours_id)
+
+        for groupe, cours_ids in cours_par_groupe.items():
+            salles = self._groupes_salles[groupe]
+            occupations = {
+                salle.id: self._intervalles_occupes(('salle_id', salle.id), salle.disponibilites) for salle in salles
+            }
+            for _, cours_semaine in self._par_semaine(cours_ids):
+                besoins = [(self._besoins_salles[cours_id][1], cours_id) for cours_id in cours_semaine]
+                for niveau in sorted({capacite for capacite, _ in besoins}):
+                    intervalles = [
+                        self.variables[cours_id]['intervalle'] for capacite, cours_id in besoins if capacite >= niveau
+                    ]
+                    admissibles = [salle for salle in salles if salle.capacite >= niveau]
+                    occupees = [intervalle for salle in admissibles for intervalle in occupations[salle.id]]
+                    if not occupees and len(intervalles) <= len(admissibles):
+                        continue
+                    intervalles.extend(occupees)
+                    self.model.AddCumulative(intervalles, [1] * len(intervalles), len(admissibles))
+
+    def _attribuer_salles(self, cours_optimises):
+        """
+        Seconde phase de l'attribution des salles, après résolution : les cours sont parcourus par
+        créneau de début et, par groupe de salles, affectés aux salles libres pendant toute leur
+        durée par un couplage de coût minimal (algorithme hongrois). Une salle coûte moins si c'est
+        la salle principale de la classe, puis la salle actuelle du cours.
+
+        Renseigne 'salle_id' dans chaque cours optimisé. Un cours de plusieurs créneaux peut ne
+        trouver aucune salle libre sur toute sa durée : il garde alors sa salle actuelle.
+        Retourne la liste des identifiants de ces cours.
+
+        Les occupations sont tenues par (créneau, semaine de l'alternance) : à un même créneau, les
+        cours de toutes les semaines sont placés d'abord, puis ceux de semaine A et de semaine B,
+        qui peuvent partager une salle.
+        """
+        occupes = {
+            salle.id: {
+                (t, semaine) for debut, fin in self._plages_occupees(('salle_id', salle.id), salle.disponibilites)
+                for t in range(debut, fin) for semaine in SEMAINES_ALTERNEES
+            }
+            for salles in self._groupes_salles.values() for salle in salles
+        }
+
+        par_creneau = {}
+        for entree in cours_optimises:
+            cours = entree['cours']
+            t = self.grille.indice(entree['jour_semaine'], entree['heure_debut'])
+            groupe = self._besoins_salles[cours.id][0]
+            par_creneau.setdefault((t, cours.semaine in SEMAINES_ALTERNEES, cours.semaine, groupe), []).append(entree)
+
+        non_attribues = []
+        for (t, _, semaine, groupe), entrees in sorted(par_creneau.items(), key=lambda item: item[0][:3]):
+            semaines = semaines_cours(semaine)
+            libres = [
+                salle for salle in self._groupes_salles[groupe]
+                if all((t, s) not in occupes[salle.id] for s in semaines)
+            ]
+            couts = np.full((len(entrees), max(len(libres), 1)), self.COUT_SALLE_INTERDITE, dtype=np.int64)
+            for i, entree in enumerate(entrees):
+                cours = entree['cours']
+                capacite_requise = self._besoins_salles[cours.id][1]
+                duree = range(t, t + self.variables[cours.id]['nb_creneaux'])
+                for j, salle in enumerate(libres):
+                    if salle.capacite < capacite_requise or any(
+                        (u, s) in occupes[salle.id] for u in duree for s in semaines
+                    ):
+                        continue
+                    preference = 0 if salle.id == cours.classe.salle_principale_id else 1 if salle.id == cours.salle_id else 2
+                    couts[i, j] = preference * self.COUT_PREFERENCE_SALLE + min(
+                        salle.capacite - capacite_requise, self.COUT_PREFERENCE_SALLE - 1
+                    )
+
+            lignes, colonnes = linear_sum_assignment(couts)
+            attribuees = {i: libres[j] for i, j in zip(lignes, colonnes) if couts[i, j] < self.COUT_SALLE_INTERDITE}
+            for i, entree in enumerate(entrees):
+                cours = entree['cours']
+                salle = attribuees.get(i)
+                if salle is None:
+                    non_attribues.append(cours.id)
+                    entree['salle_id'] = cours.salle_id
+                else:
+                    entree['salle_id'] = salle.id
+                occupes.setdefault(entree['salle_id'], set()).update(
+                    (u, s) for u in range(t, t + self.variables[cours.id]['nb_creneaux']) for s in semaines
+                )
+
+        if non_attribues:
+            logger.warning(f"Attribution des salles: {len(non_attribues)} cours sans salle libre sur toute leur durée")
+        return non_attribues
+
     def _ajouter_contraintes_classes(self):
         """Ajoute les contraintes liées aux classes"""
         # Une classe ne peut pas avoir deux cours simultanément
-        # Respect des heures par matière
-        pass
-    
+        for classe_id, cours_ids in self._regrouper_par('classe_id').items():
+            self._ajouter_non_chevauchement(cours_ids, ('classe_id', classe_id))
+
     def _ajouter_contraintes_globales(self):
         """Ajoute les contraintes globales"""
-        # Pauses déjeuner
-        # Heures d'ouverture/fermeture
-        # Contraintes spécifiques à l'établissement
-        pass
-    
+        # Les heures et jours d'ouverture sont portés par le domaine des variables de début.
+        # Un cours confirmé reste à son créneau actuel.
+        for cours_id, cours in self.cours.items():
+            if cours.statut != 'confirme':
+                continue
+            t = self.grille.indice(cours.jour_semaine, cours.heure_debut)
+            if t is not None:
+                condition = self._hypothese('cours_confirme', cours_id, f"Cours confirmé {cours}")
+                self._imposer(self.model.Add(self.variables[cours_id]['debut'] == t), condition)
+                self._imposer(self.model.Add(self.variables[cours_id]['present'] == 1), condition)
+
+        # Règles JSON des contraintes de l'établissement : dures en priorité 5, pénalisées sinon
+        for contrainte_id, priorite, regle in regles_etablissement(self.etablissement):
+            if priorite >= PRIORITE_DURE:
+                regle.emettre(self, condition=self._hypothese(
+                    'contrainte', contrainte_id, f"Contrainte {contrainte_id} (priorité {priorite})"
+                ))
+                continue
+            poids = POIDS_PRIORITE.get(priorite, 1)
+            termes = regle.emettre(self, poids)
+            self.violations.setdefault(contrainte_id, []).extend(termes)
+            self._ajouter_terme(f"contrainte_{contrainte_id}", poids, termes)
+
+    def _ajouter_terme(self, nom, poids, termes):
+        """Ajoute à l'objectif un critère nommé, conservé pour le détail de la solution"""
+        termes = list(termes)
+        if not poids or not termes:
+            return
+        poids_actuel, termes_actuels = self.termes_objectif.get(nom, (poids, []))
+        self.termes_objectif[nom] = (poids_actuel, termes_actuels + termes)
+        self.objectifs.extend(poids * terme for terme in termes)
+
     def _definir_objectif(self):
-        """Définit la fonction objectif à optimiser"""
-        # Minimiser les conflits
-        # Maximiser la satisfaction des enseignants
-        # Optimiser l'utilisation des salles
-        pass
-    
+        """
+        Définit la fonction objectif de placement : somme pondérée de critères nommés (cours non
+        planifiés, déplacements, règles souples). Les critères de qualité sont ajoutés par _resoudre.
+        """
+        # Placer un maximum de cours : chaque cours non planifié est fortement pénalisé
+        self._ajouter_terme('cours_non_planifies', self.PENALITE_COURS_NON_PLANIFIE, (
+            1 - variables['present'] for variables in self.variables.values()
+        ))
+
+        # Perturbation minimale : chaque cours déplacé par rapport à la référence coûte
+        if self.poids_perturbation:
+            self._ajouter_terme('cours_deplaces', self.poids_perturbation, (
+                self._litteral_deplacement(cours_id) for cours_id in self.positions_reference
+            ))
+
+        if self.objectifs:
+            self.model.Minimize(sum(self.objectifs))
+
+    def _ajouter_criteres_qualite(self):
+        """
+        Ajoute à l'objectif les critères de qualité de poids non nul (seconde phase de _resoudre).
+        Retourne True si au moins un critère a été ajouté.
+        """
+        criteres = {
+            'trous_enseignants': self._termes_trous_enseignants,
+            'jours_enseignants': self._termes_jours_enseignants,
+            'changements_salle': self._termes_changements_salle,
+            'pause_dejeuner': self._termes_pause_dejeuner,
+            'matieres_lourdes_apres_midi': self._termes_matieres_lourdes,
+        }
+        for nom, termes in criteres.items():
+            if self.poids.get(nom):
+                self._ajouter_terme(nom, self.poids[nom], termes())
+        return any(nom in self.termes_objectif for nom in criteres)
+
+    def _termes_trous_enseignants(self):
+        """
+        Créneaux libres entre le premier et le dernier cours de chaque journée d'un enseignant
+        (de chaque semaine de l'alternance si certains de ses cours sont alternés)
+        """
+        n = self.grille.creneaux_par_jour
+        termes = []
+        for enseignant_id, cours_ids in self._regrouper_par('enseignant_id').items():
+            for semaine, cours_semaine in self._par_semaine(cours_ids):
+                if len(cours_semaine) < 2:
+                    continue
+                suffixe = f"{enseignant_id}_{semaine}" if semaine else enseignant_id
+                for i in range(len(self.grille.jours)):
+                    premier = self.model.NewIntVar(0, n, f"premier_{suffixe}_{i}")
+                    dernier = self.model.NewIntVar(0, n, f"dernier_{suffixe}_{i}")
+                    occupe = []
+                    for cours_id in cours_semaine:
+                        variables = self.variables[cours_id]
+                        litteral = self._litteral_jour(cours_id, i)
+                        position = variables['debut'] - i * n
+                        self.model.Add(premier <= position).OnlyEnforceIf(litteral)
+                        self.model.Add(dernier >= position + variables['nb_creneaux']).OnlyEnforceIf(litteral)
+                        occupe.append(variables['nb_creneaux'] * litteral)
+
+                    trous = self.model.NewIntVar(0, n, f"trous_{suffixe}_{i}")
+                    self.model.Add(trous >= dernier - premier - sum(occupe))
+                    termes.append(trous)
+        return termes
+
+    def _termes_jours_enseignants(self):
+        """Nombre de jours de présence de chaque enseignant"""
+        termes = []
+        for enseignant_id, cours_ids in self._regrouper_par('enseignant_id').items():
+            for i in range(len(self.grille.jours)):
+                utilise = self.model.NewBoolVar(f"jour_enseignant_{enseignant_id}_{i}")
+                for cours_id in cours_ids:
+                    self.model.AddImplication(self._litteral_jour(cours_id, i), utilise)
+                termes.append(utilise)
+        return termes
+
+    def _termes_changements_salle(self):
+        """
+        Salles supplémentaires utilisées par une classe dans une même journée,
+        borne inférieure du nombre de changements de salle. Sans objet quand les salles sont
+        attribuées en seconde phase, qui privilégie la salle principale de chaque classe.
+        """
+        termes = []
+        if self._salles_agregees:
+            return termes
+        for classe_id, cours_ids in self._regrouper_par('classe_id').items():
+            par_salle = {}
+            for cours_id in cours_ids:
+                if self.cours[cours_id].salle_id is not None:
+                    par_salle.setdefault(self.cours[cours_id].salle_id, []).append(cours_id)
+            if len(par_salle) < 2:
+                continue
+
+            for i in range(len(self.grille.jours)):
+                salles_utilisees = []
+                for salle_id, cours_salle in par_salle.items():
+                    utilisee = self.model.NewBoolVar(f"salle_classe_{classe_id}_{salle_id}_{i}")
+                    for cours_id in cours_salle:
+                        self.model.AddImplication(self._litteral_jour(cours_id, i), utilisee)
+                    salles_utilisees.append(utilisee)
+
+                changements = self.model.NewIntVar(0, len(par_salle), f"changements_salle_{classe_id}_{i}")
+                self.model.Add(changements >= sum(salles_utilisees) - 1)
+                termes.append(changements)
+        return termes
+
+    def _termes_pause_dejeuner(self):
+        """
+        Journées sans pause déjeuner pour une classe. La pause est un intervalle optionnel placé
+        dans FENETRE_DEJEUNER, qui ne peut chevaucher aucun cours de la classe.
+        """
+        duree_pause = self.etablissement.pause_dejeuner
+        creneaux = self.grille.creneaux_entre(*self.FENETRE_DEJEUNER)
+        taille = self.grille.nombre_creneaux(duree_pause)
+        debuts = [c for c in creneaux if all(c + k in creneaux for k in range(taille))]
+        if not duree_pause or not debuts:
+            return []
+
+        termes = []
+        for classe_id, cours_ids in self._regrouper_par('classe_id').items():
+            pauses = []
+            for i in range(len(self.grille.jours)):
+                decalage = i * self.grille.creneaux_par_jour
+                debut = self.model.NewIntVarFromDomain(
+                    cp_model.Domain.FromValues([decalage + c for c in debuts]), f"pause_{classe_id}_{i}"
+                )
+                presente = self.model.NewBoolVar(f"pause_presente_{classe_id}_{i}")
+                pauses.append(self.model.NewOptionalIntervalVar(
+                    debut, taille, debut + taille, presente, f"intervalle_pause_{classe_id}_{i}"
+                ))
+                termes.append(1 - presente)
+            self._ajouter_non_chevauchement(cours_ids, ('classe_id', classe_id), supplementaires=pauses)
+        return termes
+
+    def _termes_matieres_lourdes(self):
+        """Cours de matières lourdes (contraintes_matiere {"lourde": true}) placés l'après-midi"""
+        n = self.grille.creneaux_par_jour
+        matin = set(self.grille.creneaux_entre('00:00', self.DEBUT_APRES_MIDI))
+        termes = []
+        domaines = {}
+        for cours_id, cours in self.cours.items():
+            if not (cours.matiere.contraintes_matiere or {}).get('lourde'):
+                continue
+            variables = self.variables[cours_id]
+            nb_creneaux = variables['nb_creneaux']
+            if nb_creneaux not in domaines:
+                domaines[nb_creneaux] = cp_model.Domain.FromValues([
+                    t for t in range(self.grille.horizon)
+                    if t % n in matin and t % n + nb_creneaux <= n
+                ])
+
+            apres_midi = self.model.NewBoolVar(f"apres_midi_{cours_id}")
+            self.model.AddLinearExpressionInDomain(
+                variables['debut'], domaines[nb_creneaux]
+            ).OnlyEnforceIf(apres_midi.Not())
+            termes.append(apres_midi)
+        return termes
+
     def _extraire_solution(self, emploi_temps):
         """Extrait la solution optimisée"""
+        cours_optimises = []
+        for cours_id, variables in self.variables.items():
+            if not self.solver.BooleanValue(variables['present']):
+                continue
+            cours = self.cours[cours_id]
+            jour_semaine, heure_debut = self.grille.jour_et_heure(self.solver.Value(variables['debut']))
+            heure_fin = (datetime.combine(datetime.min, heure_debut) + timedelta(minutes=cours.duree)).time()
+            cours_optimises.append({
+                'cours': cours,
+                'jour_semaine': jour_semaine,
+                'heure_debut': heure_debut,
+                'heure_fin': heure_fin,
+                'salle_id': cours.salle_id,
+            })
+        salles_non_attribuees = self._attribuer_salles(cours_optimises) if self._salles_agregees else []
+
         solution = {
             'emploi_temps': emploi_temps,
             'score': self.solver.ObjectiveValue(),
-            'conflits_resolus': 0,
-            'temps_calcul': self.solver.WallTime(),
-            'cours_optimises': []
+            'detail_objectif': self._detail_objectif(),
+            'conflits_resolus': self._compter_conflits_initiaux(),
+            'temps_calcul': self.temps_premiere_phase + self.solver.WallTime(),
+            'progression': self.suivi.progression if self.suivi else [],
+            'diagnostic': self.diagnostic,
+            'cours_non_planifies': len(self.variables) - len(cours_optimises),
+            'cours_deplaces': sum(
+                1 for cours_id, t in self.positions_reference.items()
+                if not self.solver.BooleanValue(self.variables[cours_id]['present']) or
+                self.solver.Value(self.variables[cours_id]['debut']) != t
+            ),
+            'contraintes_violees': sum(
+                1 for termes in self.violations.values()
+                if any(self.solver.Value(terme) for terme in termes)
+            ),
+            'salles_non_attribuees': salles_non_attribuees,
+            'qualite_optimisee': self.qualite_optimisee,
+            'cours_optimises': cours_optimises
         }
         return solution
 
+    def _detail_objectif(self):
+        """
+        Valeur brute, poids et coût de chaque critère de l'objectif dans la solution trouvée.
+        Permet de réévaluer la solution pour d'autres poids avec recalculer_score.
+        """
+        detail = {}
+        for nom, (poids, termes) in self.termes_objectif.items():
+            valeur = sum(self.solver.Value(terme) for terme in termes)
+            detail[nom] = {'valeur': valeur, 'poids': poids, 'cout': poids * valeur}
+        return detail
+
+    def _compter_conflits_initiaux(self):
+        """
+        Nombre de paires de cours en conflit (même enseignant, salle ou classe) dans le placement
+        initial des cours optimisés ; la solution n'en contient plus aucun par construction.
+        """
+        intervalles = {}
+        for cours in list(self.cours.values()) + list(self.cours_figes.values()):
+            debut = en_minutes(cours.heure_debut)
+            for attribut in ('enseignant_id', 'salle_id', 'classe_id'):
+                ressource_id = getattr(cours, attribut)
+                if ressource_id is not None:
+                    intervalles.setdefault((attribut, ressource_id, cours.jour_semaine), []).append(
+                        (debut, debut + cours.duree, cours.id)
+                    )
+
+        semaines = {cours_id: cours.semaine for cours_id, cours in {**self.cours, **self.cours_figes}.items()}
+        paires = set()
+        for groupe in intervalles.values():
+            for cours1, cours2 in paires_chevauchantes(groupe):
+                if (cours1 in self.cours or cours2 in self.cours) and semaines_communes(semaines[cours1], semaines[cours2]):
+                    paires.add((min(cours1, cours2), max(cours1, cours2)))
+        return len(paires)
+
+
+class StrategieVoisinage:
+    """
+    Stratégie de choix du voisinage relâché à chaque itération de la recherche à voisinage large.
+
+    `choisir` retourne l'ensemble des identifiants de cours libérés ; `retour` est appelé
+    après chaque itération pour permettre aux stratégies adaptatives d'apprendre.
+    """
+
+    nom = 'voisinage'
+
+    def __init__(self, graine=None):
+        self.aleatoire = random.Random(graine)
+
+    def choisir(self, recherche):
+        raise NotImplementedError
+
+    def retour(self, libres, ameliore):
+        pass
+
+
+class VoisinageJour(StrategieVoisinage):
+    """Libère tous les cours actuellement placés un même jour"""
+
+    nom = 'jour'
+
+    def choisir(self, recherche):
+        indice_jour = self.aleatoire.randrange(len(recherche.optimiseur.grille.jours))
+        creneaux_par_jour = recherche.optimiseur.grille.creneaux_par_jour
+        return {
+            cours_id for cours_id, t in recherche.solution_courante.items()
+            if t is None or t // creneaux_par_jour == indice_jour
+        }
+
+
+class VoisinageNiveau(StrategieVoisinage):
+    """Libère tous les cours des classes d'un même niveau"""
+
+    nom = 'niveau'
+
+    def choisir(self, recherche):
+        cours = recherche.optimiseur.cours
+        niveaux = sorted({c.classe.niveau for c in cours.values()})
+        niveau = self.aleatoire.choice(niveaux)
+        return {cours_id for cours_id, c in cours.items() if c.classe.niveau == niveau}
+
+
+class VoisinageEnseignants(StrategieVoisinage):
+    """Libère un groupe d'enseignants partageant des classes, à partir d'un enseignant tiré au hasard"""
+
+    nom = 'enseignants'
+
+    def __init__(self, graine=None, taille_groupe=5):
+        super().__init__(graine)
+        self.taille_groupe = taille_groupe
+
+    def choisir(self, recherche):
+        cours = recherche.optimiseur.cours
+        classes_par_enseignant = {}
+        enseignants_par_classe = {}
+        for c in cours.values():
+            classes_par_enseignant.setdefault(c.enseignant_id, set()).add(c.classe_id)
+            enseignants_par_classe.setdefault(c.classe_id, set()).add(c.enseignant_id)
+
+        groupe = [self.aleatoire.choice(sorted(classes_par_enseignant))]
+        candidats = set()
+        while len(groupe) < self.taille_groupe:
+            for classe_id in classes_par_enseignant[groupe[-1]]:
+                candidats.update(enseignants_par_classe[classe_id])
+            candidats.difference_update(groupe)
+            if not candidats:
+                break
+            groupe.append(self.aleatoire.choice(sorted(candidats)))
+
+        groupe = set(groupe)
+        return {cours_id for cours_id, c in cours.items() if c.enseignant_id in groupe}
+
+
+class VoisinageAdaptatif(StrategieVoisinage):
+    """
+    Combine plusieurs stratégies et privilégie celles qui ont récemment produit des améliorations
+    """
+
+    nom = 'adaptatif'
+
+    def __init__(self, strategies=None, graine=None, lissage=0.2):
+        super().__init__(graine)
+        self.strategies = strategies or [
+            VoisinageJour(graine), VoisinageNiveau(graine), VoisinageEnseignants(graine)
+        ]
+        self.poids = [1.0] * len(self.strategies)
+        self.lissage = lissage
+        self._derniere = 0
+
+    def choisir(self, recherche):
+        self._derniere = self.aleatoire.choices(range(len(self.strategies)), weights=self.poids)[0]
+        strategie = self.strategies[self._derniere]
+        self.nom = strategie.nom
+        return strategie.choisir(recherche)
+
+    def retour(self, libres, ameliore):
+        self.strategies[self._derniere].retour(libres, ameliore)
+        self.poids[self._derniere] = max(
+            (1 - self.lissage) * self.poids[self._derniere] + self.lissage * (1.0 if ameliore else 0.0),
+            0.05
+        )
+
+
+class RechercheVoisinageLarge:
+    """
+    Recherche à voisinage large (LNS) pour les très grands établissements.
+
+    Le modèle complet est construit une seule fois par l'OptimiseurEmploiTemps. À chaque itération,
+    tous les cours hors du voisinage choisi sont fixés à leur créneau courant et le sous-problème
+    est résolu avec une limite de temps courte ; la solution n'est conservée que si elle améliore
+    l'objectif global.
+
+    Comme OptimiseurEmploiTemps._resoudre, la recherche est lexicographique : les itérations portent
+    d'abord sur le placement, puis, pendant la dernière fraction `part_qualite` du temps, sur
+    l'objectif complet à placement au moins aussi bon.
+    """
+
+    def __init__(self, optimiseur, strategie=None, temps_iteration=2.0, nb_iterations=100,
+                 temps_max=None, taille_max_voisinage=400, graine=None, part_qualite=0.3):
+        self.optimiseur = optimiseur
+        self.strategie = strategie or VoisinageAdaptatif(graine=graine)
+        self.temps_iteration = temps_iteration
+        self.nb_iterations = nb_iterations
+        self.temps_max = temps_max if temps_max is not None else optimiseur.solver.parameters.max_time_in_seconds
+        self.taille_max_voisinage = taille_max_voisinage
+        self.part_qualite = part_qualite
+        self.aleatoire = random.Random(graine)
+        self.solution_courante = {}
+        # Valeurs de toutes les variables du modèle dans la solution courante (indications)
+        self.valeurs_courantes = []
+        self.meilleur_objectif = None
+
+    def optimiser(self, emploi_temps, optimisation=None, reference=None):
+        """
+        Optimise un emploi du temps par voisinages successifs.
+        La courbe d'amélioration est enregistrée dans l'OptimisationEmploiTemps fournie.
+        """
+        optimiseur = self.optimiseur
+        debut = datetime.now()
+        try:
+            optimiseur._charger_poids(optimisation)
+            optimiseur._construire_modele(emploi_temps, reference)
+            suivi = optimiseur.suivi = SuiviSolutions(optimisation)
+
+            # Première solution : arrêt dès la première solution trouvée
+            solveur = self._nouveau_solveur(self.temps_max)
+            solveur.parameters.stop_after_first_solution = True
+            status = solveur.Solve(optimiseur.model)
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                logger.error(f"LNS: aucune solution initiale ({solveur.StatusName(status)})")
+                optimiseur.solver = solveur
+                optimiseur._journaliser(emploi_temps, optimisation, status)
+                return None
+            self._accepter(solveur, suivi, debut, 0, 'initiale')
+
+            iteration = 0
+            phase_qualite = qualite_optimisee = False
+            while iteration < self.nb_iterations and not suivi.annule:
+                ecoule = (datetime.now() - debut).total_seconds()
+                if ecoule >= self.temps_max:
+                    break
+                if not phase_qualite and (status == cp_model.OPTIMAL or
+                                          ecoule >= self.temps_max * (1 - self.part_qualite)):
+                    # Seconde phase : critères de qualité, sans dégrader le placement obtenu
+                    phase_qualite = True
+                    principal = sum(optimiseur.objectifs)
+                    if not optimiseur._ajouter_criteres_qualite():
+                        break
+                    optimiseur.model.Add(principal <= round(self.meilleur_objectif))
+                    optimiseur.model.Minimize(sum(optimiseur.objectifs))
+                    # Les nouvelles variables n'ont pas de valeur : toute solution est acceptée
+                    self.meilleur_objectif = float('inf')
+
+                iteration += 1
+                libres = self._limiter(self.strategie.choisir(self))
+                sous_solveur = self._nouveau_solveur()
+                sous_status = sous_solveur.Solve(self._sous_modele(libres))
+
+                ameliore = (
+                    sous_status in (cp_model.OPTIMAL, cp_model.FEASIBLE) and
+                    sous_solveur.ObjectiveValue() < self.meilleur_objectif
+                )
+                if ameliore:
+                    solveur = sous_solveur
+                    qualite_optimisee = phase_qualite
+                    self._accepter(solveur, suivi, debut, iteration, self.strategie.nom)
+                self.strategie.retour(libres, ameliore)
+
+            if not qualite_optimisee:
+                optimiseur._retirer_criteres_qualite()
+            suivi.sauvegarder()
+            optimiseur.solver = solveur
+            solution = optimiseur._extraire_solution(emploi_temps)
+            solution['temps_calcul'] = (datetime.now() - debut).total_seconds()
+            solution['iterations'] = iteration
+            optimiseur._journaliser(emploi_temps, optimisation, status, solution)
+            return solution
+
+        except Exception as e:
+            logger.error(f"Erreur lors de l'optimisation LNS: {e}")
+            return None
+
+    def _nouveau_solveur(self, temps_max=None):
+        """Solveur aux paramètres de l'optimiseur, limité par défaut au temps d'une itération"""
+        solveur = cp_model.CpSolver()
+        solveur.parameters.CopyFrom(self.optimiseur.solver.parameters)
+        solveur.parameters.max_time_in_seconds = temps_max or self.temps_iteration
+        return solveur
+
+    def _limiter(self, libres):
+        """Échantillonne le voisinage s'il dépasse la taille maximale"""
+        if len(libres) <= self.taille_max_voisinage:
+            return libres
+        return set(self.aleatoire.sample(sorted(libres), self.taille_max_voisinage))
+
+    def _sous_modele(self, libres):
+        """Copie du modèle complet où les cours hors voisinage sont fixés à leur créneau courant"""
+        modele = self.optimiseur.model.Clone()
+        # La solution courante complète, variables auxiliaires comprises, sert d'indication
+        _indiquer_solution(modele, self.valeurs_courantes)
+        for cours_id, variables in self.optimiseur.variables.items():
+            if cours_id in libres:
+                continue
+            t = self.solution_courante[cours_id]
+            debut = modele.GetIntVarFromProtoIndex(variables['debut'].Index())
+            present = modele.GetBoolVarFromProtoIndex(variables['present'].Index())
+            if t is None:
+                modele.Add(present == 0)
+            else:
+                modele.Add(debut == t)
+                modele.Add(present == 1)
+        return modele
+
+    def _accepter(self, solveur, suivi, debut, iteration, voisinage):
+        """Retient la solution du solveur comme solution courante"""
+        self.meilleur_objectif = solveur.ObjectiveValue()
+        self.valeurs_courantes = list(solveur.ResponseProto().solution)
+        self.solution_courante = {
+            cours_id: solveur.Value(variables['debut']) if solveur.BooleanValue(variables['present']) else None
+            for cours_id, variables in self.optimiseur.variables.items()
+        }
+        suivi.progression.append({
+            'objectif': self.meilleur_objectif,
+            'borne': None,
+            'temps': (datetime.now() - debut).total_seconds(),
+            'iteration': iteration,
+            'voisinage': voisinage,
+        })
+        suivi.sauvegarder()
+
 
 class PredicteurAbsences:
     """
@@ -255,165 +2399,442 @@ class OptimiseurRemplacants:
     """
     Classe pour optimiser le matching des remplaçants
     """
-    
+
+    # Pondération du score global : compétence, disponibilité, géographie, expérience
+    POIDS_SCORES = np.array([0.4, 0.3, 0.2, 0.1])
+
+    # Distance estimée entre le domicile d'un remplaçant et l'établissement (en km)
+    DISTANCE_ESTIMEE = 20
+
+    # Nombre de remplaçants proposés pour une absence
+    NOMBRE_PROPOSITIONS = 10
+
+    # Affectation groupée : candidats retenus par absence, service hebdomadaire d'un remplaçant
+    # sans profil enseignant (en heures)
+    CANDIDATS_AFFECTATION = 20
+    HEURES_MAX_SEMAINE_REMPLACANT = 18
+    TEMPS_MAX_AFFECTATION = 30.0  # en secondes
+
+    # Objectif de l'affectation, en millièmes de score global : remplaçant supplémentaire sur une
+    # même absence (second temps, à couverture égale)
+    PENALITE_REMPLACANT_ABSENCE = 500
+
     def __init__(self):
         self.model = GradientBoostingRegressor(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
-        
+
     def trouver_meilleurs_remplacants(self, absence, remplacants_disponibles):
         """
         Trouve les meilleurs remplaçants pour une absence donnée
         """
         try:
-            scores = []
-            
-            for remplacant in remplacants_disponibles:
-                score = self._calculer_score_compatibilite(absence, remplacant)
-                scores.append({
-                    'remplacant': remplacant,
-                    'score_global': score['score_global'],
-                    'score_competence': score['score_competence'],
-                    'score_disponibilite': score['score_disponibilite'],
-                    'score_geographique': score['score_geographique'],
-                    'score_experience': score['score_experience'],
-                    'details': score['details']
-                })
-            
-            # Trier par score global
-            scores.sort(key=lambda x: x['score_global'], reverse=True)
-            
-            return scores[:10]  # Retourner les 10 meilleurs
-            
+            return self.scorer_remplacants(absence, remplacants_disponibles, nombre=self.NOMBRE_PROPOSITIONS)
+
         except Exception as e:
             logger.error(f"Erreur lors du matching: {e}")
             return []
-    
-    def _calculer_score_compatibilite(self, absence, remplacant):
+
+    def scorer_remplacants(self, absence, remplacants, nombre=None, index=None):
+        """
+        Scores de compatibilité des remplaçants candidats pour une absence, calculés ensemble :
+        les cours de l'absence et les matières des candidats sont chargés en une requête chacun,
+        chaque score est un tableau aligné sur les candidats.
+
+        Avec `nombre`, seuls les `nombre` meilleurs sont retenus (tas borné, par score global
+        décroissant) et leurs détails sont les seuls calculés ; sinon tous les candidats sont
+        retournés dans leur ordre. Les disponibilités d'un candidat sont lues dans l'index de son
+        établissement de rattachement, qui peut différer de celui de l'absence (vivier académique) ;
+        `index` ({etablissement_id: IndexDisponibilites}) permet à l'appelant de partager ces index
+        d'un appel à l'autre, les manquants étant demandés à index_disponibilites.
+        Retourne une liste de {'remplacant', 'score_global', 'score_competence', 'score_disponibilite',
+        'score_geographique', 'score_experience', 'details'}.
         """
-        Calcule le score de compatibilité entre une absence et un remplaçant
+        from apps.remplacements.models import Remplacant
+
+        remplacants, distances = self._remplacants_a_portee(absence, remplacants)
+        if not remplacants:
+            return []
+        cours_concernes = list(absence.get_cours_concernes().select_related('matiere'))
+
+        # Matrice candidats × matières requises
+        matieres_requises = list({cours.matiere_id: cours.matiere for cours in cours_concernes}.values())
+        colonnes = {matiere.id: j for j, matiere in enumerate(matieres_requises)}
+        lignes = {remplacant.id: i for i, remplacant in enumerate(remplacants)}
+        competences = np.zeros((len(remplacants), len(matieres_requises)), dtype=bool)
+        for remplacant_id, matiere_id in Remplacant.matieres_enseignees.through.objects.filter(
+            remplacant_id__in=lignes, matiere_id__in=colonnes
+        ).values_list('remplacant_id', 'matiere_id'):
+            competences[lignes[remplacant_id], colonnes[matiere_id]] = True
+
+        index = self._index_remplacants(remplacants, {} if index is None else index)
+        scores = np.column_stack([
+            self._scores_competence(competences),
+            self._scores_disponibilite(absence, remplacants, index),
+            self._scores_geographiques(remplacants, distances),
+            self._scores_experience(remplacants),
+        ])
+        scores_globaux = scores @ self.POIDS_SCORES
+
+        # Les ex æquo restent dans l'ordre des candidats, comme avec un tri stable
+        if nombre is None:
+            retenus = list(range(len(remplacants)))
+        else:
+            retenus = heapq.nlargest(nombre, range(len(remplacants)), key=scores_globaux.__getitem__)
+
+        # Cours remplaçables (matière enseignée et créneau libre), pour les seuls candidats retenus,
+        # regroupés par index
+        groupes = {}
+        for i in retenus:
+            groupes.setdefault(id(index[i]), (index[i], []))[1].append(remplacants[i].id)
+        remplacables = np.zeros((len(remplacants), len(cours_concernes)), dtype=bool)
+        for k, cours in enumerate(cours_concernes):
+            for index_groupe, ids in groupes.values():
+                libres = index_groupe.remplacants_libres(
+                    None, cours.jour_semaine, cours.heure_debut, cours.heure_fin, remplacants=ids, semaine=cours.semaine
+                )
+                remplacables[[lignes[remplacant_id] for remplacant_id in libres], k] = True
+            remplacables[:, k] &= competences[:, colonnes[cours.matiere_id]]
+
+        resultats = []
+        for i in retenus:
+            matieres_compatibles = [matiere for j, matiere in enumerate(matieres_requises) if competences[i, j]]
+            resultats.append({
+                'remplacant': remplacants[i],
+                'score_global': float(scores_globaux[i]),
+                'score_competence': float(scores[i, 0]),
+                'score_disponibilite': float(scores[i, 1]),
+                'score_geographique': float(scores[i, 2]),
+                'score_experience': float(scores[i, 3]),
+                'details': {
+                    'matieres_compatibles': matieres_compatibles,
+                    'cours_remplacables': [cours for k, cours in enumerate(cours_concernes) if remplacables[i, k]],
+                    'contraintes_respectees': self._contraintes_respectees(
+                        scores[i, 1] > 0, matieres_compatibles, scores[i, 2] > 0
+                    ),
+                }
+            })
+        return resultats
+
+    def affecter_remplacants(self, absences, heures_max_semaine=None, temps_max=None, academie_id=None):
         """
-        # Score de compétence (matières enseignées)
-        score_competence = self._calculer_score_competence(absence, remplacant)
-        
-        # Score de disponibilité
-        score_disponibilite = self._calculer_score_disponibilite(absence, remplacant)
-        
-        # Score géographique
-        score_geographique = self._calculer_score_geographique(absence, remplacant)
-        
-        # Score d'expérience
-        score_experience = self._calculer_score_experience(absence, remplacant)
-        
-        # Score global pondéré
-        score_global = (
-            score_competence * 0.4 +
-            score_disponibilite * 0.3 +
-            score_geographique * 0.2 +
-            score_experience * 0.1
+        Affectation groupée des remplaçants à un ensemble d'absences, plutôt qu'un matching
+        indépendant par absence qui propose le même remplaçant partout.
+
+        Chaque cours d'une absence est un créneau à couvrir par au plus un remplaçant, choisi parmi
+        les meilleurs candidats de l'absence (scorer_remplacants) qui peuvent le remplacer et sont
+        disponibles dès le premier jour. Les candidats sont les remplaçants de l'établissement de
+        l'absence, ou avec `academie_id` ceux de tous les établissements de l'académie. Un cours n'est
+        affecté qu'à ses dates comprises dans la période de disponibilité du remplaçant et sans mission
+        acceptée ce jour-là. Les cours retenus pour une même personne ne se chevauchent pas aux dates
+        où ils ont lieu et ne dépassent pas, chaque semaine, son service maximal diminué des heures de
+        ses missions acceptées (profil enseignant, sinon `heures_max_semaine` ou
+        HEURES_MAX_SEMAINE_REMPLACANT).
+        Le modèle CP-SAT maximise d'abord les minutes couvertes (doublées pour une absence urgente)
+        et les scores ; puis, sans perdre de couverture et dans le temps restant, il regroupe les cours
+        d'une même absence sur moins de remplaçants.
+
+        Retourne {absence_id: [{'remplacant', 'score_global', 'score_competence', 'score_disponibilite',
+        'score_geographique', 'score_experience', 'cours'}]}, un élément par remplaçant affecté.
+        """
+        from django.conf import settings
+        from apps.accounts.models import ProfilEnseignant
+        from apps.remplacements.models import Remplacant, Remplacement
+
+        model = cp_model.CpModel()
+
+        affectations = {}  # (absence_id, cours_id, remplacant_id) -> variable
+        scores = {}  # (absence_id, remplacant_id) -> score du remplaçant pour l'absence
+        cours_absences = {}  # (absence_id, cours_id) -> cours
+        occupations = {}  # (personne, date) -> [(début, fin, clé de l'affectation)] en minutes
+        charges = {}  # (personne, semaine ISO) -> [(variable, durée en minutes)]
+        par_suivi = {}  # (absence_id, personne) -> variables
+        couverture = []
+        qualite = []
+        index = {}  # etablissement_id -> index des disponibilités, partagé entre les absences
+        disponibles = Remplacant.objects.filter(statut='disponible')
+
+        retenus = []  # [(absence, scores des candidats disponibles dès le premier jour)]
+        for absence in absences:
+            if academie_id is not None:
+                vivier = disponibles.filter(etablissement__academie_id=academie_id)
+            else:
+                vivier = disponibles.filter(etablissement_id=absence.etablissement_id)
+            candidats = self.scorer_remplacants(
+                absence, vivier, nombre=self.CANDIDATS_AFFECTATION, index=index,
+            )
+            retenus.append((absence, [score for score in candidats if score['score_disponibilite'] > 0]))
+
+        # Missions acceptées des candidats (tous établissements confondus) sur les semaines des absences :
+        # jours déjà pris et minutes déjà engagées par semaine ISO
+        personnes = {score['remplacant'].enseignant_id for _, candidats in retenus for score in candidats}
+        jours_pris = set()
+        engagees = {}
+        if personnes:
+            debut = min(absence.date_debut for absence, _ in retenus)
+            fin = max(absence.date_fin for absence, _ in retenus)
+            lundi, dimanche = debut - timedelta(days=debut.weekday()), fin + timedelta(days=6 - fin.weekday())
+            for personne, date, heure_debut, heure_fin in Remplacement.objects.filter(
+                remplacant__enseignant_id__in=personnes,
+                statut__in=['accepte', 'effectue'],
+                date_remplacement__range=(lundi, dimanche),
+            ).values_list('remplacant__enseignant_id', 'date_remplacement', 'heure_debut', 'heure_fin'):
+                jours_pris.add((personne, date))
+                semaine = (personne, date.isocalendar()[:2])
+                engagees[semaine] = engagees.get(semaine, 0) + en_minutes(heure_fin) - en_minutes(heure_debut)
+
+        for absence, candidats in retenus:
+            urgence = 2 if absence.urgence else 1
+            for score in candidats:
+                remplacant = score['remplacant']
+                personne = remplacant.enseignant_id  # une personne peut remplacer dans plusieurs établissements
+                fin_disponibilite = remplacant.date_fin_disponibilite or absence.date_fin
+                for cours in score['details']['cours_remplacables']:
+                    dates = [
+                        date for date in self._dates_cours(absence, cours)
+                        if remplacant.date_debut_disponibilite <= date <= fin_disponibilite and
+                        (personne, date) not in jours_pris
+                    ]
+                    if not dates:
+                        continue
+                    cle = (absence.id, cours.id, remplacant.id)
+                    variable = model.NewBoolVar(f"affectation_{absence.id}_{cours.id}_{remplacant.id}")
+                    affectations[cle] = variable
+                    scores[(absence.id, remplacant.id)] = score
+                    cours_absences[(absence.id, cours.id)] = cours
+
+                    creneau = (en_minutes(cours.heure_debut), en_minutes(cours.heure_fin), cle)
+                    for date in dates:
+                        occupations.setdefault((personne, date), []).append(creneau)
+                        charges.setdefault((personne, date.isocalendar()[:2]), []).append((variable, cours.duree))
+                    par_suivi.setdefault((absence.id, personne), []).append(variable)
+                    couverture.append(variable * cours.duree * urgence)
+                    qualite.append(variable * round(score['score_global'] * 1000))
+
+        if not affectations:
+            return {}
+
+        # Un remplaçant au plus par cours d'absence
+        par_cours = {}
+        for (absence_id, cours_id, _), variable in affectations.items():
+            par_cours.setdefault((absence_id, cours_id), []).append(variable)
+        for variables in par_cours.values():
+            model.AddAtMostOne(variables)
+
+        # Créneaux sans chevauchement, par personne et par date : au début de chaque créneau, une seule
+        # des affectations en cours (deux créneaux qui se chevauchent sont en cours au plus tardif des débuts)
+        cliques = set()
+        for creneaux in occupations.values():
+            for debut, _, _ in creneaux:
+                clique = frozenset(cle for autre, fin, cle in creneaux if autre <= debut < fin)
+                if len(clique) > 1:
+                    cliques.add(clique)
+        for clique in cliques:
+            model.AddAtMostOne([affectations[cle] for cle in clique])
+
+        # Service hebdomadaire maximal par personne, missions déjà acceptées comprises
+        services = dict(ProfilEnseignant.objects.filter(
+            user_id__in={personne for personne, _ in charges}
+        ).values_list('user_id', 'heures_max_semaine'))
+        for (personne, semaine), termes in charges.items():
+            maximum = max(
+                60 * services.get(personne, heures_max_semaine or self.HEURES_MAX_SEMAINE_REMPLACANT) -
+                engagees.get((personne, semaine), 0),
+                0
+            )
+            if sum(duree for _, duree in termes) > maximum:
+                model.Add(sum(variable * duree for variable, duree in termes) <= maximum)
+
+        # Premier temps : couverture, puis scores (un score vaut moins d'une minute couverte)
+        temps_max = temps_max or self.TEMPS_MAX_AFFECTATION
+        couverture, qualite = sum(couverture), sum(qualite)
+        model.Maximize(1001 * couverture + qualite)
+        solver = cp_model.CpSolver()
+        solver.parameters.num_search_workers = getattr(settings, 'OPTIMISATION_NB_WORKERS', 8)
+        solver.parameters.max_time_in_seconds = temps_max
+        solver.parameters.relative_gap_limit = getattr(settings, 'OPTIMISATION_ECART_RELATIF', 0.01)
+        status = solver.Solve(model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            logger.error(f"Affectation des remplaçants sans solution: {solver.StatusName(status)}")
+            return {}
+        valeurs = {cle: solver.BooleanValue(variable) for cle, variable in affectations.items()}
+
+        # Second temps : à couverture au moins égale, moins de remplaçants par absence
+        duree = solver.WallTime()
+        temps_restant = temps_max - duree
+        if temps_restant >= 1:
+            model.Add(couverture >= round(solver.Value(couverture)))
+            suivies = {}
+            for (absence_id, personne), variables in par_suivi.items():
+                suivies[(absence_id, personne)] = model.NewBoolVar(f"suivie_{absence_id}_{personne}")
+                for variable in variables:
+                    model.AddImplication(variable, suivies[(absence_id, personne)])
+            model.Maximize(qualite - self.PENALITE_REMPLACANT_ABSENCE * sum(suivies.values()))
+            suivies_retenues = {
+                (absence_id, scores[(absence_id, remplacant_id)]['remplacant'].enseignant_id)
+                for (absence_id, _, remplacant_id), valeur in valeurs.items() if valeur
+            }
+            for cle, variable in affectations.items():
+                model.AddHint(variable, int(valeurs[cle]))
+            for cle, variable in suivies.items():
+                model.AddHint(variable, int(cle in suivies_retenues))
+            solver.parameters.max_time_in_seconds = temps_restant
+            if solver.Solve(model) in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                valeurs = {cle: solver.BooleanValue(variable) for cle, variable in affectations.items()}
+            duree += solver.WallTime()
+
+        resultat = {}
+        for (absence_id, cours_id, remplacant_id), valeur in valeurs.items():
+            if not valeur:
+                continue
+            score = scores[(absence_id, remplacant_id)]
+            par_remplacant = resultat.setdefault(absence_id, {})
+            if remplacant_id not in par_remplacant:
+                par_remplacant[remplacant_id] = {
+                    **{champ: donnee for champ, donnee in score.items() if champ != 'details'}, 'cours': [],
+                }
+            par_remplacant[remplacant_id]['cours'].append(cours_absences[(absence_id, cours_id)])
+
+        couverts = sum(
+            len(affectation['cours']) for par_remplacant in resultat.values() for affectation in par_remplacant.values()
+        )
+        logger.info(
+            f"Affectation des remplaçants ({solver.StatusName(status)}, {duree:.1f}s): "
+            f"{couverts}/{len(par_cours)} cours couverts sur {len(resultat)} absences"
         )
-        
         return {
-            'score_global': score_global,
-            'score_competence': score_competence,
-            'score_disponibilite': score_disponibilite,
-            'score_geographique': score_geographique,
-            'score_experience': score_experience,
-            'details': {
-                'matieres_compatibles': self._get_matieres_compatibles(absence, remplacant),
-                'cours_remplacables': self._get_cours_remplacables(absence, remplacant),
-                'contraintes_respectees': self._get_contraintes_respectees(absence, remplacant)
-            }
+            absence_id: sorted(par_remplacant.values(), key=lambda affectation: -len(affectation['cours']))
+            for absence_id, par_remplacant in resultat.items()
         }
-    
-    def _calculer_score_competence(self, absence, remplacant):
-        """Calcule le score de compétence"""
-        cours_concernes = absence.get_cours_concernes()
-        matieres_requises = set(cours.matiere for cours in cours_concernes)
-        matieres_enseignees = set(remplacant.matieres_enseignees.all())
-        
-        if not matieres_requises:
-            return 0.0
-        
-        intersection = matieres_requises.intersection(matieres_enseignees)
-        return len(intersection) / len(matieres_requises)
-    
-    def _calculer_score_disponibilite(self, absence, remplacant):
-        """Calcule le score de disponibilité"""
-        if not remplacant.is_disponible(absence.date_debut):
-            return 0.0
-        
-        # Vérifier la disponibilité pour chaque jour d'absence
-        jours_disponibles = 0
-        total_jours = (absence.date_fin - absence.date_debut).days + 1
-        
-        for i in range(total_jours):
-            date = absence.date_debut + timedelta(days=i)
-            if remplacant.is_disponible(date):
-                jours_disponibles += 1
-        
-        return jours_disponibles / total_jours
-    
-    def _calculer_score_geographique(self, absence, remplacant):
-        """Calcule le score géographique"""
-        # Simplifié - en réalité, il faudrait calculer la distance
-        # entre le domicile du remplaçant et l'établissement
-        distance_max = remplacant.distance_max
-        # Simulation d'une distance
-        distance_estimee = 20  # km
-        
-        if distance_estimee <= distance_max:
-            return 1.0 - (distance_estimee / distance_max)
-        else:
-            return 0.0
-    
-    def _calculer_score_experience(self, absence, remplacant):
-        """Calcule le score d'expérience"""
-        # Basé sur l'expérience et les évaluations
-        experience = remplacant.experience_remplacement
-        note_moyenne = remplacant.note_moyenne
-        
-        score_experience = min(experience / 10, 1.0)  # Max 10 ans = score 1.0
-        score_evaluation = note_moyenne / 5.0  # Note sur 5
-        
-        return (score_experience + score_evaluation) / 2.0
-    
-    def _get_matieres_compatibles(self, absence, remplacant):
-        """Retourne les matières compatibles"""
-        cours_concernes = absence.get_cours_concernes()
-        matieres_requises = set(cours.matiere for cours in cours_concernes)
-        matieres_enseignees = set(remplacant.matieres_enseignees.all())
-        
-        return list(matieres_requises.intersection(matieres_enseignees))
-    
-    def _get_cours_remplacables(self, absence, remplacant):
-        """Retourne les cours remplaçables"""
-        cours_concernes = absence.get_cours_concernes()
-        matieres_compatibles = self._get_matieres_compatibles(absence, remplacant)
-        
-        cours_remplacables = []
-        for cours in cours_concernes:
-            if cours.matiere in matieres_compatibles:
-                cours_remplacables.append(cours)
-        
-        return cours_remplacables
-    
-    def _get_contraintes_respectees(self, absence, remplacant):
+
+    @staticmethod
+    def _dates_cours(absence, cours):
+        """Dates de l'absence où le cours hebdomadaire a lieu"""
+        premier = absence.date_debut + timedelta(days=(cours.jour_semaine - 1 - absence.date_debut.weekday()) % 7)
+        return [premier + timedelta(days=7 * k) for k in range((absence.date_fin - premier).days // 7 + 1)]
+
+    def _scores_competence(self, competences):
+        """Part des matières requises enseignées par chaque candidat"""
+        if not competences.shape[1]:
+            return np.zeros(competences.shape[0])
+        return competences.mean(axis=1)
+
+    def _index_remplacants(self, remplacants, index):
+        """
+        Index des disponibilités de l'établissement de chaque remplaçant (liste alignée sur les
+        remplaçants), pris dans `index` ({etablissement_id: index}) et ajoutés à celui-ci au besoin
+        """
+        from apps.etablissements.models import Etablissement
+
+        manquants = {remplacant.etablissement_id for remplacant in remplacants} - set(index)
+        for etablissement in Etablissement.objects.filter(id__in=manquants):
+            index[etablissement.id] = index_disponibilites(etablissement)
+        return [index[remplacant.etablissement_id] for remplacant in remplacants]
+
+    def _scores_disponibilite(self, absence, remplacants, index):
+        """
+        Part des jours de classe de l'absence où chaque candidat est disponible, nulle s'il n'est pas
+        disponible le premier jour. Un jour compte s'il est dans sa période de disponibilité, sur un
+        jour de semaine de ses heures disponibles et sans mission acceptée ce jour-là (index de son
+        établissement, aligné sur les remplaçants).
+        Les jours sont comptés par intersection d'intervalles, sans parcourir l'absence jour par jour.
+        """
+        debut, fin = absence.date_debut.toordinal(), absence.date_fin.toordinal()
+        jours_classe = np.zeros(7, dtype=bool)
+        jours_classe[[jour - 1 for jour in absence.get_jours_semaine_absence()]] = True
+        total = (self._jours_par_semaine(np.array([debut]), np.array([fin]))[0] * jours_classe).sum()
+        if not total:
+            return np.zeros(len(remplacants))
+
+        actifs = np.array([remplacant.statut == 'disponible' for remplacant in remplacants])
+        debuts = np.array([remplacant.date_debut_disponibilite.toordinal() for remplacant in remplacants])
+        fins = np.array([
+            remplacant.date_fin_disponibilite.toordinal() if remplacant.date_fin_disponibilite else fin
+            for remplacant in remplacants
+        ])
+        # Jours de semaine travaillés : sans restriction, ou avec des heures disponibles ce jour-là
+        travailles = np.array([
+            [heures_disponibles_jour(remplacant.heures_disponibles, jour) != [] for jour in range(1, 8)]
+            for remplacant in remplacants
+        ]) & jours_classe
+
+        premiers, derniers = np.maximum(debuts, debut), np.minimum(fins, fin)
+        jours = (self._jours_par_semaine(premiers, derniers) * travailles).sum(axis=1)
+
+        # Jours déjà pris par une mission acceptée ou effectuée
+        lignes = {remplacant.id: i for i, remplacant in enumerate(remplacants)}
+        missions = np.array([
+            (lignes[remplacant_id], date.toordinal())
+            for index_etablissement in {id(i): i for i in index}.values()
+            for remplacant_id, date in index_etablissement.missions
+            if remplacant_id in lignes and debut <= date.toordinal() <= fin
+        ], dtype=int).reshape(-1, 2)
+        i, ordinaux = missions[:, 0], missions[:, 1]
+        comptees = (premiers[i] <= ordinaux) & (ordinaux <= derniers[i]) & travailles[i, (ordinaux - 1) % 7]
+        jours = jours - np.bincount(i[comptees], minlength=len(remplacants))
+
+        disponibles_debut = actifs & (debuts <= debut) & (debut <= fins)
+        return np.where(disponibles_debut, jours / total, 0.0)
+
+    @staticmethod
+    def _jours_par_semaine(premiers, derniers):
+        """
+        Nombre de jours de chaque jour de semaine (colonnes, lundi d'abord) dans les intervalles
+        d'ordinaux [premier, dernier], nul pour un intervalle vide
+        """
+        decalages = np.arange(7)
+        # L'ordinal 1 (1er janvier de l'an 1) est un lundi
+        return np.maximum(
+            (derniers[:, None] - 1 - decalages) // 7 - (premiers[:, None] - 2 - decalages) // 7, 0
+        )
+
+    def _remplacants_a_portee(self, absence, remplacants):
+        """
+        Écarte, avant tout chargement ou calcul de score, les remplaçants localisés dont la distance
+        maximale ne couvre pas l'établissement (index géographique de l'académie) ; ceux qui ne sont
+        pas dans l'index (domicile non localisé, ou localisé depuis sa construction) sont conservés.
+        La même règle s'applique en SQL à un queryset et en Python à une liste.
+        Retourne (remplaçants, {remplacant_id: distance en km}).
+        """
+        from django.db.models import QuerySet
+
+        etablissement = absence.etablissement
+        if etablissement.latitude is None or etablissement.longitude is None:
+            return list(remplacants), {}
+
+        index = index_geographique(etablissement.academie)
+        distances = index.a_portee(etablissement.latitude, etablissement.longitude)
+        hors_portee = index.localises - distances.keys()
+        if isinstance(remplacants, QuerySet):
+            return list(remplacants.exclude(id__in=sorted(hors_portee))), distances
+        return [remplacant for remplacant in remplacants if remplacant.id not in hors_portee], distances
+
+    def _scores_geographiques(self, remplacants, distances):
+        """
+        Score géographique : 1 au domicile, 0 à la distance maximale acceptée ; la distance des
+        remplaçants non localisés est estimée (DISTANCE_ESTIMEE)
+        """
+        parcourues = np.array([
+            distances.get(remplacant.id, self.DISTANCE_ESTIMEE) for remplacant in remplacants
+        ], dtype=float)
+        distances_max = np.array([remplacant.distance_max for remplacant in remplacants], dtype=float)
+        rapports = np.divide(parcourues, distances_max, out=np.zeros_like(parcourues), where=distances_max > 0)
+        return np.where(parcourues <= distances_max, 1.0 - rapports, 0.0)
+
+    def _scores_experience(self, remplacants):
+        """Score d'expérience, basé sur l'expérience (10 ans = 1.0) et les évaluations (note sur 5)"""
+        experiences = np.array([remplacant.experience_remplacement for remplacant in remplacants], dtype=float)
+        notes = np.array([remplacant.note_moyenne for remplacant in remplacants], dtype=float)
+        return (np.minimum(experiences / 10, 1.0) + notes / 5.0) / 2.0
+
+    def _contraintes_respectees(self, disponible, matieres_compatibles, distance_acceptable):
         """Retourne les contraintes respectées"""
         contraintes = []
-        
-        # Vérifier les contraintes de disponibilité
-        if remplacant.is_disponible(absence.date_debut):
+        if disponible:
             contraintes.append("Disponible à la date de début")
-        
-        # Vérifier les contraintes de compétence
-        matieres_compatibles = self._get_matieres_compatibles(absence, remplacant)
         if matieres_compatibles:
             contraintes.append(f"Compétent en {len(matieres_compatibles)} matière(s)")
-        
-        # Vérifier les contraintes géographiques
-        if self._calculer_score_geographique(absence, remplacant) > 0:
+        if distance_acceptable:
             contraintes.append("Distance acceptable")
-        
         return contraintes
 
 
@@ -421,89 +2842,78 @@ class AnalyseurConflits:
     """
     Classe pour analyser et résoudre les conflits d'emploi du temps
     """
-    
+
+    CHAMPS_COURS = (
+        'id', 'jour_semaine', 'heure_debut', 'heure_fin', 'enseignant_id', 'salle_id', 'classe_id', 'semaine',
+        'enseignant__first_name', 'enseignant__last_name', 'enseignant__username', 'salle__nom', 'classe__nom',
+    )
+
     def analyser_conflits(self, emploi_temps):
         """
-        Analyse les conflits dans un emploi du temps
+        Analyse les conflits dans un emploi du temps.
+        Les cours sont lus en une seule requête ; chaque conflit référence les identifiants des deux cours.
         """
+        cours = [
+            dict(zip(self.CHAMPS_COURS, valeurs))
+            for valeurs in cours_planifies(emploi_temps.cours).values_list(*self.CHAMPS_COURS)
+        ]
         conflits = []
-        
+
         # Conflits d'enseignants
-        conflits.extend(self._detecter_conflits_enseignants(emploi_temps))
-        
+        conflits.extend(self._detecter_conflits_enseignants(cours))
+
         # Conflits de salles
-        conflits.extend(self._detecter_conflits_salles(emploi_temps))
-        
+        conflits.extend(self._detecter_conflits_salles(cours))
+
         # Conflits de classes
-        conflits.extend(self._detecter_conflits_classes(emploi_temps))
-        
+        conflits.extend(self._detecter_conflits_classes(cours))
+
         return conflits
-    
-    def _detecter_conflits_enseignants(self, emploi_temps):
+
+    def _detecter_conflits_enseignants(self, cours):
         """Détecte les conflits d'enseignants"""
-        conflits = []
-        cours = emploi_temps.cours.all()
-        
-        for i, cours1 in enumerate(cours):
-            for cours2 in cours[i+1:]:
-                if (cours1.enseignant == cours2.enseignant and
-                    cours1.jour_semaine == cours2.jour_semaine and
-                    self._creneaux_se_chevauchent(cours1, cours2)):
-                    
-                    conflits.append({
-                        'type': 'enseignant',
-                        'description': f"L'enseignant {cours1.enseignant.get_full_name()} a deux cours simultanés",
-                        'cours1': cours1,
-                        'cours2': cours2,
-                        'gravite': 'critique'
-                    })
-        
-        return conflits
-    
-    def _detecter_conflits_salles(self, emploi_temps):
+        def description(cours1):
+            nom = f"{cours1['enseignant__first_name']} {cours1['enseignant__last_name']}".strip()
+            return f"L'enseignant {nom or cours1['enseignant__username']} a deux cours simultanés"
+        return self._detecter_conflits(cours, 'enseignant', description)
+
+    def _detecter_conflits_salles(self, cours):
         """Détecte les conflits de salles"""
-        conflits = []
-        cours = emploi_temps.cours.all()
-        
-        for i, cours1 in enumerate(cours):
-            for cours2 in cours[i+1:]:
-                if (cours1.salle == cours2.salle and
-                    cours1.jour_semaine == cours2.jour_semaine and
-                    self._creneaux_se_chevauchent(cours1, cours2)):
-                    
-                    conflits.append({
-                        'type': 'salle',
-                        'description': f"La salle {cours1.salle.nom} est occupée par deux cours simultanés",
-                        'cours1': cours1,
-                        'cours2': cours2,
-                        'gravite': 'critique'
-                    })
-        
-        return conflits
-    
-    def _detecter_conflits_classes(self, emploi_temps):
+        return self._detecter_conflits(
+            cours, 'salle', lambda cours1: f"La salle {cours1['salle__nom']} est occupée par deux cours simultanés"
+        )
+
+    def _detecter_conflits_classes(self, cours):
         """Détecte les conflits de classes"""
+        return self._detecter_conflits(
+            cours, 'classe', lambda cours1: f"La classe {cours1['classe__nom']} a deux cours simultanés"
+        )
+
+    def _detecter_conflits(self, cours, ressource, description):
+        """
+        Conflits sur une ressource : regroupement des cours par (ressource, jour) puis balayage
+        de chaque groupe trié par heure de début ; les cours de semaines A et B ne se gênent pas
+        """
+        groupes = {}
+        for c in cours:
+            ressource_id = c[f'{ressource}_id']
+            if ressource_id is not None:
+                groupes.setdefault((ressource_id, c['jour_semaine']), []).append(
+                    (c['heure_debut'], c['heure_fin'], c['id'])
+                )
+
+        index = {c['id']: c for c in cours}
         conflits = []
-        cours = emploi_temps.cours.all()
-        
-        for i, cours1 in enumerate(cours):
-            for cours2 in cours[i+1:]:
-                if (cours1.classe == cours2.classe and
-                    cours1.jour_semaine == cours2.jour_semaine and
-                    self._creneaux_se_chevauchent(cours1, cours2)):
-                    
-                    conflits.append({
-                        'type': 'classe',
-                        'description': f"La classe {cours1.classe.nom} a deux cours simultanés",
-                        'cours1': cours1,
-                        'cours2': cours2,
-                        'gravite': 'critique'
-                    })
-        
+        for intervalles in groupes.values():
+            for cours1_id, cours2_id in paires_chevauchantes(intervalles):
+                if not semaines_communes(index[cours1_id]['semaine'], index[cours2_id]['semaine']):
+                    continue
+                conflits.append({
+                    'type': ressource,
+                    'description': description(index[cours1_id]),
+                    'cours1': cours1_id,
+                    'cours2': cours2_id,
+                    'gravite': 'critique'
+                })
         return conflits
-    
-    def _creneaux_se_chevauchent(self, cours1, cours2):
-        """Vérifie si deux créneaux se chevauchent"""
-        return (cours1.heure_debut < cours2.heure_fin and
-                cours1.heure_fin > cours2.heure_debut)
 
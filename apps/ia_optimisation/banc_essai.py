@@ -0,0 +1,392 @@
+"""
+Banc d'essai des algorithmes d'optimisation sur des établissements synthétiques
+
+generer_etablissement crée un établissement complet de taille réaliste (école, collège, lycée,
+cité scolaire) : classes, salles, matières et programmes (ClasseMatiere), enseignants, un emploi du
+temps actif placé glouton sur des créneaux libres (des conflits ne subsistent que si la demande
+dépasse l'offre), des remplaçants et une absence.
+
+executer_banc_essai mesure sur ces établissements OptimiseurEmploiTemps, AnalyseurConflits et
+OptimiseurRemplacants (temps, mémoire, objectif). Chaque mesure a lieu dans un processus dédié,
+qui génère ses données dans une transaction annulée à la fin : la mémoire mesurée est celle de
+l'algorithme seul, solveur CP-SAT compris. Les résultats s'ajoutent à un historique JSON et sont
+comparés à une référence enregistrée.
+"""
+import json
+import logging
+import math
+import os
+import random
+import resource
+import time
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+# Matières : code -> (nom, type de salle)
+MATIERES = {
+    'FRA': ('Français', 'classe'),
+    'MAT': ('Mathématiques', 'classe'),
+    'HGE': ('Histoire-géographie', 'classe'),
+    'ANG': ('Anglais', 'classe'),
+    'ESP': ('Espagnol', 'classe'),
+    'SVT': ('Sciences de la vie et de la Terre', 'laboratoire'),
+    'PC': ('Physique-chimie', 'laboratoire'),
+    'TEC': ('Technologie', 'informatique'),
+    'NSI': ('Numérique et sciences informatiques', 'informatique'),
+    'SES': ('Sciences économiques et sociales', 'classe'),
+    'PHI': ('Philosophie', 'classe'),
+    'EPS': ('Éducation physique et sportive', 'sport'),
+    'ART': ('Arts plastiques', 'art'),
+    'MUS': ('Éducation musicale', 'musique'),
+}
+
+# Heures hebdomadaires par matière, par niveau d'enseignement
+PROGRAMMES = {
+    'primaire': {'FRA': 10, 'MAT': 5, 'ANG': 2, 'HGE': 2, 'EPS': 3, 'ART': 2},
+    'college': {
+        'FRA': 4, 'MAT': 4, 'HGE': 3, 'ANG': 3, 'ESP': 2, 'SVT': 2, 'PC': 2, 'TEC': 2, 'EPS': 3, 'ART': 1, 'MUS': 1,
+    },
+    'lycee': {
+        'FRA': 4, 'MAT': 4, 'HGE': 3, 'ANG': 3, 'ESP': 2, 'PC': 3, 'SVT': 2, 'SES': 2, 'NSI': 2, 'PHI': 2, 'EPS': 2,
+    },
+}
+
+NIVEAUX_COLLEGE = [('6e', 6, 'college'), ('5e', 6, 'college'), ('4e', 6, 'college'), ('3e', 6, 'college')]
+NIVEAUX_LYCEE = [('2nde', 8, 'lycee'), ('1re', 8, 'lycee'), ('Tle', 8, 'lycee')]
+
+# Profils d'établissements : niveaux (niveau, nombre de classes, programme), effectif par classe,
+# fin de journée ; à l'école, un enseignant polyvalent assure tous les cours de sa classe
+PROFILS_ETABLISSEMENT = {
+    'ecole': {
+        'type_etablissement': 'elementaire',
+        'niveaux': [('CP', 2, 'primaire'), ('CE1', 2, 'primaire'), ('CE2', 2, 'primaire'),
+                    ('CM1', 2, 'primaire'), ('CM2', 2, 'primaire')],
+        'effectif': 24,
+        'fin_journee': '16:30',
+        'polyvalent': True,
+    },
+    'college': {
+        'type_etablissement': 'college',
+        'niveaux': NIVEAUX_COLLEGE,
+        'effectif': 28,
+        'fin_journee': '17:00',
+    },
+    'lycee': {
+        'type_etablissement': 'lycee_general',
+        'niveaux': NIVEAUX_LYCEE,
+        'effectif': 32,
+        'fin_journee': '18:00',
+    },
+    'cite_scolaire': {
+        'type_etablissement': 'lycee_general',
+        'niveaux': NIVEAUX_COLLEGE + NIVEAUX_LYCEE,
+        'effectif': 30,
+        'fin_journee': '18:00',
+    },
+}
+
+# Service hebdomadaire d'un enseignant de collège ou de lycée (en heures)
+SERVICE_ENSEIGNANT = 18
+
+# Taux d'occupation visé pour dimensionner les salles spécialisées
+TAUX_OCCUPATION_SALLES = 0.75
+
+# Domiciles des remplaçants (l'établissement est à Paris), attribués à tour de rôle
+CODES_POSTAUX_REMPLACANTS = ['75011', '92100', '93200', '94000', '78000', '77000', '60000', '45000', '51100']
+
+
+def generer_etablissement(profil, graine=0, echelle=1.0):
+    """
+    Crée un établissement synthétique du profil donné (voir PROFILS_ETABLISSEMENT).
+    `echelle` multiplie le nombre de classes. Retourne {'etablissement', 'emploi_temps', 'absence'}.
+    """
+    from apps.accounts.models import User, ProfilEnseignant
+    from apps.etablissements.models import Academie, Etablissement, Classe, ClasseMatiere, Matiere, Salle
+    from apps.emplois_temps.models import Periode, EmploiTemps, Cours
+    from apps.remplacements.models import Absence, Remplacant
+
+    parametres = PROFILS_ETABLISSEMENT[profil]
+    aleatoire = random.Random(graine)
+    numero = 9000000 + list(PROFILS_ETABLISSEMENT).index(profil) * 100000 + graine % 100000
+    uai = f"{numero:07d}B"
+
+    academie, _ = Academie.objects.get_or_create(code='BANC', defaults={
+        'nom': "Académie du banc d'essai", 'region': '-', 'ville_chef_lieu': '-', 'adresse': '-',
+        'telephone': '-', 'email': 'banc-essai@example.org', 'recteur': '-',
+    })
+    etablissement = Etablissement.objects.create(
+        nom=f"{profil} {graine}", type_etablissement=parametres['type_etablissement'], statut='public',
+        uai=uai, academie=academie, adresse='-', code_postal='75000', ville='-', departement='75',
+        region='-', telephone='-', email=f'{uai.lower()}@example.org',
+        heures_debut_journee='08:00', heures_fin_journee=parametres['fin_journee'], jours_ouverture=[1, 2, 3, 4, 5],
+    )
+    etablissement.refresh_from_db()
+    directeur = User.objects.create(username=f'banc_{uai}_direction', role='directeur')
+
+    matieres = {}
+    for programme in {niveau[2] for niveau in parametres['niveaux']}:
+        for code in PROGRAMMES[programme]:
+            matieres[programme, code], _ = Matiere.objects.get_or_create(
+                code=f"B{code}_{programme[:3].upper()}",
+                defaults={'nom': MATIERES[code][0], 'niveau_enseignement': programme},
+            )
+
+    # Classes et salles de classe
+    classes = []
+    salles = {'classe': []}
+    for niveau, nombre, programme in parametres['niveaux']:
+        for i in range(max(round(nombre * echelle), 1)):
+            salle = Salle.objects.create(
+                nom=f"Salle {len(salles['classe']) + 1}", type_salle='classe', etablissement=etablissement,
+                capacite=parametres['effectif'] + 2,
+            )
+            salles['classe'].append(salle)
+            classes.append((Classe.objects.create(
+                nom=f"{niveau} {chr(ord('A') + i % 26)}{i // 26 or ''}", niveau=niveau, etablissement=etablissement,
+                nombre_eleves=parametres['effectif'] - aleatoire.randint(0, 4), salle_principale=salle,
+            ), programme))
+
+    # Grille : créneaux de la semaine
+    debut = datetime.combine(date.min, etablissement.heures_debut_journee)
+    fin = datetime.combine(date.min, etablissement.heures_fin_journee)
+    duree = etablissement.duree_creneau
+    heures = []
+    while debut + timedelta(minutes=duree) <= fin:
+        heures.append(debut.time())
+        debut += timedelta(minutes=duree)
+    creneaux = [(jour, heure) for jour in etablissement.jours_ouverture for heure in heures]
+
+    # Salles spécialisées dimensionnées par la demande
+    demande = {}
+    for _, programme in classes:
+        for code, volume in PROGRAMMES[programme].items():
+            type_salle = MATIERES[code][1]
+            demande[type_salle] = demande.get(type_salle, 0) + volume
+    for type_salle, volume in demande.items():
+        if type_salle == 'classe':
+            continue
+        salles[type_salle] = [
+            Salle.objects.create(
+                nom=f"{type_salle.capitalize()} {i + 1}", type_salle=type_salle, etablissement=etablissement,
+                capacite=parametres['effectif'] + 4,
+            )
+            for i in range(math.ceil(volume / (len(creneaux) * TAUX_OCCUPATION_SALLES)))
+        ]
+
+    # Enseignants : un par classe à l'école, sinon par matière selon le service
+    enseignants = []
+
+    def nouvel_enseignant(specialite, niveau, service):
+        numero_enseignant = len(enseignants) + 1
+        user = User.objects.create(
+            username=f'banc_{uai}_{numero_enseignant}', first_name='Enseignant', last_name=str(numero_enseignant),
+        )
+        ProfilEnseignant.objects.create(
+            user=user, numero_enseignant=f'B{uai}{numero_enseignant}', specialite=specialite,
+            niveau_enseignement=niveau, heures_max_semaine=service + 2, heures_max_jour=6,
+            experience_annees=aleatoire.randint(0, 30),
+        )
+        enseignants.append(user)
+        return user
+
+    attributions = []
+    if parametres.get('polyvalent'):
+        for classe, programme in classes:
+            enseignant = nouvel_enseignant('Polyvalent', programme, sum(PROGRAMMES[programme].values()))
+            attributions.extend(
+                (classe, matieres[programme, code], enseignant, heures_matiere, MATIERES[code][1])
+                for code, heures_matiere in PROGRAMMES[programme].items()
+            )
+    else:
+        services = {}
+        for classe, programme in classes:
+            for code, heures_matiere in PROGRAMMES[programme].items():
+                enseignant, charge = services.get((programme, code), (None, SERVICE_ENSEIGNANT))
+                if charge + heures_matiere > SERVICE_ENSEIGNANT:
+                    enseignant, charge = nouvel_enseignant(MATIERES[code][0], programme, SERVICE_ENSEIGNANT), 0
+                services[programme, code] = (enseignant, charge + heures_matiere)
+                attributions.append((classe, matieres[programme, code], enseignant, heures_matiere, MATIERES[code][1]))
+
+    ClasseMatiere.objects.bulk_create([
+        ClasseMatiere(classe=classe, matiere=matiere, heures_semaine=heures_matiere, enseignant_principal=enseignant)
+        for classe, matiere, enseignant, heures_matiere, _ in attributions
+    ])
+
+    # Emploi du temps : chaque heure au premier créneau libre pour la classe, l'enseignant et une
+    # salle du bon type ; à défaut, au premier créneau libre pour la classe (conflit)
+    periode = Periode.objects.create(
+        nom='Année', etablissement=etablissement, date_debut=date(date.today().year, 9, 1),
+        date_fin=date(date.today().year + 1, 7, 5), numero_periode=1,
+    )
+    emploi_temps = EmploiTemps.objects.create(
+        nom=f"Emploi du temps {etablissement.nom}", etablissement=etablissement, periode=periode,
+        createur=directeur, statut='actif',
+    )
+    occupes = set()
+    # Heures par (enseignant, jour), plafonnées par heures_max_jour
+    charges = {}
+    cours = []
+    aleatoire.shuffle(attributions)
+    for classe, matiere, enseignant, heures_matiere, type_salle in attributions:
+        candidates = [classe.salle_principale] if type_salle == 'classe' else salles[type_salle]
+        for _ in range(heures_matiere):
+            libres = [c for c in creneaux if ('classe', classe.id) + c not in occupes]
+            if not libres:
+                break
+            aleatoire.shuffle(libres)
+            placement = None
+            for creneau in libres:
+                if (('enseignant', enseignant.id) + creneau in occupes or
+                        charges.get((enseignant.id, creneau[0]), 0) >= enseignant.profil_enseignant.heures_max_jour):
+                    continue
+                salle = next((s for s in candidates if ('salle', s.id) + creneau not in occupes), None)
+                if salle is not None:
+                    placement = (creneau, salle)
+                    break
+            if placement is None:
+                placement = (libres[0], candidates[0])
+            (jour, heure), salle = placement
+            charges[enseignant.id, jour] = charges.get((enseignant.id, jour), 0) + 1
+            occupes.update([('classe', classe.id, jour, heure), ('enseignant', enseignant.id, jour, heure),
+                            ('salle', salle.id, jour, heure)])
+            cours.append(Cours(
+                emploi_temps=emploi_temps, classe=classe, matiere=matiere, enseignant=enseignant, salle=salle,
+                jour_semaine=jour, heure_debut=heure,
+                heure_fin=(datetime.combine(date.min, heure) + timedelta(minutes=duree)).time(), duree=duree,
+            ))
+    Cours.objects.bulk_create(cours, batch_size=500)
+
+    # Remplaçants et une absence d'une semaine
+    debut_absence = periode.date_debut + timedelta(days=(7 - periode.date_debut.weekday()) % 7 + 14)
+    for i in range(max(len(enseignants) // 4, 5)):
+        user = User.objects.create(
+            username=f'banc_{uai}_r{i + 1}', first_name='Remplaçant', last_name=str(i + 1),
+            code_postal=CODES_POSTAUX_REMPLACANTS[i % len(CODES_POSTAUX_REMPLACANTS)],
+        )
+        remplacant = Remplacant.objects.create(
+            enseignant=user, etablissement=etablissement, date_debut_disponibilite=periode.date_debut,
+            experience_remplacement=aleatoire.randint(0, 40), note_moyenne=round(aleatoire.uniform(2, 5), 1),
+            heures_disponibles={
+                str(jour): [h.hour for h in heures if aleatoire.random() < 0.7]
+                for jour in etablissement.jours_ouverture
+            },
+        )
+        remplacant.matieres_enseignees.set(aleatoire.sample(list(matieres.values()), k=min(3, len(matieres))))
+    absence = Absence.objects.create(
+        enseignant=aleatoire.choice(enseignants), etablissement=etablissement, type_absence='maladie',
+        statut='validee', date_debut=debut_absence, date_fin=debut_absence + timedelta(days=4),
+        motif="Banc d'essai", declaree_par=directeur,
+    )
+
+    logger.info(
+        f"Établissement synthétique {etablissement.nom}: {len(classes)} classes, {len(enseignants)} enseignants, "
+        f"{sum(len(s) for s in salles.values())} salles, {len(cours)} cours"
+    )
+    return {'etablissement': etablissement, 'emploi_temps': emploi_temps, 'absence': absence}
+
+
+ALGORITHMES = ('conflits', 'emploi_temps', 'remplacants')
+
+
+def _mesurer_algorithme(profil, algorithme, options):
+    """
+    Génère l'établissement du profil et mesure un algorithme (exécuté dans un processus dédié).
+    La mémoire est la croissance du pic de mémoire résidente du processus pendant l'algorithme (en Ko).
+    """
+    from django.db import transaction
+    from .algorithms import AnalyseurConflits, OptimiseurEmploiTemps, OptimiseurRemplacants
+
+    with transaction.atomic():
+        donnees = generer_etablissement(profil, options['graine'], options['echelle'])
+        emploi_temps = donnees['emploi_temps']
+        absence = donnees['absence']
+
+        if algorithme == 'conflits':
+            def executer():
+                return len(AnalyseurConflits().analyser_conflits(emploi_temps))
+            sens = None
+        elif algorithme == 'emploi_temps':
+            optimiseur = OptimiseurEmploiTemps(
+                emploi_temps.etablissement, nb_workers=options['nb_workers'], temps_max=options['temps_max']
+            )
+
+            def executer():
+                solution = optimiseur.optimiser(emploi_temps)
+                return solution['score'] if solution else None
+            sens = 'min'
+        else:
+            remplacants = list(absence.etablissement.remplacants.filter(statut='disponible'))
+
+            def executer():
+                propositions = OptimiseurRemplacants().trouver_meilleurs_remplacants(absence, remplacants)
+                return propositions[0]['score_global'] if propositions else None
+            sens = 'max'
+
+        memoire_avant = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        debut = time.perf_counter()
+        objectif = executer()
+        temps = time.perf_counter() - debut
+        memoire = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoire_avant
+        transaction.set_rollback(True)
+
+    return {'temps': temps, 'memoire_ko': memoire, 'objectif': objectif, 'sens': sens}
+
+
+def executer_banc_essai(profils=None, graine=0, echelle=1.0, temps_max=10.0, nb_workers=None):
+    """
+    Mesure chaque algorithme sur un établissement synthétique par profil, une mesure par processus.
+    Retourne {"profil/algorithme": {'temps', 'memoire_ko', 'objectif', 'sens'}}, où `sens` indique si
+    l'objectif est à minimiser ('min'), à maximiser ('max') ou simplement relevé (None).
+    """
+    from django.db import connections
+    from .algorithms import _pool_execution
+
+    options = {'graine': graine, 'echelle': echelle, 'temps_max': temps_max, 'nb_workers': nb_workers}
+    resultats = {}
+    for profil in profils or PROFILS_ETABLISSEMENT:
+        for algorithme in ALGORITHMES:
+            # Le processus de mesure ouvre sa propre connexion à la base
+            connections.close_all()
+            with _pool_execution(1) as pool:
+                resultats[f"{profil}/{algorithme}"] = pool.submit(
+                    _mesurer_algorithme, profil, algorithme, options
+                ).result()
+    return resultats
+
+
+def comparer_reference(resultats, reference, tolerance=0.2):
+    """
+    Régressions par rapport à une référence : temps ou mémoire supérieurs de plus de `tolerance`
+    (fraction), ou objectif dégradé de plus de `tolerance`. Retourne une liste de messages.
+    """
+    regressions = []
+    for cle, mesure in resultats.items():
+        base = reference.get(cle)
+        if base is None:
+            continue
+        for grandeur in ('temps', 'memoire_ko'):
+            if base[grandeur] and mesure[grandeur] > base[grandeur] * (1 + tolerance):
+                regressions.append(f"{cle}: {grandeur} {mesure[grandeur]:.3f} contre {base[grandeur]:.3f}")
+        objectif, objectif_base = mesure['objectif'], base['objectif']
+        if mesure['sens'] is None or objectif_base is None:
+            continue
+        marge = abs(objectif_base) * tolerance
+        if objectif is None or (
+            objectif > objectif_base + marge if mesure['sens'] == 'min' else objectif < objectif_base - marge
+        ):
+            regressions.append(f"{cle}: objectif {objectif} contre {objectif_base}")
+    return regressions
+
+
+def ajouter_historique(chemin, resultats, parametres):
+    """Ajoute une exécution du banc d'essai à l'historique JSON (liste d'exécutions)"""
+    historique = []
+    if os.path.exists(chemin):
+        with open(chemin, encoding='utf-8') as fichier:
+            historique = json.load(fichier)
+    historique.append({'date': datetime.now().isoformat(), 'parametres': parametres, 'resultats': resultats})
+    os.makedirs(os.path.dirname(chemin) or '.', exist_ok=True)
+    with open(chemin, 'w', encoding='utf-8') as fichier:
+        json.dump(historique, fichier, ensure_ascii=False, indent=1)
@@ -0,0 +1,240 @@
+"""
+Analyse de faisabilité d'un emploi du temps avant résolution
+
+Bilans de capacité en quelques requêtes, exprimés en créneaux de la grille de l'optimiseur :
+
+- bloquant : le modèle est certainement infaisable (cours confirmés incompatibles entre eux,
+  avec les disponibilités ou avec les plafonds horaires des enseignants) ; la résolution est inutile.
+- avertissement : la demande dépasse l'offre (programme des classes, service des enseignants,
+  salles d'un type) ; une partie des cours restera non planifiée.
+
+En cas d'alternance, les demandes sont comptées pour la plus chargée des semaines A et B.
+"""
+import logging
+
+from apps.emplois_temps.conflits import cours_planifies, paires_chevauchantes, semaines_communes, semaines_cours
+from apps.emplois_temps.disponibilites import semaine_indisponible
+
+logger = logging.getLogger(__name__)
+
+
+# Nombre maximal de problèmes détaillés par type (les suivants sont comptés)
+MAX_PROBLEMES_PAR_TYPE = 20
+
+
+class BilanFaisabilite:
+    """Problèmes relevés par analyser_faisabilite"""
+
+    def __init__(self):
+        self.problemes = []
+        self._par_type = {}
+
+    def ajouter(self, gravite, type_probleme, message, **details):
+        nombre = self._par_type[type_probleme] = self._par_type.get(type_probleme, 0) + 1
+        if nombre <= MAX_PROBLEMES_PAR_TYPE:
+            self.problemes.append({'gravite': gravite, 'type': type_probleme, 'message': message, **details})
+
+    @property
+    def bloquant(self):
+        return any(probleme['gravite'] == 'bloquant' for probleme in self.problemes)
+
+    def en_dict(self):
+        return {'problemes': self.problemes, 'nombre_par_type': self._par_type}
+
+
+def analyser_faisabilite(optimiseur, emploi_temps, perimetre=None):
+    """
+    Analyse rapide de la demande d'un emploi du temps face aux capacités de l'établissement
+    (grille horaire, disponibilités, plafonds horaires, salles par type). Retourne un BilanFaisabilite.
+    """
+    from django.db.models import Sum
+    from apps.accounts.models import ProfilEnseignant
+    from apps.etablissements.models import Classe, ClasseMatiere, Salle
+
+    grille = optimiseur.grille
+    bilan = BilanFaisabilite()
+
+    cours = cours_planifies(emploi_temps.cours)
+    if perimetre is not None:
+        cours = cours.filter(id__in=perimetre)
+    cours = list(cours.values_list(
+        'id', 'classe_id', 'enseignant_id', 'salle_id', 'duree', 'statut', 'jour_semaine', 'heure_debut', 'semaine'
+    ))
+    if not cours:
+        return bilan
+
+    classes = {
+        classe_id: (nom, nombre_eleves)
+        for classe_id, nom, nombre_eleves in Classe.objects.filter(
+            id__in={c[1] for c in cours}
+        ).values_list('id', 'nom', 'nombre_eleves')
+    }
+    profils = {
+        user_id: (f"{prenom} {nom}".strip(), heures_max_semaine, heures_max_jour, disponibilites)
+        for user_id, prenom, nom, heures_max_semaine, heures_max_jour, disponibilites in ProfilEnseignant.objects.filter(
+            user_id__in={c[2] for c in cours}
+        ).values_list(
+            'user_id', 'user__first_name', 'user__last_name', 'heures_max_semaine', 'heures_max_jour', 'disponibilites'
+        )
+    }
+    salles = {
+        salle_id: (nom, type_salle, capacite, disponibilites)
+        for salle_id, nom, type_salle, capacite, disponibilites in Salle.objects.filter(
+            etablissement=optimiseur.etablissement, actif=True
+        ).values_list('id', 'nom', 'type_salle', 'capacite', 'disponibilites')
+    }
+
+    # Créneaux indisponibles de la grille par ressource
+    def creneaux_bloques(disponibilites):
+        if not disponibilites:
+            return set()
+        return {
+            t for debut, taille in grille.plages_bloquees(semaine_indisponible(disponibilites))
+            for t in range(debut, debut + taille)
+        }
+
+    bloques = {('enseignant', user_id): creneaux_bloques(profil[3]) for user_id, profil in profils.items()}
+    bloques.update({('salle', salle_id): creneaux_bloques(salle[3]) for salle_id, salle in salles.items()})
+
+    def nom_ressource(ressource, ressource_id):
+        if ressource == 'classe':
+            return classes.get(ressource_id, (f"#{ressource_id}",))[0]
+        if ressource == 'enseignant':
+            return profils.get(ressource_id, (f"#{ressource_id}",))[0]
+        return salles.get(ressource_id, (f"#{ressource_id}",))[0]
+
+    _verifier_cours_confirmes(bilan, grille, cours, profils, bloques, nom_ressource)
+
+    # Programme des classes : une heure de ClasseMatiere occupe un créneau
+    for classe_id, heures in ClasseMatiere.objects.filter(classe_id__in=classes).values(
+        'classe_id'
+    ).annotate(heures=Sum('heures_semaine')).values_list('classe_id', 'heures'):
+        if heures and heures > grille.horizon:
+            bilan.ajouter(
+                'avertissement', 'programme_classe',
+                f"Le programme de {nom_ressource('classe', classe_id)} ({heures} h) dépasse "
+                f"les {grille.horizon} créneaux de la semaine",
+                ressource=['classe', classe_id], demande=heures, capacite=grille.horizon,
+            )
+
+    # Service des enseignants : créneaux demandés, disponibilités et plafond hebdomadaire
+    demande_semaines = {}
+    for _, _, enseignant_id, _, duree, _, _, _, semaine_cours in cours:
+        for semaine in semaines_cours(semaine_cours):
+            creneaux, minutes = demande_semaines.get((enseignant_id, semaine), (0, 0))
+            demande_semaines[(enseignant_id, semaine)] = (creneaux + grille.nombre_creneaux(duree), minutes + duree)
+    demande_enseignants = {}
+    for (enseignant_id, _), demande in demande_semaines.items():
+        demande_enseignants[enseignant_id] = max(demande, demande_enseignants.get(enseignant_id, (0, 0)))
+    for enseignant_id, (creneaux, minutes) in demande_enseignants.items():
+        offre = grille.horizon - len(bloques.get(('enseignant', enseignant_id), ()))
+        if creneaux > offre:
+            bilan.ajouter(
+                'avertissement', 'disponibilites_enseignant',
+                f"{nom_ressource('enseignant', enseignant_id)} a {creneaux} créneaux de cours "
+                f"pour {offre} créneaux disponibles",
+                ressource=['enseignant', enseignant_id], demande=creneaux, capacite=offre,
+            )
+        profil = profils.get(enseignant_id)
+        if profil and minutes > profil[1] * 60:
+            bilan.ajouter(
+                'avertissement', 'service_enseignant',
+                f"{nom_ressource('enseignant', enseignant_id)} a {minutes / 60:.1f} h de cours "
+                f"pour un maximum de {profil[1]} h par semaine",
+                ressource=['enseignant', enseignant_id], demande=minutes, capacite=profil[1] * 60,
+            )
+
+    # Salles par type : créneaux demandés face aux créneaux disponibles des salles de ce type
+    demande_types = {}
+    trop_petites = set()
+    for _, classe_id, _, salle_id, duree, _, _, _, semaine_cours in cours:
+        if salle_id not in salles:
+            continue
+        nom, type_salle, capacite, _ = salles[salle_id]
+        for semaine in semaines_cours(semaine_cours):
+            demande_types[(type_salle, semaine)] = demande_types.get((type_salle, semaine), 0) + grille.nombre_creneaux(duree)
+        effectif = classes.get(classe_id, (None, 0))[1]
+        if effectif > capacite and (salle_id, classe_id) not in trop_petites:
+            trop_petites.add((salle_id, classe_id))
+            bilan.ajouter(
+                'avertissement', 'capacite_salle',
+                f"{nom} ({capacite} places) accueille {nom_ressource('classe', classe_id)} ({effectif} élèves)",
+                ressource=['salle', salle_id], demande=effectif, capacite=capacite,
+            )
+    for type_salle in {type_salle for type_salle, _ in demande_types}:
+        demande = max(demande for (autre, _), demande in demande_types.items() if autre == type_salle)
+        offre = sum(
+            grille.horizon - len(bloques[('salle', salle_id)])
+            for salle_id, salle in salles.items() if salle[1] == type_salle
+        )
+        if demande > offre:
+            bilan.ajouter(
+                'avertissement', 'salles_type',
+                f"Les salles de type {type_salle} offrent {offre} créneaux pour {demande} créneaux de cours",
+                ressource=['type_salle', type_salle], demande=demande, capacite=offre,
+            )
+
+    return bilan
+
+
+def _verifier_cours_confirmes(bilan, grille, cours, profils, bloques, nom_ressource):
+    """Incompatibilités certaines entre cours confirmés, figés à leur créneau par l'optimiseur"""
+    confirmes = []
+    for cours_id, classe_id, enseignant_id, salle_id, duree, statut, jour_semaine, heure_debut, semaine in cours:
+        t = grille.indice(jour_semaine, heure_debut) if statut == 'confirme' else None
+        if t is None:
+            continue
+        nb_creneaux = grille.nombre_creneaux(duree)
+        if t % grille.creneaux_par_jour + nb_creneaux > grille.creneaux_par_jour:
+            bilan.ajouter(
+                'bloquant', 'confirme_hors_grille',
+                f"Le cours confirmé {cours_id} déborde de la fin de journée de l'établissement",
+                ressource=['classe', classe_id], cours=[cours_id],
+            )
+            continue
+        confirmes.append((cours_id, classe_id, enseignant_id, salle_id, duree, t, nb_creneaux, semaine))
+    semaines = {c[0]: c[7] for c in confirmes}
+
+    for indice, ressource in ((1, 'classe'), (2, 'enseignant'), (3, 'salle')):
+        groupes = {}
+        for c in confirmes:
+            groupes.setdefault(c[indice], []).append((c[5], c[5] + c[6], c[0]))
+            indisponibles = bloques.get((ressource, c[indice]), ())
+            if any(t in indisponibles for t in range(c[5], c[5] + c[6])):
+                bilan.ajouter(
+                    'bloquant', 'confirme_indisponible',
+                    f"Le cours confirmé {c[0]} est placé hors des disponibilités de "
+                    f"{nom_ressource(ressource, c[indice])}",
+                    ressource=[ressource, c[indice]], cours=[c[0]],
+                )
+        for ressource_id, intervalles in groupes.items():
+            for cours1_id, cours2_id in paires_chevauchantes(intervalles):
+                if not semaines_communes(semaines[cours1_id], semaines[cours2_id]):
+                    continue
+                bilan.ajouter(
+                    'bloquant', 'confirmes_simultanes',
+                    f"Les cours confirmés {cours1_id} et {cours2_id} occupent "
+                    f"{nom_ressource(ressource, ressource_id)} en même temps",
+                    ressource=[ressource, ressource_id], cours=[cours1_id, cours2_id],
+                )
+
+    # Plafonds horaires des enseignants atteints par les seuls cours confirmés, semaine par semaine
+    charges = {}
+    for _, _, enseignant_id, _, duree, t, _, semaine_cours in confirmes:
+        for semaine in semaines_cours(semaine_cours):
+            jours = charges.setdefault((enseignant_id, semaine), {})
+            jour = t // grille.creneaux_par_jour
+            jours[jour] = jours.get(jour, 0) + duree
+    signales = set()
+    for (enseignant_id, _), jours in charges.items():
+        if enseignant_id not in profils or enseignant_id in signales:
+            continue
+        _, max_semaine, max_jour, _ = profils[enseignant_id]
+        if sum(jours.values()) > max_semaine * 60 or max(jours.values()) > max_jour * 60:
+            signales.add(enseignant_id)
+            bilan.ajouter(
+                'bloquant', 'confirmes_plafond',
+                f"Les cours confirmés de {nom_ressource('enseignant', enseignant_id)} dépassent "
+                f"ses plafonds ({max_semaine} h par semaine, {max_jour} h par jour)",
+                ressource=['enseignant', enseignant_id],
+            )
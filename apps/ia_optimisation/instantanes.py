@@ -0,0 +1,255 @@
+"""
+Instantanés de modèles d'optimisation, pour rejouer une résolution hors production
+
+Un instantané est un dossier contenant :
+
+- modele.pb : le modèle CP-SAT construit (CpModelProto sérialisé), objectif de placement compris ;
+- modele_qualite.pb : le même modèle complété des critères de qualité, avec l'objectif complet,
+  résolu en seconde phase (voir OptimiseurEmploiTemps._resoudre) ; absent si aucun critère n'a de poids ;
+- donnees.json : les entrées ayant servi à le construire (grille, cours, enseignants, salles,
+  contraintes, poids et paramètres du solveur) et les indices des variables de chaque cours.
+
+La résolution d'un instantané (resoudre_instantane) n'utilise pas la base de données : un corpus
+d'instantanés anonymisés peut servir de banc d'essai pour comparer des paramètres du solveur.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+
+from google.protobuf import text_format
+from ortools.sat.python import cp_model
+
+logger = logging.getLogger(__name__)
+
+
+FORMAT_INSTANTANE = 1
+FICHIER_MODELE = 'modele.pb'
+FICHIER_MODELE_QUALITE = 'modele_qualite.pb'
+FICHIER_DONNEES = 'donnees.json'
+
+
+class Anonymiseur:
+    """Renumérote les identifiants par type d'objet (1, 2, ...) dans l'ordre de première apparition"""
+
+    def __init__(self, actif):
+        self.actif = actif
+        self._ids = {}
+
+    def __call__(self, type_objet, objet_id):
+        if not self.actif or objet_id is None:
+            return objet_id
+        ids = self._ids.setdefault(type_objet, {})
+        return ids.setdefault(objet_id, len(ids) + 1)
+
+    def regle(self, regle):
+        """Règle JSON dont les filtres désignent les objets renumérotés"""
+        if not self.actif or not isinstance(regle, dict) or not isinstance(regle.get('filtre'), dict):
+            return regle
+        filtre = {
+            cle: [self(cle, objet_id) for objet_id in ids] if isinstance(ids, list) else ids
+            for cle, ids in regle['filtre'].items()
+        }
+        return {**regle, 'filtre': filtre}
+
+
+def exporter_instantane(optimiseur, emploi_temps, chemin, anonymiser=False):
+    """
+    Écrit l'instantané du modèle construit d'un optimiseur (voir _construire_modele) dans le dossier
+    `chemin`. Avec `anonymiser`, les identifiants sont renumérotés et les noms des variables du modèle
+    effacés. Retourne le chemin du dossier.
+    """
+    from apps.emplois_temps.models import Contrainte
+
+    anonyme = Anonymiseur(anonymiser)
+    grille = optimiseur.grille
+    parametres = optimiseur.solver.parameters
+
+    # Les filtres des règles utilisent les clés 'enseignants', 'classes', 'salles' et 'matieres'
+    cours = []
+    enseignants = {}
+    salles = {}
+    for cours_id, c in sorted(optimiseur.cours.items()):
+        variables = optimiseur.variables[cours_id]
+        cours.append({
+            'id': anonyme('cours', cours_id),
+            'classe': anonyme('classes', c.classe_id),
+            'matiere': anonyme('matieres', c.matiere_id),
+            'enseignant': anonyme('enseignants', c.enseignant_id),
+            'salle': anonyme('salles', c.salle_id),
+            'duree': c.duree,
+            'statut': c.statut,
+            'semaine': c.semaine,
+            'jour_semaine': c.jour_semaine,
+            'heure_debut': c.heure_debut.strftime('%H:%M'),
+            'variables': {'debut': variables['debut'].Index(), 'present': variables['present'].Index()},
+        })
+        profil = getattr(c.enseignant, 'profil_enseignant', None)
+        if profil is not None:
+            enseignants[c.enseignant_id] = {
+                'id': anonyme('enseignants', c.enseignant_id),
+                'heures_max_semaine': profil.heures_max_semaine,
+                'heures_max_jour': profil.heures_max_jour,
+                'disponibilites': profil.disponibilites,
+            }
+        salles[c.salle_id] = {
+            'id': anonyme('salles', c.salle_id),
+            'type_salle': c.salle.type_salle,
+            'capacite': c.salle.capacite,
+            'disponibilites': c.salle.disponibilites,
+        }
+
+    contraintes = [
+        {'id': anonyme('contraintes', contrainte_id), 'priorite': priorite, 'regle': anonyme.regle(regle)}
+        for contrainte_id, priorite, regle in Contrainte.objects.filter(
+            etablissement=optimiseur.etablissement, actif=True
+        ).order_by('id').values_list('id', 'priorite', 'regle')
+    ]
+
+    donnees = {
+        'format': FORMAT_INSTANTANE,
+        'cree_le': datetime.now().isoformat(),
+        'emploi_temps': None if anonymiser else emploi_temps.id,
+        'grille': {
+            'jours': grille.jours,
+            'debut': grille.debut,
+            'duree_creneau': grille.duree_creneau,
+            'creneaux_par_jour': grille.creneaux_par_jour,
+        },
+        'parametres': {
+            'num_search_workers': parametres.num_search_workers,
+            'max_time_in_seconds': parametres.max_time_in_seconds,
+            'relative_gap_limit': parametres.relative_gap_limit,
+            'random_seed': parametres.random_seed,
+        },
+        'part_premiere_phase': optimiseur.PART_PREMIERE_PHASE,
+        'poids': optimiseur.poids,
+        'poids_perturbation': optimiseur.poids_perturbation,
+        'cours': cours,
+        'enseignants': list(enseignants.values()),
+        'salles': list(salles.values()),
+        'contraintes': contraintes,
+    }
+
+    os.makedirs(chemin, exist_ok=True)
+    _ecrire_modele(optimiseur.model, os.path.join(chemin, FICHIER_MODELE), anonymiser)
+    with open(os.path.join(chemin, FICHIER_DONNEES), 'w', encoding='utf-8') as fichier:
+        json.dump(donnees, fichier, ensure_ascii=False, indent=1)
+
+    logger.info(f"Instantané du modèle de {emploi_temps.nom} exporté dans {chemin} ({len(cours)} cours)")
+    return chemin
+
+
+def exporter_modele_qualite(optimiseur, chemin, anonymiser=False):
+    """
+    Ajoute à l'instantané `chemin` le modèle de seconde phase de l'optimiseur : le modèle construit
+    complété des critères de qualité (voir _ajouter_criteres_qualite), avant la borne de placement
+    et l'indication tirées de la première phase, que resoudre_instantane recalcule.
+    """
+    _ecrire_modele(optimiseur.model, os.path.join(chemin, FICHIER_MODELE_QUALITE), anonymiser)
+
+
+def _ecrire_modele(source, fichier_modele, anonymiser):
+    modele = cp_model.CpModel()
+    modele.Proto().CopyFrom(source.Proto())
+    if anonymiser:
+        modele.Proto().name = ''
+        for variable in modele.Proto().variables:
+            variable.name = ''
+        for contrainte in modele.Proto().constraints:
+            contrainte.name = ''
+    with open(fichier_modele, 'wb') as fichier:
+        fichier.write(modele.Proto().SerializeToString())
+
+
+def _lire_modele(fichier_modele):
+    modele = cp_model.CpModel()
+    with open(fichier_modele, 'rb') as fichier:
+        modele.Proto().ParseFromString(fichier.read())
+    return modele
+
+
+def charger_instantane(chemin):
+    """Retourne (CpModel, données) d'un instantané"""
+    modele = _lire_modele(os.path.join(chemin, FICHIER_MODELE))
+    with open(os.path.join(chemin, FICHIER_DONNEES), encoding='utf-8') as fichier:
+        donnees = json.load(fichier)
+    if donnees.get('format') != FORMAT_INSTANTANE:
+        raise ValueError(f"Format d'instantané non pris en charge: {donnees.get('format')}")
+    return modele, donnees
+
+
+def charger_modele_qualite(chemin):
+    """Modèle de seconde phase d'un instantané (CpModel), ou None s'il n'en a pas"""
+    fichier_modele = os.path.join(chemin, FICHIER_MODELE_QUALITE)
+    return _lire_modele(fichier_modele) if os.path.exists(fichier_modele) else None
+
+
+def resoudre_instantane(chemin, parametres=None):
+    """
+    Résout un instantané, sans base de données, avec ses paramètres d'origine surchargés par
+    `parametres` ({nom: valeur} de SatParameters, ex. {'num_search_workers': 16}).
+
+    La résolution est lexicographique comme en production : le placement d'abord, puis, s'il y a
+    un modèle de seconde phase, les critères de qualité à placement au moins aussi bon, en repartant
+    de la première solution, dans le temps restant.
+    Retourne {'statut', 'objectif', 'objectif_placement', 'borne', 'temps', 'cours', 'cours_places'}.
+    """
+    modele, donnees = charger_instantane(chemin)
+    modele_qualite = charger_modele_qualite(chemin)
+
+    solveur = cp_model.CpSolver()
+    for nom, valeur in {**donnees['parametres'], **(parametres or {})}.items():
+        text_format.Merge(f"{nom}: {str(valeur).lower() if isinstance(valeur, bool) else valeur}", solveur.parameters)
+    temps_max = solveur.parameters.max_time_in_seconds
+    if modele_qualite is not None:
+        solveur.parameters.max_time_in_seconds = temps_max * donnees.get('part_premiere_phase', 1.0)
+    status = solveur.Solve(modele)
+
+    resultat = {
+        'statut': solveur.StatusName(status),
+        'objectif': None,
+        'objectif_placement': None,
+        'borne': None,
+        'temps': solveur.WallTime(),
+        'cours': len(donnees['cours']),
+        'cours_places': 0,
+    }
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return resultat
+
+    valeurs = solveur.ResponseProto().solution
+    resultat.update(
+        objectif=solveur.ObjectiveValue(),
+        objectif_placement=solveur.ObjectiveValue(),
+        borne=solveur.BestObjectiveBound(),
+        cours_places=sum(1 for c in donnees['cours'] if valeurs[c['variables']['present']]),
+    )
+    if modele_qualite is None:
+        return resultat
+
+    # Seconde phase : l'objectif de placement ne peut pas se dégrader
+    placement = modele.Proto().objective
+    modele_qualite.Add(sum(
+        coefficient * modele_qualite.GetIntVarFromProtoIndex(indice)
+        for indice, coefficient in zip(placement.vars, placement.coeffs)
+    ) <= sum(coefficient * valeurs[indice] for indice, coefficient in zip(placement.vars, placement.coeffs)))
+    modele_qualite.ClearHints()
+    indication = modele_qualite.Proto().solution_hint
+    indication.vars.extend(range(len(valeurs)))
+    indication.values.extend(valeurs)
+
+    solveur_qualite = cp_model.CpSolver()
+    solveur_qualite.parameters.CopyFrom(solveur.parameters)
+    solveur_qualite.parameters.max_time_in_seconds = max(temps_max - solveur.WallTime(), 0.01)
+    status_qualite = solveur_qualite.Solve(modele_qualite)
+    resultat['temps'] += solveur_qualite.WallTime()
+    if status_qualite in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        valeurs = solveur_qualite.ResponseProto().solution
+        resultat.update(
+            statut=solveur_qualite.StatusName(status_qualite),
+            objectif=solveur_qualite.ObjectiveValue(),
+            borne=solveur_qualite.BestObjectiveBound(),
+            cours_places=sum(1 for c in donnees['cours'] if valeurs[c['variables']['present']]),
+        )
+    return resultat
@@ -0,0 +1,64 @@
+"""
+Banc d'essai des algorithmes d'optimisation sur des établissements synthétiques
+"""
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ia_optimisation.banc_essai import (
+    PROFILS_ETABLISSEMENT, ajouter_historique, comparer_reference, executer_banc_essai,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure OptimiseurEmploiTemps, AnalyseurConflits et OptimiseurRemplacants sur des établissements "
+        "synthétiques (données annulées en fin d'exécution), ajoute les mesures à l'historique et signale "
+        "les régressions par rapport à la référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profils', nargs='+', choices=list(PROFILS_ETABLISSEMENT), help="Profils mesurés (tous par défaut)")
+        parser.add_argument('--graine', type=int, default=0)
+        parser.add_argument('--echelle', type=float, default=1.0, help="Facteur appliqué au nombre de classes")
+        parser.add_argument('--temps-max', type=float, default=10.0, help="Temps maximal du solveur (en secondes)")
+        parser.add_argument('--workers', type=int, help="Nombre de workers du solveur")
+        parser.add_argument('--historique', default='banc_essai/historique.json')
+        parser.add_argument('--reference', default='banc_essai/reference.json')
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Dégradation tolérée (fraction)")
+        parser.add_argument('--enregistrer-reference', action='store_true', help="Remplacer la référence par ces mesures")
+
+    def handle(self, *args, **options):
+        parametres = {
+            nom: options[nom] for nom in ('profils', 'graine', 'echelle', 'temps_max', 'workers')
+        }
+        resultats = executer_banc_essai(
+            options['profils'], options['graine'], options['echelle'], options['temps_max'], options['workers']
+        )
+        for cle, mesure in resultats.items():
+            self.stdout.write(
+                f"{cle}: {mesure['temps']:.3f}s, {mesure['memoire_ko']} Ko, objectif={mesure['objectif']}"
+            )
+        ajouter_historique(options['historique'], resultats, parametres)
+
+        if options['enregistrer_reference']:
+            os.makedirs(os.path.dirname(options['reference']) or '.', exist_ok=True)
+            with open(options['reference'], 'w', encoding='utf-8') as fichier:
+                json.dump({'parametres': parametres, 'resultats': resultats}, fichier, ensure_ascii=False, indent=1)
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée dans {options['reference']}"))
+            return
+
+        if not os.path.exists(options['reference']):
+            self.stdout.write(self.style.WARNING("Aucune référence : lancer avec --enregistrer-reference"))
+            return
+        with open(options['reference'], encoding='utf-8') as fichier:
+            reference = json.load(fichier)
+        if reference['parametres'] != parametres:
+            self.stdout.write(self.style.WARNING("Paramètres différents de ceux de la référence"))
+        regressions = comparer_reference(resultats, reference['resultats'], options['tolerance'])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f"{len(regressions)} régressions par rapport à la référence")
+        self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence"))
@@ -0,0 +1,34 @@
+"""
+Exporte l'instantané du modèle d'optimisation d'un emploi du temps
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.emplois_temps.models import EmploiTemps
+from apps.ia_optimisation.algorithms import OptimiseurEmploiTemps
+from apps.ia_optimisation.instantanes import exporter_instantane, exporter_modele_qualite
+
+
+class Command(BaseCommand):
+    help = "Construit le modèle CP-SAT d'un emploi du temps (deux phases) et l'exporte avec ses données d'entrée"
+
+    def add_arguments(self, parser):
+        parser.add_argument('emploi_temps', type=int, help="Identifiant de l'emploi du temps")
+        parser.add_argument('dossier', help="Dossier de l'instantané")
+        parser.add_argument('--anonymiser', action='store_true', help="Renuméroter les identifiants et effacer les noms")
+
+    def handle(self, *args, **options):
+        try:
+            emploi_temps = EmploiTemps.objects.select_related('etablissement').get(pk=options['emploi_temps'])
+        except EmploiTemps.DoesNotExist:
+            raise CommandError(f"Emploi du temps {options['emploi_temps']} non trouvé")
+
+        optimiseur = OptimiseurEmploiTemps(emploi_temps.etablissement)
+        optimiseur._construire_modele(emploi_temps)
+        exporter_instantane(optimiseur, emploi_temps, options['dossier'], anonymiser=options['anonymiser'])
+        # Modèle de seconde phase (critères de qualité), comme le construit OptimiseurEmploiTemps._resoudre
+        if optimiseur._ajouter_criteres_qualite():
+            optimiseur.model.Minimize(sum(optimiseur.objectifs))
+            exporter_modele_qualite(optimiseur, options['dossier'], anonymiser=options['anonymiser'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Instantané de {emploi_temps.nom} ({len(optimiseur.variables)} cours) exporté dans {options['dossier']}"
+        ))
@@ -0,0 +1,66 @@
+"""
+Résout des instantanés de modèles d'optimisation avec d'autres paramètres du solveur (sans base de données)
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ia_optimisation.instantanes import FICHIER_MODELE, resoudre_instantane
+
+
+class Command(BaseCommand):
+    help = (
+        "Résout des instantanés (dossiers exportés, ou dossiers de corpus les contenant) "
+        "et affiche statut, objectif, borne et temps de chacun"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('chemins', nargs='+', help="Instantanés ou dossiers d'instantanés")
+        parser.add_argument('--temps-max', type=float, help="Temps maximal par résolution (en secondes)")
+        parser.add_argument('--workers', type=int, help="Nombre de workers du solveur")
+        parser.add_argument('--graine', type=int, help="Graine aléatoire du solveur")
+        parser.add_argument(
+            '--parametre', action='append', default=[], metavar='NOM=VALEUR',
+            help="Autre paramètre SatParameters (option répétable)"
+        )
+
+    def handle(self, *args, **options):
+        parametres = {}
+        for parametre in options['parametre']:
+            nom, separateur, valeur = parametre.partition('=')
+            if not separateur:
+                raise CommandError(f"Paramètre invalide (NOM=VALEUR attendu): {parametre}")
+            parametres[nom.strip()] = valeur.strip()
+        for nom, option in (
+            ('max_time_in_seconds', 'temps_max'), ('num_search_workers', 'workers'), ('random_seed', 'graine')
+        ):
+            if options[option] is not None:
+                parametres[nom] = options[option]
+
+        instantanes = []
+        for chemin in options['chemins']:
+            if os.path.exists(os.path.join(chemin, FICHIER_MODELE)):
+                instantanes.append(chemin)
+            elif os.path.isdir(chemin):
+                instantanes.extend(
+                    os.path.join(chemin, nom) for nom in sorted(os.listdir(chemin))
+                    if os.path.exists(os.path.join(chemin, nom, FICHIER_MODELE))
+                )
+            else:
+                raise CommandError(f"Instantané introuvable: {chemin}")
+
+        temps_total = 0.0
+        for chemin in instantanes:
+            try:
+                resultat = resoudre_instantane(chemin, parametres)
+            except Exception as e:
+                self.stderr.write(f"{chemin}: {e}")
+                continue
+            temps_total += resultat['temps']
+            self.stdout.write(
+                f"{chemin}: {resultat['statut']} objectif={resultat['objectif']} "
+                f"placement={resultat['objectif_placement']} borne={resultat['borne']} "
+                f"temps={resultat['temps']:.2f}s cours={resultat['cours_places']}/{resultat['cours']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(instantanes)} instantanés résolus en {temps_total:.2f}s"))
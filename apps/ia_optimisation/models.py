@@ -85,6 +85,8 @@ class OptimisationEmploiTemps(models.Model):
     conflits_resolus = models.PositiveIntegerField(default=0)
     contraintes_violees = models.PositiveIntegerField(default=0)
     temps_calcul = models.FloatField(default=0.0)  # en secondes
+    progression = models.JSONField(default=list, blank=True)  # [{"objectif", "borne", "temps"}, ...]
+    diagnostic = models.JSONField(default=dict, blank=True)  # {"problemes", "contraintes_incompatibles"}
     
     # Statut
     statut = models.CharField(
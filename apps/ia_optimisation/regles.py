@@ -0,0 +1,293 @@
+"""
+Compilation des règles JSON des contraintes (Contrainte.regle) en contraintes CP-SAT
+
+Formats de règles reconnus :
+
+    {"type": "creneaux_interdits", "filtre": {"enseignants": [12]}, "jours": [3], "heures": [14, 15]}
+    {"type": "max_heures_jour", "ressource": "classe", "filtre": {"classes": [4, 5]}, "max": 6}
+    {"type": "nombre_jours_max", "ressource": "enseignant", "filtre": {"enseignants": [12]}, "max": 4}
+
+Le filtre (optionnel) restreint les cours concernés par identifiants d'enseignants, de classes,
+de salles ou de matières. Une règle de priorité 5 est une contrainte dure ; les priorités 1 à 4
+deviennent des pénalités pondérées dans l'objectif.
+"""
+import threading
+import logging
+
+from ortools.sat.python import cp_model
+
+logger = logging.getLogger(__name__)
+
+
+# Poids des règles souples dans l'objectif, par priorité (5 = contrainte dure)
+POIDS_PRIORITE = {
+    1: 1,
+    2: 3,
+    3: 10,
+    4: 30,
+}
+
+PRIORITE_DURE = 5
+
+FILTRES = {
+    'enseignants': 'enseignant_id',
+    'classes': 'classe_id',
+    'salles': 'salle_id',
+    'matieres': 'matiere_id',
+}
+
+RESSOURCES = {
+    'enseignant': 'enseignant_id',
+    'classe': 'classe_id',
+    'salle': 'salle_id',
+}
+
+
+class RegleInvalide(ValueError):
+    """Règle JSON de contrainte mal formée"""
+
+
+class RegleCompilee:
+    """
+    Règle validée, prête à être émise dans un modèle CP-SAT
+    """
+
+    def __init__(self, filtre):
+        self.filtre = filtre
+
+    def cours_concernes(self, optimiseur):
+        """Identifiants des cours de l'optimiseur auxquels la règle s'applique"""
+        return [
+            cours_id for cours_id, cours in optimiseur.cours.items()
+            if all(getattr(cours, attribut) in ids for attribut, ids in self.filtre.items())
+        ]
+
+    def emettre(self, optimiseur, poids=None, condition=None):
+        """
+        Ajoute la règle au modèle de l'optimiseur.
+        Sans poids la règle est dure, imposée seulement si le littéral `condition` est vrai quand
+        il est fourni (diagnostic d'infaisabilité) ; sinon retourne la liste des termes de
+        violation à pénaliser.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _imposer(contrainte, condition):
+        if condition is not None:
+            contrainte.OnlyEnforceIf(condition)
+
+
+class RegleCreneauxInterdits(RegleCompilee):
+    """Les cours concernés ne peuvent pas occuper les créneaux indiqués"""
+
+    def __init__(self, filtre, jours, heures):
+        super().__init__(filtre)
+        self.jours = jours
+        self.heures = heures
+
+    def emettre(self, optimiseur, poids=None, condition=None):
+        grille = optimiseur.grille
+        interdits = set()
+        for indice_jour, jour in enumerate(grille.jours):
+            if jour not in self.jours:
+                continue
+            for creneau in range(grille.creneaux_par_jour):
+                if not self.heures or grille.heure_creneau(creneau) in self.heures:
+                    interdits.add(indice_jour * grille.creneaux_par_jour + creneau)
+
+        termes = []
+        if not interdits:
+            return termes
+
+        domaines = {}
+        for cours_id in self.cours_concernes(optimiseur):
+            variables = optimiseur.variables[cours_id]
+            nb_creneaux = variables['nb_creneaux']
+            if nb_creneaux not in domaines:
+                domaines[nb_creneaux] = cp_model.Domain.FromValues([
+                    t for t in range(grille.horizon)
+                    if t % grille.creneaux_par_jour + nb_creneaux <= grille.creneaux_par_jour and
+                    interdits.isdisjoint(range(t, t + nb_creneaux))
+                ])
+            domaine = domaines[nb_creneaux]
+
+            if poids is None:
+                self._imposer(optimiseur.model.AddLinearExpressionInDomain(variables['debut'], domaine), condition)
+            else:
+                violation = optimiseur.model.NewBoolVar(f"regle_creneau_{cours_id}")
+                optimiseur.model.AddLinearExpressionInDomain(
+                    variables['debut'], domaine
+                ).OnlyEnforceIf(violation.Not())
+                termes.append(violation)
+        return termes
+
+
+class RegleMaxHeuresJour(RegleCompilee):
+    """Charge journalière maximale par ressource (enseignant, classe ou salle), semaine A et B séparément"""
+
+    def __init__(self, filtre, ressource, maximum):
+        super().__init__(filtre)
+        self.ressource = ressource
+        self.maximum = maximum
+
+    def emettre(self, optimiseur, poids=None, condition=None):
+        grille = optimiseur.grille
+        max_minutes = int(self.maximum * 60)
+        groupes = {}
+        for cours_id in self.cours_concernes(optimiseur):
+            groupes.setdefault(getattr(optimiseur.cours[cours_id], self.ressource), []).append(cours_id)
+
+        termes = []
+        for ressource_id, cours_ids in groupes.items():
+            for _, cours_semaine in optimiseur._par_semaine(cours_ids):
+                durees = {cours_id: optimiseur.cours[cours_id].duree for cours_id in cours_semaine}
+                if sum(durees.values()) <= max_minutes:
+                    continue
+                for i in range(len(grille.jours)):
+                    charge = sum(durees[c] * optimiseur._litteral_jour(c, i) for c in cours_semaine)
+                    if poids is None:
+                        self._imposer(optimiseur.model.Add(charge <= max_minutes), condition)
+                    else:
+                        # Dépassement exprimé en créneaux
+                        depassement = optimiseur.model.NewIntVar(
+                            0, grille.creneaux_par_jour, f"depassement_{self.ressource}_{ressource_id}_{i}"
+                        )
+                        optimiseur.model.Add(depassement * grille.duree_creneau >= charge - max_minutes)
+                        termes.append(depassement)
+        return termes
+
+
+class RegleNombreJoursMax(RegleCompilee):
+    """Nombre maximal de jours de présence par ressource"""
+
+    def __init__(self, filtre, ressource, maximum):
+        super().__init__(filtre)
+        self.ressource = ressource
+        self.maximum = maximum
+
+    def emettre(self, optimiseur, poids=None, condition=None):
+        groupes = {}
+        for cours_id in self.cours_concernes(optimiseur):
+            groupes.setdefault(getattr(optimiseur.cours[cours_id], self.ressource), []).append(cours_id)
+
+        termes = []
+        nb_jours = len(optimiseur.grille.jours)
+        for ressource_id, cours_ids in groupes.items():
+            jours_utilises = []
+            for i in range(nb_jours):
+                utilise = optimiseur.model.NewBoolVar(f"jour_utilise_{self.ressource}_{ressource_id}_{i}")
+                for cours_id in cours_ids:
+                    optimiseur.model.AddImplication(optimiseur._litteral_jour(cours_id, i), utilise)
+                jours_utilises.append(utilise)
+
+            if poids is None:
+                self._imposer(optimiseur.model.Add(sum(jours_utilises) <= self.maximum), condition)
+            else:
+                depassement = optimiseur.model.NewIntVar(0, nb_jours, f"jours_en_trop_{self.ressource}_{ressource_id}")
+                optimiseur.model.Add(depassement >= sum(jours_utilises) - self.maximum)
+                termes.append(depassement)
+        return termes
+
+
+def _liste_entiers(regle, cle, obligatoire=False):
+    valeurs = regle.get(cle)
+    if valeurs is None:
+        if obligatoire:
+            raise RegleInvalide(f"Champ '{cle}' requis")
+        return []
+    if not isinstance(valeurs, list) or not all(isinstance(v, int) for v in valeurs):
+        raise RegleInvalide(f"'{cle}' doit être une liste d'entiers")
+    return valeurs
+
+
+def _filtre(regle):
+    filtre = regle.get('filtre') or {}
+    if not isinstance(filtre, dict):
+        raise RegleInvalide("'filtre' doit être un objet")
+    inconnus = set(filtre) - set(FILTRES)
+    if inconnus:
+        raise RegleInvalide(f"Filtres inconnus: {', '.join(sorted(inconnus))}")
+    return {FILTRES[cle]: set(_liste_entiers(filtre, cle)) for cle in filtre}
+
+
+def _ressource(regle):
+    ressource = regle.get('ressource')
+    if ressource not in RESSOURCES:
+        raise RegleInvalide(f"'ressource' doit valoir {', '.join(RESSOURCES)}")
+    return RESSOURCES[ressource]
+
+
+def _maximum(regle):
+    maximum = regle.get('max')
+    if not isinstance(maximum, (int, float)) or isinstance(maximum, bool) or maximum < 0:
+        raise RegleInvalide("'max' doit être un nombre positif")
+    return maximum
+
+
+def compiler_regle(regle):
+    """Valide une règle JSON et la compile en RegleCompilee (lève RegleInvalide)"""
+    if not isinstance(regle, dict):
+        raise RegleInvalide("La règle doit être un objet JSON")
+
+    type_regle = regle.get('type')
+    if type_regle == 'creneaux_interdits':
+        jours = _liste_entiers(regle, 'jours', obligatoire=True)
+        if not all(1 <= jour <= 7 for jour in jours):
+            raise RegleInvalide("'jours' doit contenir des jours entre 1 et 7")
+        return RegleCreneauxInterdits(_filtre(regle), set(jours), set(_liste_entiers(regle, 'heures')))
+    if type_regle == 'max_heures_jour':
+        return RegleMaxHeuresJour(_filtre(regle), _ressource(regle), _maximum(regle))
+    if type_regle == 'nombre_jours_max':
+        return RegleNombreJoursMax(_filtre(regle), _ressource(regle), int(_maximum(regle)))
+
+    raise RegleInvalide(f"Type de règle inconnu: {type_regle}")
+
+
+# Cache des règles compilées : {contrainte_id: ((contrainte_id, updated_at), règle ou RegleInvalide)}
+_cache_regles = {}
+_verrou_cache = threading.Lock()
+
+
+def regles_etablissement(etablissement):
+    """
+    Retourne les règles compilées des contraintes actives d'un établissement,
+    sous forme de liste de (contrainte_id, priorite, RegleCompilee).
+
+    Les règles sont recompilées uniquement si la contrainte a changé depuis la dernière
+    compilation (clé (id, updated_at)) ; le JSON n'est chargé que pour celles-ci.
+    """
+    from apps.emplois_temps.models import Contrainte
+
+    entetes = list(Contrainte.objects.filter(
+        etablissement=etablissement, actif=True
+    ).values_list('id', 'updated_at', 'priorite'))
+
+    with _verrou_cache:
+        a_compiler = [
+            contrainte_id for contrainte_id, updated_at, _ in entetes
+            if _cache_regles.get(contrainte_id, (None,))[0] != (contrainte_id, updated_at)
+        ]
+
+    if a_compiler:
+        versions = {contrainte_id: updated_at for contrainte_id, updated_at, _ in entetes}
+        compilees = {}
+        for contrainte_id, regle in Contrainte.objects.filter(id__in=a_compiler).values_list('id', 'regle'):
+            try:
+                compilees[contrainte_id] = compiler_regle(regle)
+            except RegleInvalide as e:
+                logger.warning(f"Contrainte {contrainte_id} ignorée: {e}")
+                compilees[contrainte_id] = e
+        with _verrou_cache:
+            for contrainte_id, compilee in compilees.items():
+                _cache_regles[contrainte_id] = ((contrainte_id, versions[contrainte_id]), compilee)
+
+    with _verrou_cache:
+        regles = [
+            (contrainte_id, priorite, _cache_regles[contrainte_id][1])
+            for contrainte_id, _, priorite in entetes
+            if contrainte_id in _cache_regles
+        ]
+    return [
+        (contrainte_id, priorite, regle) for contrainte_id, priorite, regle in regles
+        if isinstance(regle, RegleCompilee)
+    ]
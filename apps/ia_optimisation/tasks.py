@@ -0,0 +1,193 @@
+"""
+Tâches Celery pour l'application IA et optimisation
+"""
+import threading
+
+from celery import shared_task
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import ModeleIA, OptimisationEmploiTemps
+from .algorithms import OptimiseurEmploiTemps, SurveillanceAnnulation, enregistrer_solution
+from apps.emplois_temps.models import EmploiTemps
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def lancer_optimisation(emploi_temps, utilisateur, poids_contraintes=None, nb_candidats=None):
+    """
+    Crée une OptimisationEmploiTemps au statut 'en_cours' et met sa résolution en file d'attente
+    une fois la transaction validée. Avec `nb_candidats`, un portefeuille de propositions est calculé
+    au lieu d'appliquer une solution (voir optimiser_portefeuille_task). Retourne l'optimisation créée,
+    au statut 'echec' si la mise en file a échoué.
+    """
+    modele_ia, _ = ModeleIA.objects.get_or_create(
+        nom='CP-SAT',
+        version='1',
+        defaults={
+            'type_modele': 'optimisation_emploi_temps',
+            'description': "Optimisation par programmation par contraintes (OR-Tools CP-SAT)",
+            'statut': 'deploye',
+            'created_by': utilisateur,
+        }
+    )
+    optimisation = OptimisationEmploiTemps.objects.create(
+        emploi_temps=emploi_temps,
+        modele_ia=modele_ia,
+        poids_contraintes=poids_contraintes or {},
+        created_by=utilisateur,
+    )
+    if nb_candidats:
+        tache, arguments = optimiser_portefeuille_task, (optimisation.id, nb_candidats)
+    else:
+        tache, arguments = optimiser_emploi_temps_task, (optimisation.id,)
+    transaction.on_commit(lambda: _mettre_en_file(optimisation, tache, *arguments))
+    return optimisation
+
+
+def _mettre_en_file(optimisation, tache, *arguments):
+    """
+    Envoie la tâche au broker Celery s'il est configuré (CELERY_BROKER_URL), sinon l'exécute dans
+    un thread du serveur. Si l'envoi échoue, l'optimisation est terminée au statut 'echec'.
+    """
+    try:
+        if getattr(settings, 'CELERY_BROKER_URL', ''):
+            tache.delay(*arguments)
+        else:
+            threading.Thread(target=_executer_en_arriere_plan, args=(tache, *arguments), daemon=True).start()
+    except Exception as e:
+        logger.error(f"Mise en file de l'optimisation {optimisation.id} impossible: {e}")
+        optimisation.statut = 'echec'
+        optimisation.completed_at = timezone.now()
+        OptimisationEmploiTemps.objects.filter(pk=optimisation.pk, statut='en_cours').update(
+            statut=optimisation.statut,
+            completed_at=optimisation.completed_at,
+        )
+
+
+def _executer_en_arriere_plan(tache, *arguments):
+    """Exécute une tâche hors de la requête, sans worker Celery, puis ferme les connexions du thread"""
+    try:
+        tache(*arguments)
+    finally:
+        connections.close_all()
+
+
+def _optimisation_a_demarrer(optimisation_id):
+    """Optimisation en attente de résolution, ou None si elle n'existe plus ou a été annulée"""
+    try:
+        optimisation = OptimisationEmploiTemps.objects.select_related(
+            'emploi_temps__etablissement'
+        ).get(id=optimisation_id)
+    except OptimisationEmploiTemps.DoesNotExist:
+        logger.error(f"Optimisation {optimisation_id} non trouvée")
+        return None
+
+    if optimisation.statut != 'en_cours':
+        logger.info(f"Optimisation {optimisation_id} annulée avant son démarrage")
+        return None
+    return optimisation
+
+
+@shared_task
+def optimiser_emploi_temps_task(optimisation_id):
+    """
+    Tâche pour optimiser un emploi du temps, suivie par OptimisationEmploiTemps.statut
+    """
+    optimisation = _optimisation_a_demarrer(optimisation_id)
+    if optimisation is None:
+        return
+
+    emploi_temps = optimisation.emploi_temps
+    try:
+        optimiseur = OptimiseurEmploiTemps(
+            emploi_temps.etablissement, contraintes=optimisation.contraintes_appliquees
+        )
+        surveillance = SurveillanceAnnulation(optimisation.id, optimiseur)
+        surveillance.start()
+        try:
+            solution = optimiseur.optimiser_par_composantes(emploi_temps, optimisation)
+        finally:
+            surveillance.arreter()
+
+        OptimisationEmploiTemps.objects.filter(pk=optimisation.pk).update(diagnostic=optimiseur.diagnostic)
+        if solution:
+            OptimisationEmploiTemps.objects.filter(pk=optimisation.pk).update(
+                score_optimise=solution['score'],
+                conflits_resolus=solution['conflits_resolus'],
+                contraintes_violees=solution.get('contraintes_violees', 0),
+                temps_calcul=solution['temps_calcul'],
+            )
+
+        # Une optimisation annulée garde son statut et sa meilleure progression, sans être appliquée
+        en_cours = OptimisationEmploiTemps.objects.filter(pk=optimisation.pk, statut='en_cours')
+        if solution and en_cours.exists():
+            enregistrer_solution(solution, optimisation.created_by)
+            EmploiTemps.objects.filter(pk=emploi_temps.pk).update(score_optimisation=solution['score'])
+        en_cours.update(
+            statut='termine' if solution else 'echec',
+            completed_at=timezone.now(),
+        )
+        logger.info(f"Optimisation {optimisation_id} de {emploi_temps.nom} terminée")
+
+    except Exception as e:
+        logger.error(f"Erreur lors de l'optimisation {optimisation_id}: {e}")
+        OptimisationEmploiTemps.objects.filter(pk=optimisation.pk, statut='en_cours').update(
+            statut='echec',
+            completed_at=timezone.now(),
+        )
+
+
+@shared_task
+def optimiser_portefeuille_task(optimisation_id, nb_candidats):
+    """
+    Tâche calculant un portefeuille de propositions non dominées pour un emploi du temps.
+    Les propositions sont créées au statut 'propose' et listées dans OptimisationEmploiTemps.objectifs ;
+    l'emploi du temps optimisé n'est pas modifié.
+    """
+    optimisation = _optimisation_a_demarrer(optimisation_id)
+    if optimisation is None:
+        return
+
+    emploi_temps = optimisation.emploi_temps
+    try:
+        optimiseur = OptimiseurEmploiTemps(
+            emploi_temps.etablissement, contraintes=optimisation.contraintes_appliquees
+        )
+        surveillance = SurveillanceAnnulation(optimisation.id, optimiseur)
+        surveillance.start()
+        try:
+            propositions = optimiseur.optimiser_portefeuille(
+                emploi_temps, optimisation.created_by, optimisation, nb_candidats=nb_candidats
+            )
+        finally:
+            surveillance.arreter()
+
+        OptimisationEmploiTemps.objects.filter(pk=optimisation.pk).update(diagnostic=optimiseur.diagnostic)
+        if propositions:
+            OptimisationEmploiTemps.objects.filter(pk=optimisation.pk).update(
+                score_optimise=min(p['score'] for p in propositions),
+                objectifs={'propositions': [
+                    {
+                        'emploi_temps_id': p['emploi_temps'].id,
+                        'objectifs': p['objectifs'],
+                        'poids': p['poids'],
+                        'graine': p['graine'],
+                        'score': p['score'],
+                    }
+                    for p in propositions
+                ]},
+            )
+        OptimisationEmploiTemps.objects.filter(pk=optimisation.pk, statut='en_cours').update(
+            statut='termine' if propositions else 'echec',
+            completed_at=timezone.now(),
+        )
+        logger.info(f"Portefeuille {optimisation_id} de {emploi_temps.nom} terminé")
+
+    except Exception as e:
+        logger.error(f"Erreur lors du portefeuille {optimisation_id}: {e}")
+        OptimisationEmploiTemps.objects.filter(pk=optimisation.pk, statut='en_cours').update(
+            statut='echec',
+            completed_at=timezone.now(),
+        )
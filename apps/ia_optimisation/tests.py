@@ -0,0 +1,468 @@
+"""
+Tests du compilateur de règles (regles.py), du lancement des optimisations, de l'écriture des solutions
+et de l'affectation des remplaçants
+"""
+from datetime import date, time, timedelta
+from unittest import mock
+
+import numpy as np
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.accounts.models import User
+from apps.emplois_temps import disponibilites
+from apps.emplois_temps.models import Contrainte, Cours, EmploiTemps, HistoriqueEmploiTemps, Periode
+from apps.etablissements import geographie
+from apps.etablissements.models import Academie, Classe, Etablissement, Matiere, Salle
+from apps.remplacements.models import Absence, Remplacant, Remplacement
+from .models import OptimisationEmploiTemps
+from . import regles, tasks
+from .algorithms import OptimiseurRemplacants, enregistrer_solution
+from .regles import (
+    RegleCreneauxInterdits, RegleInvalide, RegleMaxHeuresJour, RegleNombreJoursMax, compiler_regle,
+    regles_etablissement,
+)
+
+
+def creer_etablissement(uai='0000000T', **champs):
+    academie = Academie.objects.filter(code='TEST').first() or Academie.objects.create(
+        nom='Académie de test', code='TEST', region='-', ville_chef_lieu='-', adresse='-',
+        telephone='-', email='academie@example.org', recteur='-',
+    )
+    valeurs = {
+        'nom': f'Collège {uai}', 'type_etablissement': 'college', 'statut': 'public', 'uai': uai,
+        'academie': academie, 'adresse': '-', 'code_postal': '75001', 'ville': 'Paris', 'departement': '75',
+        'region': '-', 'telephone': '-', 'email': 'college@example.org', 'jours_ouverture': [1, 2, 3, 4, 5],
+    }
+    valeurs.update(champs)
+    return Etablissement.objects.create(**valeurs)
+
+
+class CompilationReglesTests(SimpleTestCase):
+
+    def assertInvalide(self, regle, message):
+        with self.assertRaisesMessage(RegleInvalide, message):
+            compiler_regle(regle)
+
+    def test_creneaux_interdits(self):
+        regle = compiler_regle({
+            'type': 'creneaux_interdits', 'filtre': {'enseignants': [12]}, 'jours': [3], 'heures': [14, 15],
+        })
+        self.assertIsInstance(regle, RegleCreneauxInterdits)
+        self.assertEqual(regle.filtre, {'enseignant_id': {12}})
+        self.assertEqual(regle.jours, {3})
+        self.assertEqual(regle.heures, {14, 15})
+
+    def test_charges_maximales(self):
+        regle = compiler_regle({'type': 'max_heures_jour', 'ressource': 'classe', 'filtre': {'classes': [4, 5]}, 'max': 6})
+        self.assertIsInstance(regle, RegleMaxHeuresJour)
+        self.assertEqual((regle.ressource, regle.maximum), ('classe_id', 6))
+        self.assertEqual(regle.filtre, {'classe_id': {4, 5}})
+
+        regle = compiler_regle({'type': 'nombre_jours_max', 'ressource': 'enseignant', 'max': 4.0})
+        self.assertIsInstance(regle, RegleNombreJoursMax)
+        self.assertEqual((regle.ressource, regle.maximum, regle.filtre), ('enseignant_id', 4, {}))
+
+    def test_regles_invalides(self):
+        self.assertInvalide([], "La règle doit être un objet JSON")
+        self.assertInvalide({'type': 'inconnu'}, "Type de règle inconnu: inconnu")
+        self.assertInvalide({'type': 'creneaux_interdits'}, "Champ 'jours' requis")
+        self.assertInvalide({'type': 'creneaux_interdits', 'jours': 'lundi'}, "'jours' doit être une liste d'entiers")
+        self.assertInvalide({'type': 'creneaux_interdits', 'jours': [0]}, "'jours' doit contenir des jours entre 1 et 7")
+        self.assertInvalide(
+            {'type': 'creneaux_interdits', 'jours': [1], 'filtre': [12]}, "'filtre' doit être un objet"
+        )
+        self.assertInvalide(
+            {'type': 'creneaux_interdits', 'jours': [1], 'filtre': {'eleves': [1], 'niveaux': [2]}},
+            "Filtres inconnus: eleves, niveaux",
+        )
+        self.assertInvalide(
+            {'type': 'max_heures_jour', 'ressource': 'etablissement', 'max': 6}, "'ressource' doit valoir"
+        )
+        for maximum in (None, -1, True, '6'):
+            self.assertInvalide(
+                {'type': 'max_heures_jour', 'ressource': 'salle', 'max': maximum}, "'max' doit être un nombre positif"
+            )
+
+
+class CacheReglesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.etablissement = creer_etablissement()
+        cls.directeur = User.objects.create(username='directeur', role='directeur')
+
+    def setUp(self):
+        regles._cache_regles.clear()
+
+    def creer_contrainte(self, regle, priorite=5, **champs):
+        return Contrainte.objects.create(
+            nom='Contrainte', type_contrainte='globale', etablissement=self.etablissement, priorite=priorite,
+            description='-', regle=regle, created_by=self.directeur, **champs
+        )
+
+    def test_compilation_mise_en_cache(self):
+        contrainte = self.creer_contrainte({'type': 'nombre_jours_max', 'ressource': 'enseignant', 'max': 4})
+        self.creer_contrainte({'type': 'nombre_jours_max', 'ressource': 'enseignant', 'max': 3}, actif=False)
+
+        with mock.patch.object(regles, 'compiler_regle', wraps=compiler_regle) as compilation:
+            premieres = regles_etablissement(self.etablissement)
+            secondes = regles_etablissement(self.etablissement)
+        self.assertEqual(compilation.call_count, 1)
+        self.assertEqual([(contrainte_id, priorite) for contrainte_id, priorite, _ in premieres], [(contrainte.id, 5)])
+        self.assertIs(secondes[0][2], premieres[0][2])
+
+        contrainte.regle = {'type': 'nombre_jours_max', 'ressource': 'enseignant', 'max': 2}
+        contrainte.save()
+        with mock.patch.object(regles, 'compiler_regle', wraps=compiler_regle) as compilation:
+            (_, _, regle), = regles_etablissement(self.etablissement)
+        self.assertEqual(compilation.call_count, 1)
+        self.assertEqual(regle.maximum, 2)
+
+    def test_regle_invalide_ignoree(self):
+        self.creer_contrainte({'type': 'inconnu'})
+        with self.assertLogs('apps.ia_optimisation.regles', 'WARNING'):
+            self.assertEqual(regles_etablissement(self.etablissement), [])
+        with mock.patch.object(regles, 'compiler_regle', wraps=compiler_regle) as compilation:
+            self.assertEqual(regles_etablissement(self.etablissement), [])
+        compilation.assert_not_called()
+
+
+class LancementOptimisationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        etablissement = creer_etablissement()
+        cls.directeur = User.objects.create(username='directeur', role='directeur')
+        periode = Periode.objects.create(
+            nom='T1', etablissement=etablissement, date_debut=date(2026, 9, 1), date_fin=date(2026, 12, 20),
+            numero_periode=1,
+        )
+        cls.emploi_temps = EmploiTemps.objects.create(
+            nom='EDT', etablissement=etablissement, periode=periode, createur=cls.directeur,
+        )
+
+    @override_settings(CELERY_BROKER_URL='redis://localhost:6379/0')
+    def test_mise_en_file_apres_validation(self):
+        with mock.patch.object(tasks.optimiser_emploi_temps_task, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                optimisation = tasks.lancer_optimisation(self.emploi_temps, self.directeur)
+                delay.assert_not_called()
+        delay.assert_called_once_with(optimisation.id)
+        self.assertEqual(optimisation.statut, 'en_cours')
+
+    @override_settings(CELERY_BROKER_URL='redis://localhost:6379/0')
+    def test_broker_injoignable(self):
+        with mock.patch.object(tasks.optimiser_portefeuille_task, 'delay', side_effect=OSError('refusé')):
+            with self.assertLogs(tasks.logger, 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                optimisation = tasks.lancer_optimisation(self.emploi_temps, self.directeur, nb_candidats=3)
+        self.assertEqual(optimisation.statut, 'echec')
+        enregistree = OptimisationEmploiTemps.objects.get(pk=optimisation.pk)
+        self.assertEqual(enregistree.statut, 'echec')
+        self.assertIsNotNone(enregistree.completed_at)
+
+    @override_settings(CELERY_BROKER_URL='')
+    def test_sans_broker_execution_dans_un_thread(self):
+        with mock.patch.object(tasks.threading, 'Thread') as thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                optimisation = tasks.lancer_optimisation(self.emploi_temps, self.directeur)
+        thread.assert_called_once_with(
+            target=tasks._executer_en_arriere_plan, args=(tasks.optimiser_emploi_temps_task, optimisation.id),
+            daemon=True,
+        )
+        thread.return_value.start.assert_called_once_with()
+
+
+class EnregistrementSolutionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.etablissement = creer_etablissement()
+        cls.directeur = User.objects.create(username='directeur', role='directeur')
+        cls.enseignant = User.objects.create(username='enseignant')
+        cls.salle = Salle.objects.create(nom='S1', type_salle='classe', etablissement=cls.etablissement, capacite=30)
+        cls.classe = Classe.objects.create(nom='6A', niveau='6e', etablissement=cls.etablissement, nombre_eleves=25)
+        cls.matiere = Matiere.objects.create(nom='Mathématiques', code='MATHS_TEST', niveau_enseignement='college')
+        periode = Periode.objects.create(
+            nom='T1', etablissement=cls.etablissement, date_debut=date(2026, 9, 1), date_fin=date(2026, 12, 20),
+            numero_periode=1,
+        )
+        cls.emploi_temps = EmploiTemps.objects.create(
+            nom='EDT', etablissement=cls.etablissement, periode=periode, createur=cls.directeur,
+        )
+        cls.brouillon = EmploiTemps.objects.create(
+            nom='Brouillon', etablissement=cls.etablissement, periode=periode, createur=cls.directeur,
+        )
+
+    def creer_cours(self, jour, heure, **champs):
+        valeurs = {
+            'emploi_temps': self.emploi_temps, 'classe': self.classe, 'matiere': self.matiere,
+            'enseignant': self.enseignant, 'salle': self.salle, 'jour_semaine': jour,
+            'heure_debut': time(heure), 'heure_fin': time(heure, 55), 'duree': 55,
+        }
+        valeurs.update(champs)
+        return Cours.objects.create(**valeurs)
+
+    def solution(self, *placements):
+        return {
+            'emploi_temps': self.emploi_temps,
+            'cours_optimises': [
+                {'cours': cours, 'jour_semaine': jour, 'heure_debut': time(heure), 'heure_fin': time(heure, 55)}
+                for cours, jour, heure in placements
+            ],
+        }
+
+    def creneaux(self, emploi_temps=None):
+        return sorted(
+            Cours.objects.filter(emploi_temps=emploi_temps or self.emploi_temps).values_list(
+                'jour_semaine', 'heure_debut'
+            )
+        )
+
+    def test_echange_de_creneaux(self):
+        premier = self.creer_cours(1, 8)
+        second = self.creer_cours(1, 9)
+        troisieme = self.creer_cours(1, 10)
+
+        # Rotation des trois cours de la classe : chaque créneau cible est occupé avant l'écriture
+        resultat = enregistrer_solution(
+            self.solution((premier, 1, 9), (second, 1, 10), (troisieme, 1, 8)), self.directeur
+        )
+
+        self.assertEqual(resultat, {'cours_deplaces': 3, 'cours_crees': 0, 'cours_bloques': []})
+        self.assertEqual(
+            dict(Cours.objects.values_list('id', 'heure_debut')),
+            {premier.id: time(9), second.id: time(10), troisieme.id: time(8)},
+        )
+        historique = HistoriqueEmploiTemps.objects.get(emploi_temps=self.emploi_temps)
+        self.assertEqual(historique.donnees_avant['cours'][str(premier.id)][:2], [1, '08:00'])
+        self.assertEqual(historique.donnees_apres['cours'][str(premier.id)][:2], [1, '09:00'])
+
+    def test_creneau_d_un_cours_hors_solution(self):
+        premier = self.creer_cours(1, 8)
+        second = self.creer_cours(1, 9)
+        annule = self.creer_cours(2, 8, statut='annule')
+
+        # Le premier cours ne peut pas prendre le créneau du cours annulé, ce qui bloque le second
+        resultat = enregistrer_solution(self.solution((premier, 2, 8), (second, 1, 8)), self.directeur)
+
+        self.assertEqual(resultat['cours_deplaces'], 0)
+        self.assertEqual(sorted(resultat['cours_bloques']), [premier.id, second.id])
+        self.assertEqual(self.creneaux(), [(1, time(8)), (1, time(9)), (2, time(8))])
+        self.assertEqual(Cours.objects.get(pk=annule.pk).jour_semaine, 2)
+
+    def test_creation_dans_un_autre_emploi_du_temps(self):
+        premier = self.creer_cours(1, 8)
+        second = self.creer_cours(1, 9)
+        # Le cours du brouillon est apparié au premier cours (mêmes classe, matière, enseignant et salle)
+        self.creer_cours(3, 8, emploi_temps=self.brouillon)
+
+        resultat = enregistrer_solution(
+            self.solution((premier, 3, 8), (second, 3, 9)), self.directeur, emploi_temps=self.brouillon
+        )
+
+        self.assertEqual(resultat, {'cours_deplaces': 0, 'cours_crees': 1, 'cours_bloques': []})
+        self.assertEqual(self.creneaux(self.brouillon), [(3, time(8)), (3, time(9))])
+        self.assertEqual(self.creneaux(), [(1, time(8)), (1, time(9))])
+
+
+class JoursParSemaineTests(SimpleTestCase):
+
+    def compter(self, premier, dernier):
+        """Décompte de référence, jour par jour"""
+        jours = [0] * 7
+        jour = premier
+        while jour <= dernier:
+            jours[jour.isoweekday() - 1] += 1
+            jour += timedelta(days=1)
+        return jours
+
+    def test_decompte_identique_au_parcours_jour_par_jour(self):
+        intervalles = [
+            (date(2026, 10, 19), date(2026, 10, 19)),  # un lundi
+            (date(2026, 10, 25), date(2026, 10, 25)),  # un dimanche
+            (date(2026, 10, 19), date(2026, 10, 25)),
+            (date(2026, 10, 21), date(2026, 11, 3)),
+            (date(2026, 12, 28), date(2027, 1, 12)),
+            (date(2028, 2, 27), date(2028, 3, 2)),
+            (date(1, 1, 1), date(1, 1, 14)),
+        ]
+        premiers = np.array([premier.toordinal() for premier, _ in intervalles])
+        derniers = np.array([dernier.toordinal() for _, dernier in intervalles])
+
+        decomptes = OptimiseurRemplacants._jours_par_semaine(premiers, derniers)
+
+        self.assertEqual(decomptes.tolist(), [self.compter(*intervalle) for intervalle in intervalles])
+
+    def test_intervalle_vide(self):
+        debut = date(2026, 10, 21).toordinal()
+        decomptes = OptimiseurRemplacants._jours_par_semaine(np.array([debut, debut]), np.array([debut - 1, debut - 30]))
+        self.assertEqual(decomptes.tolist(), [[0] * 7, [0] * 7])
+
+
+@override_settings(FICHIER_CODES_POSTAUX='')
+class RemplacantsAPorteeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.etablissement = creer_etablissement()  # Paris
+
+        def creer_remplacant(nom, code_postal=''):
+            return Remplacant.objects.create(
+                enseignant=User.objects.create(username=nom, code_postal=code_postal),
+                etablissement=cls.etablissement, date_debut_disponibilite=date(2026, 9, 1), distance_max=50,
+            )
+
+        cls.proche = creer_remplacant('proche', '75011')
+        cls.eloigne = creer_remplacant('eloigne', '13001')
+        cls.non_localise = creer_remplacant('non_localise')
+        cls.localise_ensuite = creer_remplacant('localise_ensuite')
+
+    def setUp(self):
+        geographie._cache_index.clear()
+
+    def a_portee(self, remplacants):
+        remplacants, _ = OptimiseurRemplacants()._remplacants_a_portee(
+            Absence(etablissement=self.etablissement), remplacants
+        )
+        return {remplacant.id for remplacant in remplacants}
+
+    def test_meme_regle_pour_un_queryset_et_une_liste(self):
+        attendus = {self.proche.id, self.non_localise.id, self.localise_ensuite.id}
+        self.assertEqual(self.a_portee(Remplacant.objects.all()), attendus)
+
+        # Localisé sans que l'index géographique en cache le sache : conservé dans les deux cas
+        User.objects.filter(pk=self.localise_ensuite.enseignant_id).update(latitude=43.3, longitude=5.4)
+        self.assertEqual(self.a_portee(Remplacant.objects.all()), attendus)
+        self.assertEqual(self.a_portee(list(Remplacant.objects.all())), attendus)
+
+
+class AffectationRemplacantsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.etablissement = creer_etablissement()
+        cls.directeur = User.objects.create(username='directeur', role='directeur')
+        cls.salle = Salle.objects.create(nom='S1', type_salle='classe', etablissement=cls.etablissement, capacite=30)
+        cls.matiere = Matiere.objects.create(nom='Mathématiques', code='MATHS_TEST', niveau_enseignement='college')
+        periode = Periode.objects.create(
+            nom='T1', etablissement=cls.etablissement, date_debut=date(2026, 9, 1), date_fin=date(2026, 12, 20),
+            numero_periode=1,
+        )
+        cls.emploi_temps = EmploiTemps.objects.create(
+            nom='EDT', etablissement=cls.etablissement, periode=periode, createur=cls.directeur, statut='actif',
+        )
+
+    def setUp(self):
+        disponibilites._cache_index.clear()
+
+    def creer_absence(self, nom, heures, debut=date(2026, 10, 19), fin=date(2026, 10, 23), jours=(1,)):
+        """Absence d'un enseignant dont les cours ont lieu aux jours (le lundi par défaut) et heures indiqués"""
+        enseignant = User.objects.create(username=nom)
+        classe = Classe.objects.create(nom=nom, niveau='6e', etablissement=self.etablissement, nombre_eleves=25)
+        for jour in jours:
+            for heure in heures:
+                Cours.objects.create(
+                    emploi_temps=self.emploi_temps, classe=classe, matiere=self.matiere, enseignant=enseignant,
+                    salle=self.salle, jour_semaine=jour, heure_debut=time(heure), heure_fin=time(heure, 55), duree=55,
+                )
+        return Absence.objects.create(
+            enseignant=enseignant, etablissement=self.etablissement, type_absence='maladie', date_debut=debut,
+            date_fin=fin, motif='-', declaree_par=self.directeur,
+        )
+
+    def creer_remplacant(self, nom, **champs):
+        valeurs = {'etablissement': self.etablissement, 'date_debut_disponibilite': date(2026, 9, 1)}
+        valeurs.update(champs)
+        remplacant = Remplacant.objects.create(enseignant=User.objects.create(username=nom), **valeurs)
+        remplacant.matieres_enseignees.add(self.matiere)
+        return remplacant
+
+    def accepter_mission(self, remplacant, jour, heure_debut, heure_fin):
+        """Mission acceptée du remplaçant pour une autre absence"""
+        absence = self.creer_absence(f'mission{jour.isoformat()}{remplacant.id}', [], debut=jour, fin=jour)
+        Remplacement.objects.create(
+            absence=absence, remplacant=remplacant, date_remplacement=jour, heure_debut=time(heure_debut),
+            heure_fin=time(heure_fin), salle=self.salle, statut='accepte', created_by=self.directeur,
+        )
+
+    def affectations(self, absences, **options):
+        resultat = OptimiseurRemplacants().affecter_remplacants(absences, temps_max=5, **options)
+        return {
+            absence_id: [
+                (affectation['remplacant'].id, sorted(cours.heure_debut.hour for cours in affectation['cours']))
+                for affectation in affectations
+            ]
+            for absence_id, affectations in resultat.items()
+        }
+
+    def test_remplacant_unique_par_creneau(self):
+        premiere = self.creer_absence('absent1', [8])
+        seconde = self.creer_absence('absent2', [8])
+        remplacant = self.creer_remplacant('remplacant1')
+
+        # Un seul remplaçant ne peut couvrir qu'un des deux cours simultanés
+        resultat = self.affectations([premiere, seconde])
+        self.assertEqual(sum(len(affectations) for affectations in resultat.values()), 1)
+
+        autre = self.creer_remplacant('remplacant2')
+        resultat = self.affectations([premiere, seconde])
+        self.assertEqual(set(resultat), {premiere.id, seconde.id})
+        self.assertEqual(
+            {remplacant_id for affectations in resultat.values() for remplacant_id, _ in affectations},
+            {remplacant.id, autre.id},
+        )
+
+    def test_service_hebdomadaire_maximal(self):
+        absence = self.creer_absence('absent', [8, 9, 10])
+        remplacant = self.creer_remplacant('remplacant')
+
+        self.assertEqual(self.affectations([absence]), {absence.id: [(remplacant.id, [8, 9, 10])]})
+        # Deux heures par semaine : deux cours de 55 minutes au plus
+        (_, heures), = self.affectations([absence], heures_max_semaine=2)[absence.id]
+        self.assertEqual(len(heures), 2)
+
+    def test_regroupement_sur_un_remplacant(self):
+        absence = self.creer_absence('absent', [8, 9])
+        self.creer_remplacant('remplacant1')
+        self.creer_remplacant('remplacant2')
+
+        (affectation,), = self.affectations([absence]).values()
+        self.assertEqual(affectation[1], [8, 9])
+
+    def test_remplacants_de_l_academie(self):
+        absence = self.creer_absence('absent', [8])
+        remplacant = self.creer_remplacant('remplacant', etablissement=creer_etablissement(uai='0000001T'))
+
+        self.assertEqual(self.affectations([absence]), {})
+        self.assertEqual(
+            self.affectations([absence], academie_id=self.etablissement.academie_id),
+            {absence.id: [(remplacant.id, [8])]},
+        )
+
+    def test_dates_hors_disponibilite(self):
+        absence = self.creer_absence('absent', [8], jours=(1, 3))
+        remplacant = self.creer_remplacant('remplacant', date_fin_disponibilite=date(2026, 10, 20))
+
+        # Disponible le lundi 19 mais plus le mercredi 21
+        self.assertEqual(self.affectations([absence]), {absence.id: [(remplacant.id, [8])]})
+
+    def test_jour_de_mission_acceptee(self):
+        absence = self.creer_absence('absent', [8], jours=(1, 3))
+        remplacant = self.creer_remplacant('remplacant')
+        self.accepter_mission(remplacant, date(2026, 10, 21), 14, 16)
+
+        self.assertEqual(self.affectations([absence]), {absence.id: [(remplacant.id, [8])]})
+
+    def test_service_hebdomadaire_avec_missions_acceptees(self):
+        absence = self.creer_absence('absent', [8, 9, 10])
+        remplacant = self.creer_remplacant('remplacant')
+        self.accepter_mission(remplacant, date(2026, 10, 20), 14, 15)
+
+        # Une heure déjà engagée sur un service de deux heures : un seul cours de 55 minutes
+        (_, heures), = self.affectations([absence], heures_max_semaine=2)[absence.id]
+        self.assertEqual(len(heures), 1)
+        # Une mission d'une autre semaine ne compte pas
+        Remplacement.objects.update(date_remplacement=date(2026, 10, 13))
+        (_, heures), = self.affectations([absence], heures_max_semaine=2)[absence.id]
+        self.assertEqual(len(heures), 2)
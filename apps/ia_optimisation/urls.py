@@ -22,6 +22,8 @@ urlpatterns = [
     
     # API
     path('api/optimiser/', views.api_optimiser, name='api_optimiser'),
+    path('api/optimisation/<int:pk>/', views.api_statut_optimisation, name='api_statut_optimisation'),
+    path('api/optimisation/<int:pk>/annuler/', views.api_annuler_optimisation, name='api_annuler_optimisation'),
     path('api/predire/', views.api_predire, name='api_predire'),
     path('api/analyser/', views.api_analyser, name='api_analyser'),
 ]
\ No newline at end of file
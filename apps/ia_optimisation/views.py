@@ -4,11 +4,17 @@ Vues pour l'application IA et optimisation
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from .models import ModeleIA, OptimisationEmploiTemps, PredictionAbsence, LogOptimisation
 # from .algorithms import OptimiseurEmploiTemps, PredicteurAbsences, OptimiseurRemplacants
 from apps.emplois_temps.models import EmploiTemps
 from apps.remplacements.models import Absence
+import json
+
+
+# Nombre maximal de candidats d'un portefeuille de propositions
+NB_CANDIDATS_MAX = 32
 
 
 @login_required
@@ -150,11 +156,13 @@ def detail_prediction(request, pk):
 
 # API Views
 @login_required
+@require_http_methods(["POST"])
 def api_optimiser(request):
     """
-    API pour optimiser un emploi du temps
+    API pour lancer l'optimisation d'un emploi du temps en tâche de fond.
+    La résolution est suivie via api_statut_optimisation et api_annuler_optimisation.
     """
-    emploi_temps_id = request.GET.get('emploi_temps_id')
+    emploi_temps_id = request.POST.get('emploi_temps_id')
     
     if not emploi_temps_id:
         return JsonResponse({'error': 'emploi_temps_id requis'}, status=400)
@@ -166,22 +174,103 @@ def api_optimiser(request):
         if not request.user.is_rectorat() and emploi_temps.etablissement != request.user.profil_enseignant.etablissement:
             return JsonResponse({'error': 'Accès non autorisé'}, status=403)
         
-        # Lancer l'optimisation (simplifié)
-        # TODO: Implémenter l'optimisation IA
+        poids_contraintes = json.loads(request.POST.get('poids_contraintes') or '{}')
+        if not isinstance(poids_contraintes, dict):
+            return JsonResponse({'error': 'poids_contraintes doit être un objet JSON'}, status=400)
+        
+        # Portefeuille de propositions au lieu d'une optimisation appliquée
+        nb_candidats = request.POST.get('nb_candidats')
+        if nb_candidats is not None:
+            if not nb_candidats.isdigit() or not 2 <= int(nb_candidats) <= NB_CANDIDATS_MAX:
+                return JsonResponse({'error': f'nb_candidats doit être compris entre 2 et {NB_CANDIDATS_MAX}'}, status=400)
+            nb_candidats = int(nb_candidats)
+        
+        from .tasks import lancer_optimisation
+        optimisation = lancer_optimisation(emploi_temps, request.user, poids_contraintes, nb_candidats)
+        if optimisation.statut == 'echec':
+            return JsonResponse({
+                'error': "L'optimisation n'a pas pu être lancée",
+                'optimisation_id': optimisation.id,
+                'statut': optimisation.statut,
+            }, status=503)
+        
         return JsonResponse({
             'success': True,
-            'message': 'Optimisation terminée avec succès (simulée)',
-            'score': 0.95,
-            'conflits_resolus': 5,
-            'temps_calcul': 2.5
-        })
+            'optimisation_id': optimisation.id,
+            'statut': optimisation.statut,
+        }, status=202)
             
     except EmploiTemps.DoesNotExist:
         return JsonResponse({'error': 'Emploi du temps non trouvé'}, status=404)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'poids_contraintes invalide'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _optimisation_autorisee(request, optimisation):
+    """Vérifie que l'utilisateur peut suivre l'optimisation de cet emploi du temps"""
+    return (
+        request.user.is_rectorat() or
+        optimisation.emploi_temps.etablissement == request.user.profil_enseignant.etablissement
+    )
+
+
+@login_required
+def api_statut_optimisation(request, pk):
+    """
+    API pour suivre l'avancement d'une optimisation, interrogée périodiquement par le client.
+    Avec `depuis` (indice du dernier point reçu), la réponse inclut les points de progression
+    suivants, pour tracer la courbe des scores intermédiaires sans tout recharger.
+    """
+    optimisation = get_object_or_404(OptimisationEmploiTemps.objects.select_related('emploi_temps'), pk=pk)
+    
+    if not _optimisation_autorisee(request, optimisation):
+        return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+    
+    depuis = request.GET.get('depuis')
+    if depuis is not None and not depuis.lstrip('-').isdigit():
+        return JsonResponse({'error': 'depuis invalide'}, status=400)
+    
+    return JsonResponse({
+        'id': optimisation.id,
+        'statut': optimisation.statut,
+        'score': optimisation.score_optimise,
+        'conflits_resolus': optimisation.conflits_resolus,
+        'contraintes_violees': optimisation.contraintes_violees,
+        'temps_calcul': optimisation.temps_calcul,
+        'nombre_solutions': len(optimisation.progression),
+        'derniere_solution': optimisation.progression[-1] if optimisation.progression else None,
+        'progression': optimisation.progression[max(int(depuis) + 1, 0):] if depuis is not None else [],
+        'diagnostic': optimisation.diagnostic,
+        'propositions': optimisation.objectifs.get('propositions', []),
+        'started_at': optimisation.started_at.isoformat(),
+        'completed_at': optimisation.completed_at.isoformat() if optimisation.completed_at else None,
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_annuler_optimisation(request, pk):
+    """
+    API pour annuler une optimisation en cours.
+    Le worker Celery interrompt la recherche du solveur (StopSearch) à sa prochaine vérification.
+    """
+    optimisation = get_object_or_404(OptimisationEmploiTemps.objects.select_related('emploi_temps'), pk=pk)
+    
+    if not _optimisation_autorisee(request, optimisation):
+        return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+    
+    annulee = OptimisationEmploiTemps.objects.filter(pk=pk, statut='en_cours').update(
+        statut='annule',
+        completed_at=timezone.now(),
+    )
+    if not annulee:
+        return JsonResponse({'error': "L'optimisation n'est plus en cours"}, status=409)
+    
+    return JsonResponse({'success': True, 'statut': 'annule'})
+
+
 @login_required
 def api_predire(request):
     """
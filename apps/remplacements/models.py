@@ -155,9 +155,11 @@ class Remplacant(models.Model):
             return False
         
         if heure and self.heures_disponibles:
-            jour_semaine = date.weekday() + 1  # 1 = lundi, 7 = dimanche
-            if str(jour_semaine) in self.heures_disponibles:
-                return heure in self.heures_disponibles[str(jour_semaine)]
+            # Clés "1" ou "lundi" (1 = lundi, 7 = dimanche)
+            from apps.emplois_temps.disponibilites import heures_disponibles_jour
+            heures_dispo = heures_disponibles_jour(self.heures_disponibles, date.isoweekday())
+            if heures_dispo is not None:
+                return heure in heures_dispo
         
         return True
 
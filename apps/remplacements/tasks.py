@@ -71,6 +71,80 @@ def rechercher_remplacants_absence(absence_id):
         logger.error(f"Erreur lors de la recherche de remplaçants pour l'absence {absence_id}: {e}")
 
 
+@shared_task
+def affecter_remplacants_absences(etablissement_id=None, academie_id=None, horizon_jours=7):
+    """
+    Tâche pour affecter ensemble les remplaçants aux absences ouvertes (déclarées ou validées)
+    d'un établissement ou d'une académie sur l'horizon donné : un même remplaçant n'est pas proposé
+    pour des cours simultanés. Pour une académie, les candidats de chaque absence sont les remplaçants
+    de tous ses établissements. Les propositions générées non encore envoyées sont remplacées.
+    """
+    try:
+        from django.db import transaction
+
+        aujourd_hui = timezone.now().date()
+        absences = Absence.objects.filter(
+            statut__in=['declaree', 'validee'],
+            date_fin__gte=aujourd_hui,
+            date_debut__lte=aujourd_hui + timezone.timedelta(days=horizon_jours),
+        ).select_related('etablissement', 'enseignant', 'declaree_par')
+        if etablissement_id is not None:
+            absences = absences.filter(etablissement_id=etablissement_id)
+        if academie_id is not None:
+            absences = absences.filter(etablissement__academie_id=academie_id)
+        absences = list(absences)
+        if not absences:
+            logger.info("Aucune absence ouverte à affecter")
+            return
+
+        affectations = OptimiseurRemplacants().affecter_remplacants(absences, academie_id=academie_id)
+
+        propositions_crees = 0
+        with transaction.atomic():
+            PropositionRemplacement.objects.filter(absence__in=absences, statut='generee').delete()
+            for absence in absences:
+                for affectation in affectations.get(absence.id, []):
+                    proposition = PropositionRemplacement.objects.create(
+                        absence=absence,
+                        remplacant=affectation['remplacant'],
+                        score_compatibilite=affectation['score_global'],
+                        score_competence=affectation['score_competence'],
+                        score_disponibilite=affectation['score_disponibilite'],
+                        score_geographique=affectation['score_geographique'],
+                        date_proposition=absence.date_debut,
+                        heures_proposees=[
+                            {
+                                'cours': cours.id,
+                                'jour': cours.jour_semaine,
+                                'heure_debut': cours.heure_debut.strftime('%H:%M'),
+                                'heure_fin': cours.heure_fin.strftime('%H:%M'),
+                            }
+                            for cours in affectation['cours']
+                        ],
+                        statut='generee'
+                    )
+                    proposition.cours_concernes.set(affectation['cours'])
+                    propositions_crees += 1
+
+        for absence in absences:
+            if absence.id in affectations:
+                Notification.objects.create(
+                    destinataire=absence.declaree_par,
+                    type_notification='propositions_remplacants',
+                    titre="Propositions de remplaçants générées",
+                    message=f"{len(affectations[absence.id])} remplaçant(s) proposé(s) pour l'absence de {absence.enseignant.get_full_name()}.",
+                    donnees={'absence_id': absence.id, 'propositions_count': len(affectations[absence.id])}
+                )
+
+        logger.info(
+            f"Affectation groupée terminée: {propositions_crees} propositions pour "
+            f"{len(affectations)}/{len(absences)} absences"
+        )
+
+    except Exception as e:
+        logger.error(f"Erreur lors de l'affectation groupée des remplaçants: {e}")
+
+
 @shared_task
 def predire_absences_enseignants():
     """
@@ -1,4 +1,4 @@
-# Configuration Celery (optionnel)
-# from .celery import app as celery_app
+# Configuration Celery
+from .celery import app as celery_app
 
-# __all__ = ('celery_app',)
+__all__ = ('celery_app',)
@@ -153,13 +153,14 @@ REST_FRAMEWORK = {
 # CRISPY_ALLOWED_TEMPLATE_PACKS = "tailwind"
 # CRISPY_TEMPLATE_PACK = "tailwind"
 
-# Celery Configuration (désactivé pour le développement)
-# CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
-# CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
-# CELERY_ACCEPT_CONTENT = ['json']
-# CELERY_TASK_SERIALIZER = 'json'
-# CELERY_RESULT_SERIALIZER = 'json'
-# CELERY_TIMEZONE = TIME_ZONE
+# Celery Configuration : sans REDIS_URL (développement), les optimisations sont exécutées
+# dans un thread du serveur au lieu d'un worker (apps.ia_optimisation.tasks.lancer_optimisation)
+CELERY_BROKER_URL = config('REDIS_URL', default='')
+CELERY_RESULT_BACKEND = CELERY_BROKER_URL or None
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TIMEZONE = TIME_ZONE
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -169,6 +170,21 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 
+# Solveur d'optimisation des emplois du temps (OR-Tools CP-SAT)
+OPTIMISATION_NB_WORKERS = config('OPTIMISATION_NB_WORKERS', default=8, cast=int)
+OPTIMISATION_TEMPS_MAX = config('OPTIMISATION_TEMPS_MAX', default=60.0, cast=float)  # en secondes
+OPTIMISATION_ECART_RELATIF = config('OPTIMISATION_ECART_RELATIF', default=0.01, cast=float)
+# Dossier où exporter un instantané de chaque modèle résolu (vide : pas d'export)
+OPTIMISATION_DOSSIER_INSTANTANES = config('OPTIMISATION_DOSSIER_INSTANTANES', default='')
+# Attribution des salles après le placement horaire (capacités par groupe de salles dans le modèle)
+OPTIMISATION_ATTRIBUTION_SALLES = config('OPTIMISATION_ATTRIBUTION_SALLES', default=False, cast=bool)
+
+# Nombre d'index des disponibilités (par établissement ou emploi du temps) gardés en mémoire
+DISPONIBILITES_TAILLE_CACHE = config('DISPONIBILITES_TAILLE_CACHE', default=32, cast=int)
+
+# Géocodage : table CSV « code_postal;latitude;longitude » (vide : préfecture du département)
+FICHIER_CODES_POSTAUX = config('FICHIER_CODES_POSTAUX', default='')
+
 # Logging
 LOGGING = {
     'version': 1,